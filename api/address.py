@@ -0,0 +1,61 @@
+import os, re
+from functools import lru_cache
+
+try:
+    from eth_utils import keccak  # comes with web3
+except ImportError:  # services without web3: format checks and calldata only
+    keccak = None
+
+ADDRESS_CACHE_SIZE = int(os.getenv("ADDRESS_CACHE_SIZE", "4096"))
+
+# 4-byte selectors, keccak("balanceOf(address)") etc.
+BALANCE_OF = "70a08231"
+TRANSFER = "a9059cbb"
+GET_ETH_BALANCE = "4d2301cc"  # Multicall3.getEthBalance(address)
+
+_ADDR = re.compile(r"0x[0-9a-fA-F]{40}")
+_PK = re.compile(r"(0x)?[0-9a-fA-F]{64}")
+_UINT256_MAX = 2**256 - 1
+
+def is_address(s) -> bool:
+    # 0x + 40 hex; a mixed-case address must also carry a valid EIP-55 checksum
+    if not isinstance(s, str) or not _ADDR.fullmatch(s):
+        return False
+    body = s[2:]
+    if keccak is None or body.islower() or body.isupper() or body.isdigit():
+        return True
+    return _checksum(body.lower()) == s
+
+def is_private_key(s) -> bool:
+    return isinstance(s, str) and bool(_PK.fullmatch(s))
+
+@lru_cache(maxsize=ADDRESS_CACHE_SIZE)
+def _checksum(lower: str) -> str:
+    h = keccak(lower.encode()).hex()
+    return "0x" + "".join(c.upper() if int(h[i], 16) >= 8 else c for i, c in enumerate(lower))
+
+def checksum(addr: str) -> str:
+    # EIP-55 form, memoized per address. Like web3 it normalizes any 0x+40 hex
+    # (configured addresses); user input goes through is_address first.
+    if not isinstance(addr, str) or not _ADDR.fullmatch(addr):
+        raise ValueError(f"invalid address: {addr!r}")
+    if keccak is None:
+        raise RuntimeError("checksum needs eth_utils (install web3)")
+    return _checksum(addr[2:].lower())
+
+def _word(addr: str) -> str:
+    if not isinstance(addr, str) or not _ADDR.fullmatch(addr):
+        raise ValueError(f"invalid address: {addr!r}")
+    return "000000000000000000000000" + addr[2:].lower()
+
+# calldata built by hand: selector + 32-byte words, no contract/ABI objects
+def address_call(selector: str, addr: str) -> str:
+    return "0x" + selector + _word(addr)
+
+def balance_of_data(addr: str) -> str:
+    return "0x" + BALANCE_OF + _word(addr)
+
+def transfer_data(to: str, amount: int) -> str:
+    if not 0 <= amount <= _UINT256_MAX:
+        raise ValueError(f"amount out of uint256 range: {amount}")
+    return "0x" + TRANSFER + _word(to) + format(amount, "064x")
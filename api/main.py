@@ -1,22 +1,196 @@
-﻿import os
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+﻿import os, json, logging, asyncio, time, hashlib
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, Response
 import httpx
+from balance_cache import BalanceCache
+from rpc_pool import EndpointPool
+import metrics
+from address import is_address, balance_of_data
+from token_index import TokenIndex, TokenIndexer, INDEXER_ENABLED
+from portfolio import Portfolio, parse_tokens, decode_string, decode_uint, PORTFOLIO_TOKENS, PORTFOLIO_MAX_ADDRESSES
 
 RPC = os.getenv("BSC_RPC_URL", "https://data-seed-prebsc-1-s1.binance.org:8545")
+# extra endpoints for failover/hedging, comma separated; BSC_RPC_URL stays first
+RPC_URLS = [RPC] + [u.strip() for u in os.getenv("BSC_RPC_URLS", "").split(",") if u.strip() and u.strip() != RPC]
 CHAIN_ID = int(os.getenv("CHAIN_ID", "97") or 97)
 TOKEN = os.getenv("SELA_TOKEN_ADDRESS", "")
+DATA_DIR = os.getenv("DATA_DIR", "")
+PRICE_SHEKEL_PER_SLH = os.getenv("PRICE_SHEKEL_PER_SLH", "444")
 
-app = FastAPI()
+# ---- RPC connection pool ----
+RPC_TIMEOUT = float(os.getenv("RPC_TIMEOUT", "20"))
+RPC_CONNECT_TIMEOUT = float(os.getenv("RPC_CONNECT_TIMEOUT", "5"))
+RPC_MAX_CONNECTIONS = int(os.getenv("RPC_MAX_CONNECTIONS", "100"))
+RPC_MAX_KEEPALIVE = int(os.getenv("RPC_MAX_KEEPALIVE", "20"))
+RPC_KEEPALIVE_EXPIRY = float(os.getenv("RPC_KEEPALIVE_EXPIRY", "60"))
+RPC_HTTP2 = os.getenv("RPC_HTTP2", "1").lower() in ("1", "true", "yes")
+RPC_HEDGE_PERCENTILE = float(os.getenv("RPC_HEDGE_PERCENTILE", "0.9"))
+RPC_BREAKER_FAILURES = int(os.getenv("RPC_BREAKER_FAILURES", "3"))
+RPC_BREAKER_COOLDOWN = float(os.getenv("RPC_BREAKER_COOLDOWN", "30"))
+
+# ---- balance cache ----
+BALANCE_CACHE_TTL = float(os.getenv("BALANCE_CACHE_TTL", "5"))
+BALANCE_CACHE_SIZE = int(os.getenv("BALANCE_CACHE_SIZE", "10000"))
+BALANCE_CACHE_BLOCK_POLL = float(os.getenv("BALANCE_CACHE_BLOCK_POLL", "3"))
+
+log = logging.getLogger("slh.api")
+
+_client = None
+rpc_pool = EndpointPool(RPC_URLS, hedge_percentile=RPC_HEDGE_PERCENTILE,
+                        breaker_failures=RPC_BREAKER_FAILURES, breaker_cooldown=RPC_BREAKER_COOLDOWN)
+
+def _new_client() -> httpx.AsyncClient:
+    http2 = RPC_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401  (httpx[http2] extra)
+        except ImportError:
+            log.warning("RPC_HTTP2 set but h2 is not installed; using HTTP/1.1")
+            http2 = False
+    return httpx.AsyncClient(
+        http2=http2,
+        timeout=httpx.Timeout(RPC_TIMEOUT, connect=RPC_CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=RPC_MAX_CONNECTIONS,
+                            max_keepalive_connections=RPC_MAX_KEEPALIVE,
+                            keepalive_expiry=RPC_KEEPALIVE_EXPIRY),
+    )
+
+def _get_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _new_client()
+    return _client
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    _get_client()
+    if indexer is not None:
+        indexer.start()
+    try:
+        yield
+    finally:
+        if indexer is not None:
+            await indexer.stop()
+        if _client is not None:
+            await _client.aclose()
+
+app = FastAPI(lifespan=lifespan)
+
+balance_cache = BalanceCache(maxsize=BALANCE_CACHE_SIZE, ttl=BALANCE_CACHE_TTL,
+                             block_aware=BALANCE_CACHE_BLOCK_POLL > 0)
+_last_block_poll = 0.0
+
+HTTP_SECONDS = metrics.histogram("slh_http_seconds", "API request latency", ["route", "status"])
+RPC_SECONDS = metrics.histogram("slh_rpc_seconds", "JSON-RPC call latency (incl. hedging/failover)", ["method"])
+RPC_ERRORS = metrics.counter("slh_rpc_errors_total", "JSON-RPC calls that raised or returned an error", ["method"])
+metrics.gauge("slh_cache_requests", "Cache lookups by result", lambda: {
+    ("balance", "hit"): balance_cache.hits, ("balance", "miss"): balance_cache.misses}, ["cache", "result"])
+metrics.gauge("slh_cache_hit_ratio", "Cache hit ratio since start", lambda: {
+    ("balance",): balance_cache.stats()["hit_ratio"]}, ["cache"])
+metrics.gauge("slh_rpc_hedges", "Hedged RPC requests", lambda: {(): rpc_pool.hedges})
+metrics.gauge("slh_index_lag_blocks", "Blocks between the chain head and the Transfer index",
+              lambda: {(): indexer.lag() or 0} if indexer is not None else {})
+
+@app.middleware("http")
+async def _time_requests(request: Request, call_next):
+    t0, status = time.perf_counter(), 500
+    try:
+        resp = await call_next(request)
+        status = resp.status_code
+        return resp
+    finally:
+        # label by route template so /token/balance/{address} is one series
+        route = request.scope.get("route")
+        HTTP_SECONDS.observe(time.perf_counter() - t0, route=getattr(route, "path", "unmatched"), status=status)
 
 def _rpc_payload(method, params, id=1):
     return {"jsonrpc":"2.0","method":method,"params":params,"id":id}
 
-async def rpc(method, params):
-    async with httpx.AsyncClient(timeout=20) as client:
-        r = await client.post(RPC, json=_rpc_payload(method, params))
+async def _post(payload, method):
+    async def one(url):
+        r = await _get_client().post(url, json=payload)
         r.raise_for_status()
         return r.json()
+    t0, failed = time.perf_counter(), True
+    try:
+        with metrics.span("rpc", method=method):
+            body = await rpc_pool.acall(one)
+        failed = isinstance(body, dict) and "error" in body
+        return body
+    finally:
+        RPC_SECONDS.observe(time.perf_counter() - t0, method=method)
+        if failed:
+            RPC_ERRORS.inc(method=method)
+
+async def rpc(method, params):
+    return await _post(_rpc_payload(method, params), method)
+
+async def rpc_batch(calls):
+    # calls: [(method, params)] -> responses in the same order, one HTTP round-trip
+    if not calls: return []
+    body = await _post([_rpc_payload(m, p, i) for i, (m, p) in enumerate(calls)], "batch:" + calls[0][0])
+    if isinstance(body, dict):  # node rejected the batch as a whole
+        return [body] * len(calls)
+    by_id = {x.get("id"): x for x in body}
+    return [by_id.get(i, {"error": "missing in batch response"}) for i in range(len(calls))]
+
+# ---- immutable token metadata, once per (chain_id, token) ----
+_META_PATH = os.path.join(DATA_DIR, "token_meta_api.json") if DATA_DIR else ""
+_meta = {}
+
+def _load_meta():
+    if not _META_PATH or not os.path.exists(_META_PATH): return
+    try:
+        with open(_META_PATH, "r", encoding="utf-8") as f:
+            _meta.update(json.load(f))
+    except Exception as e:
+        log.error("failed loading token meta: %s", e)
+
+def _save_meta():
+    if not _META_PATH: return
+    try:
+        os.makedirs(DATA_DIR, exist_ok=True)
+        tmp = _META_PATH + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(_meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, _META_PATH)
+    except Exception as e:
+        log.warning("failed persisting token meta: %s", e)
+
+_load_meta()
+
+# ---- Transfer-event index behind /token/holders and /token/history ----
+# (DATA_DIR/token_index.db; in memory when DATA_DIR is not set)
+token_index = TokenIndex(DATA_DIR, TOKEN) if INDEXER_ENABLED and TOKEN else None
+indexer = TokenIndexer(token_index, rpc_batch) if token_index is not None else None
+
+def _eth_call(data):
+    return rpc("eth_call", [{"to": TOKEN, "data": data}, "latest"])
+
+async def token_meta():
+    key = f"{CHAIN_ID}:{TOKEN.lower()}"
+    m = _meta.get(key)
+    if m is not None:
+        return m
+    name, symbol, decimals = await rpc_batch([
+        ("eth_call", [{"to": TOKEN, "data": d}, "latest"]) for d in ("0x06fdde03", "0x95d89b41", "0x313ce567")
+    ])
+    for r in (name, symbol, decimals):
+        if "error" in r: raise HTTPException(502, f"rpc error: {r['error']}")
+    m = {"name": decode_string(name.get("result")), "symbol": decode_string(symbol.get("result")),
+         "decimals": decode_uint(decimals.get("result"))}
+    _meta[key] = m
+    _save_meta()
+    return m
+
+# ---- /portfolio: BNB, SLH and PORTFOLIO_TOKENS for many addresses, one RPC batch ----
+async def _portfolio_meta(token):
+    # the SLH token comes from token_meta's cache, others are read in the batch
+    return await token_meta() if token == TOKEN.lower() else None
+
+portfolio = Portfolio(parse_tokens(PORTFOLIO_TOKENS, TOKEN, PRICE_SHEKEL_PER_SLH), rpc_batch, cache=balance_cache,
+                      token_meta=_portfolio_meta)
 
 @app.get("/")
 def root(): return {"ok": True, "chain_id": CHAIN_ID}
@@ -24,29 +198,128 @@ def root(): return {"ok": True, "chain_id": CHAIN_ID}
 @app.get("/healthz")
 def healthz(): return {"status": "ok"}
 
+@app.get("/health")
+def health():
+    eps = rpc_pool.status()
+    return {"ok": any(e["healthy"] for e in eps), "chain_id": CHAIN_ID, "rpc_endpoints": eps, "hedges": rpc_pool.hedges,
+            "index": indexer.status() if indexer is not None else None}
+
 @app.get("/token/info")
 async def token_info():
     if not TOKEN: raise HTTPException(400, "SELA_TOKEN_ADDRESS missing")
-    def call(data): return rpc("eth_call", [{"to": TOKEN, "data": data}, "latest"])
-    name = await call("0x06fdde03")
-    symbol = await call("0x95d89b41")
-    decimals = await call("0x313ce567")
-    total = await call("0x18160ddd")
+    meta, total = await asyncio.gather(token_meta(), _eth_call("0x18160ddd"))
+    total_raw = decode_uint(total.get("result"))
+    dec = meta["decimals"] or 0
     return JSONResponse({
         "token": TOKEN,
-        "name_raw": name.get("result"),
-        "symbol_raw": symbol.get("result"),
-        "decimals_raw": decimals.get("result"),
-        "totalSupply_raw": total.get("result")
+        "chain_id": CHAIN_ID,
+        "name": meta["name"],
+        "symbol": meta["symbol"],
+        "decimals": meta["decimals"],
+        "totalSupply_raw": total.get("result"),
+        "totalSupply": str(total_raw) if total_raw is not None else None,
+        "totalSupply_value": total_raw / (10**dec) if total_raw is not None else None
     })
 
-def _balance_of_calldata(addr: str) -> str:
-    a = addr.lower().replace("0x","")
-    return "0x70a08231" + ("0"*(64-len(a))) + a
+async def _poll_block():
+    # at most one eth_blockNumber per BALANCE_CACHE_BLOCK_POLL seconds
+    global _last_block_poll
+    now = time.monotonic()
+    if BALANCE_CACHE_BLOCK_POLL <= 0 or now - _last_block_poll < BALANCE_CACHE_BLOCK_POLL:
+        return
+    _last_block_poll = now
+    try:
+        r = await rpc("eth_blockNumber", [])
+        balance_cache.note_block(decode_uint(r.get("result")))
+    except Exception as e:
+        log.warning("block number poll failed: %s", e)
+
+def _cached_json(request: Request, out, max_age: float):
+    # ETag over the body: clients revalidate with If-None-Match and get a 304
+    body = json.dumps(out, separators=(",", ":")).encode()
+    etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+    headers = {"ETag": etag, "Cache-Control": f"max-age={int(max_age)}" if max_age > 0 else "no-cache"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
 
 @app.get("/token/balance/{address}")
-async def balance(address: str):
+async def balance(address: str, request: Request):
     if not TOKEN: raise HTTPException(400, "SELA_TOKEN_ADDRESS missing")
-    data = _balance_of_calldata(address)
-    r = await rpc("eth_call", [{"to": TOKEN, "data": data}, "latest"])
-    return {"address": address, "token": TOKEN, "balance_raw": r.get("result")}
+    if not is_address(address): raise HTTPException(400, "invalid address")
+    key = (CHAIN_ID, address.lower())
+    if balance_cache.block_aware and len(balance_cache):
+        await _poll_block()
+    out = balance_cache.get(key)
+    if out is not None:
+        return _cached_json(request, out, BALANCE_CACHE_TTL)
+    data = balance_of_data(address)
+    r = await _eth_call(data)
+    out = {"address": address, "token": TOKEN, "balance_raw": r.get("result")}
+    bal = decode_uint(r.get("result"))
+    if bal is not None:
+        meta = await token_meta()
+        out.update({"balance": str(bal), "symbol": meta["symbol"], "decimals": meta["decimals"],
+                    "value": bal / (10**(meta["decimals"] or 0))})
+        balance_cache.put(key, out)
+        return _cached_json(request, out, BALANCE_CACHE_TTL)
+    return JSONResponse(out, headers={"Cache-Control": "no-store"})
+
+@app.get("/portfolio")
+async def portfolio_view(addresses: str, request: Request):
+    # ?addresses=0xA,0xB
+    addrs = [a.strip() for a in addresses.split(",") if a.strip()]
+    if not addrs: raise HTTPException(400, "addresses missing")
+    if len(addrs) > PORTFOLIO_MAX_ADDRESSES: raise HTTPException(400, f"at most {PORTFOLIO_MAX_ADDRESSES} addresses")
+    bad = [a for a in addrs if not is_address(a)]
+    if bad: raise HTTPException(400, f"invalid address: {bad[0]}")
+    if balance_cache.block_aware and len(balance_cache):
+        await _poll_block()
+    out = {"chain_id": CHAIN_ID, **await portfolio.fetch(addrs)}
+    if not out["complete"]:
+        return JSONResponse(out, headers={"Cache-Control": "no-store"})
+    return _cached_json(request, out, BALANCE_CACHE_TTL)
+
+async def _index_state():
+    # SQLite reads share the index lock with the indexer's writes: off the event loop
+    if indexer is None: raise HTTPException(503, "indexer disabled (INDEXER_ENABLED / SELA_TOKEN_ADDRESS)")
+    cursor, complete = await asyncio.gather(asyncio.to_thread(token_index.cursor), asyncio.to_thread(token_index.complete))
+    return {"cursor": cursor, "head": indexer.head, "lag": indexer.lag(), "complete": complete}
+
+@app.get("/token/holders")
+async def holders(limit: int = 50, offset: int = 0):
+    state = await _index_state()
+    limit, offset = max(1, min(limit, 500)), max(0, offset)
+    rows, count = await asyncio.gather(asyncio.to_thread(token_index.holders, limit, offset),
+                                       asyncio.to_thread(token_index.holder_count))
+    meta = await token_meta()
+    dec = meta["decimals"] or 0
+    return {"token": TOKEN, "symbol": meta["symbol"], "decimals": dec, "count": count, "index": state,
+            "holders": [{"rank": offset + i + 1, "address": a, "balance": str(b), "value": b / 10**dec}
+                        for i, (a, b) in enumerate(rows)]}
+
+@app.get("/token/history/{address}")
+async def history(address: str, limit: int = 20, before: str = None):
+    # paging: pass next_before ("block:log_index") of the previous page
+    state = await _index_state()
+    if not is_address(address): raise HTTPException(400, "invalid address")
+    try:
+        pos = tuple(int(x) for x in before.split(":", 1)) if before else None
+    except ValueError:
+        raise HTTPException(400, "before must be block:log_index")
+    if pos is not None and len(pos) == 1: pos = (pos[0], 0)
+    limit = max(1, min(limit, 200))
+    rows = await asyncio.to_thread(token_index.history, address, limit, pos)
+    meta = await token_meta()
+    dec = meta["decimals"] or 0
+    for r in rows:
+        r["raw"], r["value"] = str(r["value"]), r["value"] / 10**dec
+    last = rows[-1] if len(rows) == limit else None
+    return {"address": address, "token": TOKEN, "symbol": meta["symbol"], "decimals": dec, "index": state,
+            "transfers": rows, "next_before": f"{last['block']}:{last['log_index']}" if last else None}
+
+@app.get("/metrics")
+def metrics_endpoint(): return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/cache/stats")
+def cache_stats(): return {"balance": balance_cache.stats()}
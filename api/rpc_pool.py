@@ -0,0 +1,192 @@
+import time, asyncio, threading, logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+log = logging.getLogger("slh.rpc")
+
+class Endpoint:
+    def __init__(self, url: str, alpha: float = 0.2):
+        self.url = url
+        self.alpha = alpha
+        self.latency: Optional[float] = None   # EWMA seconds
+        self.error_rate = 0.0                  # EWMA of failures
+        self.samples: deque = deque(maxlen=200)
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+
+    def record(self, ok: bool, latency: float, breaker_failures: int, breaker_cooldown: float):
+        self.requests += 1
+        self.error_rate += self.alpha * ((0.0 if ok else 1.0) - self.error_rate)
+        if ok:
+            self.observe(latency)
+            self.consecutive_failures = 0
+            self.open_until = 0.0
+        else:
+            self.failures += 1
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= breaker_failures:
+                if not self.open_until:
+                    log.warning("rpc circuit open: %s", self.url)
+                self.open_until = time.monotonic() + breaker_cooldown
+
+    def observe(self, latency: float):
+        # lower bound from a cancelled hedge loser: it was at least this slow
+        self.samples.append(latency)
+        self.latency = latency if self.latency is None else self.latency + self.alpha * (latency - self.latency)
+
+    def is_open(self, now: float) -> bool:
+        return self.open_until > now
+
+    def score(self) -> float:
+        # unsampled endpoints score 0 so they get tried once
+        return (self.latency or 0.0) * (1.0 + 4.0 * self.error_rate)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        s = sorted(self.samples)
+        return s[min(len(s) - 1, int(q * len(s)))]
+
+    def status(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {"url": self.url, "healthy": not self.is_open(now),
+                "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+                "p90_ms": round(self.percentile(0.9) * 1000, 1) if self.samples else None,
+                "error_rate": round(self.error_rate, 3), "requests": self.requests, "failures": self.failures,
+                "circuit_open_for_s": round(max(0.0, self.open_until - now), 1)}
+
+class EndpointPool:
+    # Routes each call to the best-scoring healthy endpoint (latency EWMA
+    # weighted by error rate). If it hasn't answered within its own
+    # `hedge_percentile` latency a second request goes to the runner-up and the
+    # first answer wins; failures fail over to the next endpoint. An endpoint
+    # with `breaker_failures` consecutive failures is skipped for
+    # `breaker_cooldown` seconds, then retried (half-open).
+    def __init__(self, urls: List[str], hedge_percentile: float = 0.9, hedge_min: float = 0.05,
+                 hedge_default: float = 0.5, breaker_failures: int = 3, breaker_cooldown: float = 30.0,
+                 max_workers: int = 32):
+        if not urls:
+            raise ValueError("EndpointPool needs at least one url")
+        self.endpoints = [Endpoint(u) for u in urls]
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min = hedge_min
+        self.hedge_default = hedge_default
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown = breaker_cooldown
+        self.hedges = 0
+        self._lock = threading.Lock()
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def ranked(self) -> List[Endpoint]:
+        now = time.monotonic()
+        closed = sorted((e for e in self.endpoints if not e.is_open(now)), key=Endpoint.score)
+        opened = sorted((e for e in self.endpoints if e.is_open(now)), key=lambda e: e.open_until)
+        return closed + opened
+
+    def hedge_delay(self, ep: Endpoint) -> float:
+        p = ep.percentile(self.hedge_percentile)
+        return self.hedge_default if p is None else max(self.hedge_min, p)
+
+    def _record(self, ep: Endpoint, ok: bool, started: float):
+        with self._lock:
+            ep.record(ok, time.monotonic() - started, self.breaker_failures, self.breaker_cooldown)
+
+    def status(self) -> List[Dict[str, Any]]:
+        return [e.status() for e in self.endpoints]
+
+    # ---- sync (web3 provider) ----
+    def _timed(self, ep: Endpoint, fn: Callable[[str], Any]):
+        t0 = time.monotonic()
+        try:
+            r = fn(ep.url)
+        except Exception:
+            self._record(ep, False, t0)
+            raise
+        self._record(ep, True, t0)
+        return r
+
+    def call(self, fn: Callable[[str], Any], hedge: bool = True) -> Any:
+        eps = self.ranked()
+        if len(eps) == 1:
+            return self._timed(eps[0], fn)
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="rpc-pool")
+        pending = iter(eps)
+        futs = {}
+        def launch():
+            ep = next(pending, None)
+            if ep is not None:
+                futs[self._executor.submit(self._timed, ep, fn)] = ep
+            return ep is not None
+        launch()
+        delay = self.hedge_delay(eps[0]) if hedge else None
+        errors = []
+        while futs:
+            done, _ = wait(futs, timeout=delay, return_when=FIRST_COMPLETED)
+            if not done:
+                delay = None
+                if launch():
+                    self.hedges += 1
+                continue
+            for f in done:
+                futs.pop(f)
+                try:
+                    return f.result()
+                except Exception as e:
+                    errors.append(e)
+                    launch()
+        raise errors[-1]
+
+    # ---- async (httpx) ----
+    async def _atimed(self, ep: Endpoint, fn: Callable[[str], Awaitable[Any]]):
+        t0 = time.monotonic()
+        try:
+            r = await fn(ep.url)
+        except asyncio.CancelledError:
+            with self._lock:
+                ep.observe(time.monotonic() - t0)
+            raise
+        except Exception:
+            self._record(ep, False, t0)
+            raise
+        self._record(ep, True, t0)
+        return r
+
+    async def acall(self, fn: Callable[[str], Awaitable[Any]], hedge: bool = True) -> Any:
+        eps = self.ranked()
+        if len(eps) == 1:
+            return await self._atimed(eps[0], fn)
+        pending = iter(eps)
+        tasks = {}
+        def launch():
+            ep = next(pending, None)
+            if ep is not None:
+                tasks[asyncio.ensure_future(self._atimed(ep, fn))] = ep
+            return ep is not None
+        launch()
+        delay = self.hedge_delay(eps[0]) if hedge else None
+        errors = []
+        try:
+            while tasks:
+                done, _ = await asyncio.wait(tasks, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    delay = None
+                    if launch():
+                        self.hedges += 1
+                    continue
+                for t in done:
+                    tasks.pop(t)
+                    if t.exception() is None:
+                        return t.result()
+                    errors.append(t.exception())
+                    launch()
+            raise errors[-1]
+        finally:
+            for t in tasks:
+                t.cancel()
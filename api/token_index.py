@@ -0,0 +1,346 @@
+import os, asyncio, sqlite3, logging, threading
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+log = logging.getLogger("slh.index")
+
+INDEXER_ENABLED = os.getenv("INDEXER_ENABLED", "1").lower() in ("1", "true", "yes")
+# token deployment block for a complete holder table; empty: follow from the current head
+INDEXER_START_BLOCK = os.getenv("INDEXER_START_BLOCK", "")
+INDEXER_CONFIRMATIONS = int(os.getenv("INDEXER_CONFIRMATIONS", "3"))
+INDEXER_POLL = float(os.getenv("INDEXER_POLL", "5"))
+# eth_getLogs block range: doubles while results are small, halves (and stays
+# below) a range the node refuses
+INDEXER_SPAN = int(os.getenv("INDEXER_SPAN", "2000"))
+INDEXER_MAX_SPAN = int(os.getenv("INDEXER_MAX_SPAN", "5000"))
+INDEXER_TARGET_LOGS = int(os.getenv("INDEXER_TARGET_LOGS", "2000"))
+# block hashes kept to detect reorgs; a mismatch rewinds to the previous one
+INDEXER_CHECKPOINTS = int(os.getenv("INDEXER_CHECKPOINTS", "64"))
+
+TRANSFER_TOPIC = "0xddf252ad1be2c89b69c2b068fc378daa952ba7f163c4a11628f55a4df523b3ef"
+ZERO_ADDRESS = "0x" + "0" * 40
+# balances as fixed-width hex with an offset: text order == numeric order,
+# no 2^63 limit, and negative values (history that starts mid-chain) still fit
+_OFFSET = 2**255
+
+RpcBatch = Callable[[List[Tuple[str, list]]], Awaitable[List[Dict[str, Any]]]]
+
+class IndexerError(Exception):
+    pass
+
+def _enc(v: int) -> str:
+    return format(v + _OFFSET, "064x")
+
+def _dec(s: str) -> int:
+    return int(s, 16) - _OFFSET
+
+_ENC_ZERO = _enc(0)
+
+def _result(resp: Any) -> Any:
+    if not isinstance(resp, dict) or "error" in resp or "result" not in resp:
+        raise IndexerError(str(resp.get("error") if isinstance(resp, dict) else resp))
+    return resp["result"]
+
+def parse_transfer(lg: Dict[str, Any]) -> Optional[Tuple[int, int, str, str, str, int]]:
+    # (block, log_index, tx_hash, from, to, value); ERC-721 style logs (value indexed) are skipped
+    topics = lg.get("topics") or []
+    if lg.get("removed") or len(topics) != 3 or topics[0].lower() != TRANSFER_TOPIC:
+        return None
+    data = lg.get("data") or "0x"
+    return (int(lg["blockNumber"], 16), int(lg["logIndex"], 16), lg.get("transactionHash") or "",
+            "0x" + topics[1][-40:].lower(), "0x" + topics[2][-40:].lower(), int(data, 16) if data != "0x" else 0)
+
+class TokenIndex:
+    # DATA_DIR/token_index.db: every Transfer of the token (indexed by sender
+    # and recipient for per-address history), one balance row per holder,
+    # recent block hashes for reorg checks, and the cursor (last indexed
+    # block). Writers compare-and-set the cursor inside one transaction, so
+    # several processes indexing the same file never apply a range twice.
+    def __init__(self, data_dir: str, token: str):
+        self.token = token.lower()
+        if data_dir:
+            os.makedirs(data_dir, exist_ok=True)
+        self.path = os.path.join(data_dir, "token_index.db") if data_dir else ":memory:"
+        self._lock = threading.Lock()
+        self._open_lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # opened (and the schema checked) on first use, not at import
+        if self._connection is None:
+            with self._open_lock:
+                if self._connection is None:
+                    self._connection = self._open()
+        return self._connection
+
+    def _open(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        if self.path != ":memory:":
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+        db.execute("PRAGMA busy_timeout=30000")
+        db.execute("CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT)")
+        db.execute("CREATE TABLE IF NOT EXISTS transfers (block INTEGER, log_index INTEGER, tx_hash TEXT, "
+                   "src TEXT, dst TEXT, value TEXT, PRIMARY KEY (block, log_index))")
+        db.execute("CREATE INDEX IF NOT EXISTS transfers_src ON transfers (src, block)")
+        db.execute("CREATE INDEX IF NOT EXISTS transfers_dst ON transfers (dst, block)")
+        db.execute("CREATE TABLE IF NOT EXISTS holders (address TEXT PRIMARY KEY, balance TEXT)")
+        db.execute("CREATE INDEX IF NOT EXISTS holders_balance ON holders (balance)")
+        db.execute("CREATE TABLE IF NOT EXISTS checkpoints (block INTEGER PRIMARY KEY, hash TEXT)")
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            token_row = db.execute("SELECT v FROM meta WHERE k='token'").fetchone()
+            if token_row is None or token_row[0] != self.token:
+                if token_row is not None:
+                    log.warning("token changed %s -> %s, dropping the index", token_row[0], self.token)
+                for t in ("transfers", "holders", "checkpoints", "meta"):
+                    db.execute(f"DELETE FROM {t}")
+                db.execute("INSERT INTO meta (k, v) VALUES ('token', ?)", (self.token,))
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+        return db
+
+    @contextmanager
+    def _tx(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _query(self, sql: str, args: tuple = ()) -> List[tuple]:
+        with self._lock:
+            return self._conn.execute(sql, args).fetchall()
+
+    @staticmethod
+    def _meta(db: sqlite3.Connection, k: str) -> Optional[str]:
+        row = db.execute("SELECT v FROM meta WHERE k=?", (k,)).fetchone()
+        return row[0] if row else None
+
+    # ---- read ----
+    def cursor(self) -> Optional[int]:
+        rows = self._query("SELECT v FROM meta WHERE k='cursor'")
+        return int(rows[0][0]) if rows else None
+
+    def last_checkpoint(self) -> Optional[Tuple[int, str]]:
+        rows = self._query("SELECT block, hash FROM checkpoints ORDER BY block DESC LIMIT 1")
+        return (rows[0][0], rows[0][1]) if rows else None
+
+    def balance(self, address: str) -> int:
+        rows = self._query("SELECT balance FROM holders WHERE address=?", (address.lower(),))
+        return _dec(rows[0][0]) if rows else 0
+
+    def holders(self, limit: int = 50, offset: int = 0) -> List[Tuple[str, int]]:
+        rows = self._query("SELECT address, balance FROM holders WHERE balance > ? ORDER BY balance DESC "
+                           "LIMIT ? OFFSET ?", (_ENC_ZERO, limit, offset))
+        return [(a, _dec(b)) for a, b in rows]
+
+    def complete(self) -> bool:
+        # indexed from INDEXER_START_BLOCK, i.e. holder balances are exact
+        return self._query("SELECT v FROM meta WHERE k='complete'") == [("1",)]
+
+    def holder_count(self) -> int:
+        return self._query("SELECT COUNT(*) FROM holders WHERE balance > ?", (_ENC_ZERO,))[0][0]
+
+    def history(self, address: str, limit: int = 20, before: Optional[Tuple[int, int]] = None) -> List[Dict[str, Any]]:
+        # newest first; before: (block, log_index) of the last row of the previous page
+        a = address.lower()
+        b, i = before if before is not None else (2**62, 0)
+        rows = self._query(
+            "SELECT block, log_index, tx_hash, src, dst, value FROM ("
+            " SELECT * FROM transfers WHERE src=? AND (block, log_index) < (?, ?)"
+            " UNION SELECT * FROM transfers WHERE dst=? AND (block, log_index) < (?, ?))"
+            " ORDER BY block DESC, log_index DESC LIMIT ?", (a, b, i, a, b, i, limit))
+        return [{"block": b, "log_index": i, "tx_hash": tx, "from": s, "to": d, "value": _dec(v),
+                 "direction": "self" if s == d else ("out" if s == a else "in")}
+                for b, i, tx, s, d, v in rows]
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            meta = dict(self._conn.execute("SELECT k, v FROM meta").fetchall())
+            transfers = self._conn.execute("SELECT COUNT(*) FROM transfers").fetchone()[0]
+        return {"token": self.token, "cursor": int(meta["cursor"]) if "cursor" in meta else None,
+                "start_block": int(meta["start"]) + 1 if "start" in meta else None,
+                "complete": meta.get("complete") == "1", "transfers": transfers}
+
+    # ---- write ----
+    @staticmethod
+    def _add(db: sqlite3.Connection, address: str, delta: int):
+        if address == ZERO_ADDRESS or not delta:
+            return
+        row = db.execute("SELECT balance FROM holders WHERE address=?", (address,)).fetchone()
+        bal = (_dec(row[0]) if row else 0) + delta
+        if bal:
+            db.execute("INSERT OR REPLACE INTO holders (address, balance) VALUES (?, ?)", (address, _enc(bal)))
+        elif row:
+            db.execute("DELETE FROM holders WHERE address=?", (address,))
+
+    def begin(self, cursor: int, complete: bool):
+        # first run: index starts after `cursor`
+        with self._tx() as db:
+            if self._meta(db, "cursor") is None:
+                db.execute("INSERT OR REPLACE INTO meta (k, v) VALUES ('cursor', ?), ('start', ?), ('complete', ?)",
+                           (str(cursor), str(cursor), "1" if complete else "0"))
+
+    def apply(self, frm: int, to: int, logs: List[Dict[str, Any]], to_hash: str) -> int:
+        # blocks frm..to; a no-op (returns -1) if another writer got there first
+        with self._tx() as db:
+            if self._meta(db, "cursor") != str(frm - 1):
+                return -1
+            n = 0
+            for lg in logs:
+                t = parse_transfer(lg)
+                if t is None or not frm <= t[0] <= to:
+                    continue
+                block, idx, tx, src, dst, value = t
+                if db.execute("INSERT OR IGNORE INTO transfers VALUES (?, ?, ?, ?, ?, ?)",
+                              (block, idx, tx, src, dst, _enc(value))).rowcount:
+                    self._add(db, src, -value)
+                    self._add(db, dst, value)
+                    n += 1
+            db.execute("UPDATE meta SET v=? WHERE k='cursor'", (str(to),))
+            db.execute("INSERT OR REPLACE INTO checkpoints (block, hash) VALUES (?, ?)", (to, to_hash))
+            db.execute("DELETE FROM checkpoints WHERE block NOT IN "
+                       "(SELECT block FROM checkpoints ORDER BY block DESC LIMIT ?)", (INDEXER_CHECKPOINTS,))
+            return n
+
+    def rewind(self, bad: Tuple[int, str]) -> Optional[int]:
+        # the chain no longer has block bad[0] with hash bad[1]: undo everything
+        # after the previous checkpoint (or back to the start) and resume there
+        with self._tx() as db:
+            if db.execute("SELECT hash FROM checkpoints WHERE block=?", (bad[0],)).fetchone() != (bad[1],):
+                return None
+            db.execute("DELETE FROM checkpoints WHERE block>=?", (bad[0],))
+            prev = db.execute("SELECT MAX(block) FROM checkpoints").fetchone()[0]
+            back = prev if prev is not None else int(self._meta(db, "start"))
+            rows = db.execute("SELECT src, dst, value FROM transfers WHERE block>?", (back,)).fetchall()
+            for src, dst, value in rows:
+                v = _dec(value)
+                self._add(db, src, v)
+                self._add(db, dst, -v)
+            db.execute("DELETE FROM transfers WHERE block>?", (back,))
+            db.execute("UPDATE meta SET v=? WHERE k='cursor'", (str(back),))
+            log.warning("reorg at block %d: rewound to %d (%d transfers undone)", bad[0], back, len(rows))
+            return back
+
+class TokenIndexer:
+    # Follows the token's Transfer logs with eth_getLogs into a TokenIndex.
+    # Each step is two JSON-RPC batches: head + hash of the last checkpoint,
+    # then the logs of the next range + the hash of its last block. Catching
+    # up runs steps back to back; at the head it polls every INDEXER_POLL s.
+    # Every TokenIndex call goes through the executor: they share a lock with
+    # apply(), which can hold it for a whole batch, and must not stall the
+    # event loop meanwhile. lag() reads the cursor of the last step.
+    def __init__(self, index: TokenIndex, rpc_batch: RpcBatch, start_block: Optional[int] = None,
+                 confirmations: int = INDEXER_CONFIRMATIONS, poll: float = INDEXER_POLL,
+                 span: int = INDEXER_SPAN, max_span: int = INDEXER_MAX_SPAN, target_logs: int = INDEXER_TARGET_LOGS):
+        self.index = index
+        self.rpc_batch = rpc_batch
+        if start_block is None and INDEXER_START_BLOCK:
+            start_block = int(INDEXER_START_BLOCK)
+        self.start_block = start_block
+        self.confirmations = confirmations
+        self.poll = poll
+        self.span = max(1, span)
+        self.max_span = max(self.span, max_span)
+        self.target_logs = target_logs
+        self.head: Optional[int] = None
+        self.cursor: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def _db(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def step(self) -> bool:
+        # True when there is more to index right away
+        cp = await self._db(self.index.last_checkpoint)
+        calls = [("eth_blockNumber", [])]
+        if cp is not None:
+            calls.append(("eth_getBlockByNumber", [hex(cp[0]), False]))
+        res = await self.rpc_batch(calls)
+        self.head = int(_result(res[0]), 16)
+        safe = self.head - self.confirmations
+        if cp is not None:
+            blk = _result(res[1])
+            if blk is None:
+                return False  # node behind our checkpoint (another endpoint of the pool)
+            if blk.get("hash") != cp[1]:
+                await self._db(self.index.rewind, cp)
+                self.cursor = await self._db(self.index.cursor)
+                return True
+
+        cursor = await self._db(self.index.cursor)
+        if cursor is None:
+            if self.start_block is None:
+                log.warning("INDEXER_START_BLOCK not set: indexing from block %d, earlier history is missing", safe + 1)
+            await self._db(self.index.begin, safe if self.start_block is None else self.start_block - 1,
+                           self.start_block is not None)
+            cursor = await self._db(self.index.cursor)
+        self.cursor = cursor
+        if cursor >= safe:
+            return False
+
+        frm, to = cursor + 1, min(safe, cursor + self.span)
+        # one batch = one endpoint: if it has block `to`, it has all its logs
+        res = await self.rpc_batch([
+            ("eth_getLogs", [{"address": self.index.token, "topics": [TRANSFER_TOPIC],
+                              "fromBlock": hex(frm), "toBlock": hex(to)}]),
+            ("eth_getBlockByNumber", [hex(to), False]),
+        ])
+        try:
+            logs = _result(res[0])
+        except IndexerError as e:
+            # range too large / too many results / node timeout
+            if self.span == 1:
+                raise
+            # remember the node's limit instead of growing back into it
+            self.span = self.max_span = max(1, (to - frm + 1) // 2)
+            log.info("eth_getLogs %d-%d failed (%s), span now %d", frm, to, e, self.span)
+            return True
+        blk = _result(res[1])
+        if blk is None:
+            raise IndexerError(f"block {to} not available yet")
+        if any(int(lg["blockNumber"], 16) == to and lg.get("blockHash") != blk["hash"] for lg in logs):
+            return True  # block `to` was replaced between the two calls; fetch again
+        if await self._db(self.index.apply, frm, to, logs, blk["hash"]) >= 0:
+            self.cursor = to
+        if len(logs) > self.target_logs:
+            self.span = max(1, self.span // 2)
+        elif len(logs) < self.target_logs // 2:
+            self.span = min(self.max_span, self.span * 2)
+        return to < safe
+
+    async def run(self):
+        while True:
+            try:
+                more = await self.step()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning("index step failed: %s", e)
+                more = False
+            if not more:
+                await asyncio.sleep(self.poll)
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def lag(self) -> Optional[int]:
+        return None if self.head is None or self.cursor is None else max(0, self.head - self.cursor)
+
+    def status(self) -> Dict[str, Any]:
+        st = self.index.status()
+        st.update({"head": self.head, "lag": self.lag(), "span": self.span, "holders": self.index.holder_count()})
+        return st
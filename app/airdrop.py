@@ -0,0 +1,296 @@
+import os, io, csv, json, time, asyncio, logging, threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from . import wallet_web3 as w3w
+from .address import is_address
+
+log = logging.getLogger("slh.airdrop")
+
+AIRDROP_CONCURRENCY = int(os.getenv("AIRDROP_CONCURRENCY", "8"))
+AIRDROP_SIGN_CHUNK = int(os.getenv("AIRDROP_SIGN_CHUNK", "100"))
+AIRDROP_RECEIPT_POLL = float(os.getenv("AIRDROP_RECEIPT_POLL", "3"))
+AIRDROP_RECEIPT_TIMEOUT = float(os.getenv("AIRDROP_RECEIPT_TIMEOUT", "900"))
+AIRDROP_RECEIPT_BATCH = int(os.getenv("AIRDROP_RECEIPT_BATCH", "100"))
+
+def parse_rows(text: str) -> List[Tuple[str, float]]:
+    # "address,amount" per line; header and blank lines are skipped
+    rows = []
+    for i, rec in enumerate(csv.reader(io.StringIO(text)), 1):
+        rec = [c.strip() for c in rec if c.strip()]
+        if not rec or rec[0].startswith("#") or rec[0].lower() in ("address", "to"):
+            continue
+        if len(rec) != 2:
+            raise ValueError(f"line {i}: expected address,amount")
+        addr, amount = rec
+        if not is_address(addr):
+            raise ValueError(f"line {i}: bad address {addr}")
+        try:
+            value = float(amount)
+        except ValueError:
+            raise ValueError(f"line {i}: bad amount {amount}")
+        if value <= 0:
+            raise ValueError(f"line {i}: amount must be positive")
+        rows.append((addr, value))
+    return rows
+
+class AirdropError(Exception):
+    pass
+
+class AirdropBusy(AirdropError):
+    # another run of the same job holds its lock (this or another process)
+    pass
+
+# node answers meaning this tx, or another one with its nonce, is already in;
+# either way the receipt lookup settles the row
+_SENT = ("already known", "known transaction", "nonce too low")
+
+def _hashes(r: Dict[str, Any]) -> List[str]:
+    # the current tx and any same-nonce versions it replaced
+    return [r["tx_hash"]] + r.get("replaced", [])
+
+async def _tx_count(address: str, block: str) -> int:
+    resp = (await w3w.arpc_batch([("eth_getTransactionCount", [address, block])]))[0]
+    if "error" in resp or not resp.get("result"):
+        raise AirdropError(f"eth_getTransactionCount({block}): {resp.get('error') or 'no result'}")
+    return int(resp["result"], 16)
+
+def _try_lock(f) -> bool:
+    # non-blocking and released by the OS when the process dies, so a crash
+    # never leaves a job locked
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        return True
+    except OSError:
+        return False
+
+class AirdropJob:
+    # Checkpointed batch transfer. State lives in DATA_DIR/airdrops/<job_id>.json
+    # and is rewritten after every sign chunk and every broadcast, so run() can
+    # be called again after a crash or restart and continues where it stopped.
+    # row status: pending -> signed -> sent -> confirmed | failed
+    # A signed row keeps its raw tx and nonce until a receipt settles it: a
+    # resume rebroadcasts that same tx, and since a nonce is mined at most once
+    # a payment can't go out twice. A row only gets a new nonce after its own
+    # one was taken by some other tx (see _reconcile).
+    # run() holds <job_id>.lock for its whole duration: a second run of the
+    # same job, from this process or another one, raises AirdropBusy instead
+    # of signing the same pending rows again.
+    def __init__(self, data_dir: str, job_id: str):
+        self.job_id = job_id
+        self.dir = os.path.join(data_dir, "airdrops")
+        self.path = os.path.join(self.dir, f"{job_id}.json")
+        self.state: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def create(cls, data_dir: str, rows: List[Tuple[str, float]], sender: str,
+               job_id: Optional[str] = None) -> "AirdropJob":
+        job = cls(data_dir, job_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{os.urandom(3).hex()}")
+        job.state = {"job_id": job.job_id, "sender": sender, "created": time.time(),
+                     "rows": [{"to": a, "amount": v, "status": "pending"} for a, v in rows]}
+        job.save()
+        return job
+
+    @classmethod
+    def load(cls, data_dir: str, job_id: str) -> "AirdropJob":
+        job = cls(data_dir, job_id)
+        with open(job.path, "r", encoding="utf-8") as f:
+            job.state = json.load(f)
+        return job
+
+    def save(self):
+        with self._lock:
+            os.makedirs(self.dir, exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self.state, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+
+    def summary(self) -> Dict[str, int]:
+        out: Dict[str, int] = {"total": len(self.state.get("rows", []))}
+        for r in self.state.get("rows", []):
+            out[r["status"]] = out.get(r["status"], 0) + 1
+        return out
+
+    @contextmanager
+    def _running(self):
+        os.makedirs(self.dir, exist_ok=True)
+        with open(self.path + ".lock", "a+b") as f:
+            if not _try_lock(f):
+                raise AirdropBusy(f"airdrop {self.job_id} is already running")
+            yield
+
+    def is_running(self) -> bool:
+        try:
+            with self._running():
+                return False
+        except AirdropBusy:
+            return True
+
+    async def run(self, pk_hex: str) -> Dict[str, int]:
+        with self._running():
+            await self._reconcile()
+            await self._sign(pk_hex)
+            await self._submit()
+            await self._track()
+        return self.summary()
+
+    def _settle(self, r: Dict[str, Any], rc: Dict[str, Any]):
+        r["status"] = "confirmed" if int(rc["status"], 16) == 1 else "failed"
+        r["block"] = int(rc["blockNumber"], 16)
+        r["tx_hash"] = rc["transactionHash"]
+        r.pop("error", None)
+        r.pop("resign", None)
+        w3w.invalidate_balance(r["to"])
+
+    async def _reconcile(self):
+        # resume: ask the node about every signed/sent row before anything is
+        # signed or broadcast. Per row (all of its tx hashes, see _sign):
+        #   receipt               -> confirmed | failed
+        #   known to the node     -> sent
+        #   unknown, nonce mined  -> the nonce went to another tx, so this one
+        #                            can never land: pending, signed afresh
+        #   unknown otherwise     -> signed, the same raw tx is sent again
+        # rows whose lookup errored are left alone until the next run
+        rows = [r for r in self.state["rows"] if r["status"] in ("signed", "sent")]
+        if not rows:
+            return
+        mined = await _tx_count(self.state["sender"], "latest")
+
+        async def one(chunk):
+            calls = []
+            for r in chunk:
+                for h in _hashes(r):
+                    calls += [("eth_getTransactionReceipt", [h]), ("eth_getTransactionByHash", [h])]
+            res = iter(await w3w.arpc_batch(calls))
+            for r in chunk:
+                found = [(h, next(res), next(res)) for h in _hashes(r)]
+                if any("error" in rc or "error" in tx for _, rc, tx in found):
+                    log.warning("airdrop %s: lookup failed nonce=%s", self.job_id, r["nonce"])
+                    continue
+                rc = next((rc["result"] for _, rc, _ in found if rc.get("result")), None)
+                if rc is not None:
+                    self._settle(r, rc)
+                elif any(tx.get("result") for _, _, tx in found):
+                    r["status"] = "sent"
+                elif r["nonce"] < mined:
+                    log.warning("airdrop %s: nonce %s used by another tx, re-signing %s",
+                                self.job_id, r["nonce"], r["to"])
+                    r["status"] = "pending"
+                    for k in ("nonce", "raw", "tx_hash", "replaced", "resign"):
+                        r.pop(k, None)
+                else:
+                    r["status"] = "signed"
+
+        await asyncio.gather(*(one(rows[i:i + AIRDROP_RECEIPT_BATCH])
+                               for i in range(0, len(rows), AIRDROP_RECEIPT_BATCH)))
+        self.save()
+
+    async def _sign(self, pk_hex: str):
+        rows = self.state["rows"]
+        # a tx the node refused is re-signed at its own nonce (a replacement,
+        # only one version can be mined), and only while that nonce is still
+        # free: at or above the account's pending count
+        resign = [r for r in rows if r["status"] == "signed" and r.get("resign")]
+        if resign:
+            free = await _tx_count(self.state["sender"], "pending")
+            resign = [r for r in resign if r["nonce"] >= free]
+        for i in range(0, len(resign), AIRDROP_SIGN_CHUNK):
+            chunk = resign[i:i + AIRDROP_SIGN_CHUNK]
+            signed = await w3w.apresign_token_transfers(pk_hex, [(r["to"], r["amount"]) for r in chunk],
+                                                        nonces=[r["nonce"] for r in chunk])
+            for r, s in zip(chunk, signed):
+                r.setdefault("replaced", []).append(r["tx_hash"])
+                r.update(raw=s["raw"], tx_hash=s["tx_hash"])
+                r.pop("resign", None)
+                r.pop("error", None)
+            self.save()
+
+        # fresh nonces stay above the ones held by unsettled rows
+        held = [r["nonce"] for r in rows if r["status"] in ("signed", "sent")]
+        floor = max(held) + 1 if held else None
+        todo = [r for r in rows if r["status"] == "pending"]
+        for i in range(0, len(todo), AIRDROP_SIGN_CHUNK):
+            chunk = todo[i:i + AIRDROP_SIGN_CHUNK]
+            signed = await w3w.apresign_token_transfers(pk_hex, [(r["to"], r["amount"]) for r in chunk], floor=floor)
+            for r, s in zip(chunk, signed):
+                r.update(nonce=s["nonce"], raw=s["raw"], tx_hash=s["tx_hash"], status="signed")
+                r.pop("error", None)
+            self.save()
+
+    async def _submit(self):
+        # broadcast in nonce order through a bounded window, checkpointing every
+        # row. On a hard error the batch stops; the failed and the unsent rows
+        # keep their signed tx for the next run (see _reconcile)
+        rows = sorted((r for r in self.state["rows"] if r["status"] == "signed"), key=lambda r: r["nonce"])
+        sem = asyncio.Semaphore(AIRDROP_CONCURRENCY)
+        halted = asyncio.Event()
+
+        async def one(r):
+            async with sem:
+                if halted.is_set():
+                    return
+                try:
+                    await w3w.abroadcast_raw(r["raw"])
+                except Exception as e:
+                    msg = str(e)
+                    if not any(k in msg.lower() for k in _SENT):
+                        log.error("airdrop %s: broadcast failed nonce=%s: %s", self.job_id, r["nonce"], msg)
+                        r["error"] = msg
+                        # a JSON-RPC error is the node refusing this tx (price,
+                        # funds); a transport error may still have delivered it
+                        if isinstance(e, ValueError):
+                            r["resign"] = True
+                        halted.set()
+                        self.save()
+                        return
+                r["status"] = "sent"
+                r["sent_at"] = time.time()
+                r.pop("error", None)
+                r.pop("resign", None)
+                self.save()
+
+        await asyncio.gather(*(one(r) for r in rows))
+        if halted.is_set():
+            w3w.resync_nonce(self.state["sender"])
+        self.save()
+
+    async def _track(self):
+        # one receipt batch per AIRDROP_RECEIPT_BATCH rows per tick, batches in
+        # flight concurrently; rows still "sent" at the timeout are settled by
+        # the next run's _reconcile
+        deadline = time.monotonic() + AIRDROP_RECEIPT_TIMEOUT
+
+        async def one(chunk):
+            calls = [("eth_getTransactionReceipt", [h]) for r in chunk for h in _hashes(r)]
+            try:
+                res = iter(await w3w.arpc_batch(calls))
+            except Exception as e:
+                log.warning("airdrop %s: receipts: %s", self.job_id, e)
+                return
+            for r in chunk:
+                rcs = [next(res).get("result") for _ in _hashes(r)]
+                rc = next((rc for rc in rcs if rc), None)
+                if rc is not None:
+                    self._settle(r, rc)
+
+        while time.monotonic() < deadline:
+            pending = [r for r in self.state["rows"] if r["status"] == "sent"]
+            if not pending:
+                break
+            await asyncio.gather(*(one(pending[i:i + AIRDROP_RECEIPT_BATCH])
+                                   for i in range(0, len(pending), AIRDROP_RECEIPT_BATCH)))
+            self.save()
+            if any(r["status"] == "sent" for r in pending):
+                await asyncio.sleep(AIRDROP_RECEIPT_POLL)
+        w3w.invalidate_balance(self.state["sender"])
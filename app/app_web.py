@@ -1,22 +1,138 @@
-import os, logging, sys, asyncio
-from flask import Flask, request, jsonify
-from pythonjsonlogger import jsonlogger
-from dotenv import load_dotenv
+import os, logging, time, asyncio, threading, atexit
+from flask import Flask, Response, request, jsonify
+from telegram import Update as TgUpdate
 
-from .bot import application, bot
+from . import settings
+from . import bot as tg
 from . import wallet_web3 as w3w
+from . import metrics
 
-# logging
-load_dotenv()
-handler = logging.StreamHandler(sys.stdout)
-handler.setFormatter(jsonlogger.JsonFormatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
-root = logging.getLogger()
-root.handlers = [handler]
-root.setLevel(getattr(logging, os.getenv("LOG_LEVEL","INFO").upper(), logging.INFO))
+settings.setup_logging()
 log = logging.getLogger("slh.web")
 
 WEBHOOK_URL = (os.getenv("WEBHOOK_URL") or "").rstrip("/")
-CHAIN_ID = int(os.getenv("CHAIN_ID","56"))
+CHAIN_ID = settings.CHAIN_ID
+WEBHOOK_SUBMIT_TIMEOUT = float(os.getenv("WEBHOOK_SUBMIT_TIMEOUT","2"))
+# PTB initialize (getMe) + start + post_init; a failure is retried on the next request
+WEBHOOK_START_TIMEOUT = float(os.getenv("WEBHOOK_START_TIMEOUT","30"))
+
+WEBHOOK_SECONDS = metrics.histogram("slh_webhook_seconds", "Webhook request handling time (parse + enqueue)", ["status"])
+
+# ========== long-lived PTB loop ==========
+# One event loop per process, owned by a daemon thread. The Application is
+# initialized and started on it once; webhook requests only enqueue updates.
+_loop: asyncio.AbstractEventLoop = None
+_loop_pid = 0
+_started = False
+_loop_lock = threading.Lock()
+_preload_pid = 0
+
+class NotReady(Exception):
+    # the Application could not be started; /webhook answers 503 so Telegram redelivers
+    pass
+
+def _run_loop(loop: asyncio.AbstractEventLoop, ready: threading.Event):
+    asyncio.set_event_loop(loop)
+    loop.call_soon(ready.set)
+    loop.run_forever()
+
+async def _start_app(application):
+    post_init = False
+    try:
+        await application.initialize()
+        await application.start()
+        if application.post_init:
+            post_init = True
+            await application.post_init(application)
+    except BaseException:  # incl. cancellation on timeout
+        # back to a clean state so the next request can try again
+        try:
+            if application.running:
+                await application.stop()
+            if post_init and application.post_shutdown:
+                await application.post_shutdown(application)
+            await application.shutdown()
+        except Exception:
+            log.exception("PTB cleanup after a failed start failed")
+        raise
+
+def _ensure_loop() -> asyncio.AbstractEventLoop:
+    # lazy, and per process: a loop started before a fork (gunicorn --preload)
+    # has no thread in the child, so the child starts its own. Raises NotReady
+    # while the Application fails to start; each call retries.
+    global _loop, _loop_pid, _started
+    if _started and _loop_pid == os.getpid():
+        return _loop
+    application = tg.build()
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            if application.running:
+                # started in the parent: its updater tasks didn't survive the fork
+                raise NotReady("application was started before fork; start it per worker")
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+            threading.Thread(target=_run_loop, args=(loop, ready), name="ptb-loop", daemon=True).start()
+            ready.wait()
+            _loop, _loop_pid, _started = loop, os.getpid(), False
+        if not _started:
+            fut = asyncio.run_coroutine_threadsafe(_start_app(application), _loop)
+            try:
+                fut.result(timeout=WEBHOOK_START_TIMEOUT)
+            except Exception as e:
+                fut.cancel()
+                log.exception("PTB application failed to start")
+                raise NotReady(str(e) or type(e).__name__) from e
+            _started = True
+            log.info("PTB application started (webhook mode)")
+    return _loop
+
+def _submit(coro):
+    return asyncio.run_coroutine_threadsafe(coro, _ensure_loop())
+
+def preload():
+    # what the first update would otherwise wait for: PTB initialize (getMe)
+    # and post_init, the web3 import and contracts, token metadata, the store
+    t0 = time.perf_counter()
+    try:
+        _ensure_loop()
+        w3w.web3()
+        tg.store.warm()
+        w3w.token_meta()
+    except Exception as e:
+        log.warning("preload incomplete: %s", e)
+    log.info("preload done in %.2fs", time.perf_counter() - t0)
+
+def start_preload():
+    # preload in the background, once per process. Only ever from the process
+    # that serves requests (server start, or gunicorn's post_fork hook, see
+    # app/gunicorn_conf.py): post_init starts the receipt watcher, indexer and
+    # shard heartbeat, which must not run in a master that forks workers
+    global _preload_pid
+    with _loop_lock:
+        if _preload_pid == os.getpid():
+            return
+        _preload_pid = os.getpid()
+    threading.Thread(target=preload, name="preload", daemon=True).start()
+
+@atexit.register
+def _shutdown_loop():
+    if _loop is None or _loop_pid != os.getpid() or not _loop.is_running():
+        return
+    if not _started:
+        _loop.call_soon_threadsafe(_loop.stop)
+        return
+    application = tg.application
+    async def _stop():
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+    try:
+        asyncio.run_coroutine_threadsafe(_stop(), _loop).result(timeout=10)
+    except Exception:
+        log.exception("PTB shutdown failed")
+    _loop.call_soon_threadsafe(_loop.stop)
 
 app = Flask(__name__)
 
@@ -30,7 +146,14 @@ def version():
 
 @app.get("/health")
 def health():
-    return jsonify({"ok": True, "rpc_connected": w3w.ok(), "chain_id": CHAIN_ID})
+    return jsonify({"ok": True, "rpc_connected": w3w.ok(), "chain_id": CHAIN_ID,
+                    "balance_cache": w3w.balance_cache.stats(), "rpc_endpoints": w3w.rpc_pool.status(),
+                    "shard": tg.router.status() if tg.router is not None else None,
+                    "index": tg.indexer.status() if tg.indexer is not None else None})
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
 
 @app.get("/set_webhook")
 def set_webhook():
@@ -38,7 +161,7 @@ def set_webhook():
         return jsonify({"ok": False, "error": "WEBHOOK_URL missing"}), 400
     url = f"{WEBHOOK_URL}/webhook"
     try:
-        res = asyncio.run(bot.set_webhook(url=url, drop_pending_updates=True))
+        res = _submit(tg.build().bot.set_webhook(url=url, drop_pending_updates=True)).result(timeout=30)
         return jsonify({"ok": bool(res), "set_to": url})
     except Exception as e:
         log.exception("set_webhook failed")
@@ -46,17 +169,32 @@ def set_webhook():
 
 @app.post("/webhook")
 def webhook():
+    t0, status = time.perf_counter(), "error"
     try:
         data = request.get_json(force=True, silent=True) or {}
-        update = application.bot._unfreeze({'update_id': 0})  # no-op; PTB needs Update instance
-        # Proper way:
-        from telegram import Update as TgUpdate
-        upd = TgUpdate.de_json(data, bot)
-        asyncio.run(application.process_update(upd))
+        _ensure_loop()  # starts the shard heartbeat, so the ring is current
+        # another replica owns this user: hand it over and ACK
+        if tg.router is not None and not tg.router.route(data):
+            status = "forwarded"
+            return jsonify({"ok": True})
+        upd = TgUpdate.de_json(data, tg.bot)
+        if upd is None:
+            status = "empty"
+            return jsonify({"ok": False, "error": "empty update"}), 200
+        # enqueue and ACK right away; handlers run on the PTB loop
+        _submit(tg.application.update_queue.put(upd)).result(timeout=WEBHOOK_SUBMIT_TIMEOUT)
+        status = "ok"
         return jsonify({"ok": True})
+    except NotReady as e:
+        status = "not_ready"
+        return jsonify({"ok": False, "error": f"bot not started: {e}"}), 503
     except Exception as e:
         log.exception("webhook error")
         return jsonify({"ok": False, "error": str(e)}), 200
+    finally:
+        WEBHOOK_SECONDS.observe(time.perf_counter() - t0, status=status)
 
 if __name__ == "__main__":
+    if settings.WEBHOOK_PRELOAD:
+        start_preload()
     app.run(host="0.0.0.0", port=int(os.getenv("PORT","8080")))
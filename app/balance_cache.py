@@ -0,0 +1,63 @@
+import time, threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+class BalanceCache:
+    # Short-TTL LRU for balance reads keyed by (chain_id, address).
+    # Entries also remember the block they were read at (-1 if unknown); once a
+    # newer block is reported through note_block() they are treated as stale.
+    def __init__(self, maxsize: int = 10000, ttl: float = 5.0, block_aware: bool = True):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.block_aware = block_aware
+        self.block = -1
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def note_block(self, block: Optional[int]):
+        if block is not None and block > self.block:
+            self.block = block
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            e = self._data.get(key)
+            if e is not None:
+                expires, block, value = e
+                if expires > now and not (self.block_aware and 0 <= block < self.block):
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: Any, block: Optional[int] = None):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, self.block if block is None else block, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {"size": len(self._data), "maxsize": self.maxsize, "ttl": self.ttl, "block": self.block,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "hit_ratio": (self.hits / total) if total else 0.0}
@@ -1,43 +1,176 @@
-import os, sys, logging, asyncio
+import os, logging, asyncio, threading
+from decimal import Decimal, ROUND_DOWN
 from typing import Optional
-from dotenv import load_dotenv
-from pythonjsonlogger import jsonlogger
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
+from . import settings
+from telegram import Update, CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
+from telegram.ext import (Application, CommandHandler, MessageHandler, CallbackQueryHandler,
+                          ContextTypes, filters)
 
 from .util_store import Store
 from . import wallet_web3 as w3w
+from .address import is_address, is_private_key, checksum
+from .airdrop import AirdropJob, AirdropBusy, parse_rows
+from .receipts import ReceiptWatcher
+from .token_index import TokenIndex, TokenIndexer, INDEXER_ENABLED
+from .portfolio import Portfolio, parse_tokens, PORTFOLIO_TOKENS, PORTFOLIO_MAX_ADDRESSES
+from .ratelimit import RateLimiter, Coalescer
+from . import kv
+from .persistence import KVPersistence
+from .sharding import UpdateRouter, OrderedUpdateProcessor
+from . import metrics
+from .metrics import timed_handler
 
-# ========== logging ==========
-load_dotenv()
-handler = logging.StreamHandler(sys.stdout)
-handler.setFormatter(jsonlogger.JsonFormatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
-root = logging.getLogger()
-root.handlers = [handler]
-root.setLevel(getattr(logging, os.getenv("LOG_LEVEL","INFO").upper(), logging.INFO))
+settings.setup_logging()
 log = logging.getLogger("slh.bot")
 
 TOKEN = os.getenv("BOT_TOKEN") or os.getenv("TELEGRAM_BOT_TOKEN") or ""
 WEBHOOK_URL = (os.getenv("WEBHOOK_URL") or "").rstrip("/")
-DATA_DIR = os.getenv("DATA_DIR","/app/data")
+DATA_DIR = settings.DATA_DIR
 SECRET_KEY = os.getenv("SECRET_KEY","changeme-changeme-changeme")
 ADMIN_USER_ID = int(os.getenv("ADMIN_USER_ID","0") or "0")
 PRICE_SHEKEL_PER_SLH = float(os.getenv("PRICE_SHEKEL_PER_SLH","444"))
+# alternative Bot API server (local telegram-bot-api, benchmarks' fake server)
+TELEGRAM_API_BASE = (os.getenv("TELEGRAM_API_BASE") or "").rstrip("/")
+# handlers await RPC in a thread pool; let other users' updates run meanwhile
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES","64"))
+# token buckets: updates/second and burst, per user and per chat (0 = off)
+RATE_USER = float(os.getenv("RATE_USER","1"))
+RATE_USER_BURST = float(os.getenv("RATE_USER_BURST","5"))
+RATE_CHAT = float(os.getenv("RATE_CHAT","20"))
+RATE_CHAT_BURST = float(os.getenv("RATE_CHAT_BURST","40"))
+# seconds Telegram still accepts answerCallbackQuery; a tap queued longer is dropped
+CALLBACK_ANSWER_WINDOW = float(os.getenv("CALLBACK_ANSWER_WINDOW","15"))
+# with REDIS_URL: user_data in Redis and updates sharded by user across replicas
+SHARD_UPDATES = kv.shared() and os.getenv("SHARD_UPDATES","1").lower() in ("1","true","yes")
+HISTORY_LIMIT = int(os.getenv("HISTORY_LIMIT","10"))
 
-store = Store(DATA_DIR, SECRET_KEY)
+# ========== objects ==========
+# built by build() on first use (the webhook's loop start or preload), not at
+# import: the Store, ReceiptWatcher, Transfer index, Portfolio, the shard
+# router and the Application itself
+store: Optional[Store] = None
+receipts: Optional[ReceiptWatcher] = None
+token_index: Optional[TokenIndex] = None   # Transfer-event index behind /history
+indexer: Optional[TokenIndexer] = None
+portfolio: Optional[Portfolio] = None      # /portfolio in one RPC batch
+processor: Optional[OrderedUpdateProcessor] = None
+router: Optional[UpdateRouter] = None
+application: Optional[Application] = None
+bot = None
+_build_lock = threading.Lock()
 
-application = Application.builder().token(TOKEN).build()
-bot = application.bot
+user_limiter = RateLimiter(RATE_USER, RATE_USER_BURST)
+chat_limiter = RateLimiter(RATE_CHAT, RATE_CHAT_BURST)
+coalescer = Coalescer()
 
+async def _notify(chat_id: int, text: str):
+    await application.bot.send_message(chat_id, text)
+
+async def _portfolio_meta(token: str):
+    # the SLH token comes from wallet_web3's metadata cache, others are read in the batch
+    return await w3w.atoken_meta() if token == w3w.TOKEN_ADDR.lower() else None
+
+async def _answer(cq: CallbackQuery, text: Optional[str] = None) -> bool:
+    # False: Telegram refused the answer (query too old or already answered),
+    # the tap is stale and the caller drops it
+    try:
+        await cq.answer(text)
+        return True
+    except BadRequest as e:
+        log.debug("callback %s not answered: %s", cq.id, e)
+        return False
+
+# ========== arrival checks (OrderedUpdateProcessor) ==========
+async def _admit(update: Update) -> bool:
+    # rate limits apply when an update arrives, before it joins the user's
+    # queue, so a burst of taps is shed instead of waiting its turn
+    user, chat, cq = update.effective_user, update.effective_chat, update.callback_query
+    if user is not None and user.id == ADMIN_USER_ID:
+        return True
+    ok = (user is None or user_limiter.allow(user.id)) and (chat is None or chat_limiter.allow(chat.id))
+    if not ok and cq is not None:
+        await _answer(cq, "⏳ לאט יותר…")
+    return ok
+
+def _max_wait(update: Update) -> Optional[float]:
+    # a tap that queued past the answer window can't be answered any more
+    return CALLBACK_ANSWER_WINDOW if update.callback_query is not None else None
+
+async def _post_init(app: Application):
+    receipts.start()
+    if indexer is not None:
+        indexer.start()
+    if router is not None:
+        router.start(app)
+
+async def _post_shutdown(app: Application):
+    if router is not None:
+        await router.stop()
+    if indexer is not None:
+        await indexer.stop()
+    await receipts.stop()
+
+def _register_metrics():
+    metrics.gauge("slh_rate_limited", "Updates dropped by the rate limiter", lambda: {
+        ("user",): user_limiter.limited, ("chat",): chat_limiter.limited}, ["scope"])
+    metrics.gauge("slh_updates_dropped", "Updates dropped on arrival or after outwaiting their window", lambda: {
+        ("rejected",): processor.rejected, ("expired",): processor.expired}, ["reason"])
+    metrics.gauge("slh_coalesced", "Calls that joined an in-flight duplicate", lambda: {(): coalescer.shared})
+    if router is not None:
+        metrics.gauge("slh_shard_updates", "Updates forwarded to / received from other replicas", lambda: {
+            ("forwarded",): router.forwarded, ("received",): router.received}, ["direction"])
+    metrics.gauge("slh_receipts_pending", "Sent transactions awaiting a receipt", lambda: {(): receipts.pending()})
+    if indexer is not None:
+        metrics.gauge("slh_index_lag_blocks", "Blocks between the chain head and the Transfer index",
+                      lambda: {(): indexer.lag() or 0})
+
+def build() -> Application:
+    # once per process; `application` is assigned last, so a non-None value
+    # means everything else is in place
+    global store, receipts, token_index, indexer, portfolio, processor, router, application, bot
+    if application is None:
+        with _build_lock:
+            if application is None:
+                store = Store(DATA_DIR, SECRET_KEY)
+                receipts = ReceiptWatcher(DATA_DIR, _notify)
+                if INDEXER_ENABLED and int(w3w.TOKEN_ADDR, 16) != 0:
+                    token_index = TokenIndex(DATA_DIR, w3w.TOKEN_ADDR)
+                    indexer = TokenIndexer(token_index, w3w.arpc_batch)
+                portfolio = Portfolio(parse_tokens(PORTFOLIO_TOKENS, w3w.TOKEN_ADDR, PRICE_SHEKEL_PER_SLH),
+                                      w3w.arpc_batch, cache=w3w.balance_cache, token_meta=_portfolio_meta)
+                processor = OrderedUpdateProcessor(max(1, CONCURRENT_UPDATES), admit=_admit, max_wait=_max_wait)
+                router = UpdateRouter() if SHARD_UPDATES else None
+                builder = (Application.builder().token(TOKEN).concurrent_updates(processor)
+                           .post_init(_post_init).post_shutdown(_post_shutdown))
+                if kv.shared():
+                    builder = builder.persistence(KVPersistence())
+                if TELEGRAM_API_BASE:
+                    builder = builder.base_url(f"{TELEGRAM_API_BASE}/bot").base_file_url(f"{TELEGRAM_API_BASE}/file/bot")
+                app = builder.build()
+                setup_handlers(app)
+                _register_metrics()
+                bot = app.bot
+                application = app
+                log.info("✅ SLH Wallet initialized")
+    return application
+
+async def _balances(addr: str):
+    # concurrent reads for one address share a single backend call
+    return await coalescer.run(("bal", addr.lower()), lambda: w3w.aget_balances(addr))
+
+@timed_handler("start")
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     kb = [[InlineKeyboardButton("👛 הארנק שלי", callback_data="act:wallet"),
            InlineKeyboardButton("💸 העבר SLH", callback_data="act:send_slh")],
-          [InlineKeyboardButton("⚙️ הגדרות", callback_data="act:settings")]]
+          [InlineKeyboardButton("💼 התיק שלי", callback_data="act:portfolio"),
+           InlineKeyboardButton("⚙️ הגדרות", callback_data="act:settings")]]
     await update.effective_message.reply_text(
         "👋 ברוך הבא!\nSLH Platform — ארנק, העברות, מתנות וקהילה.",
         reply_markup=InlineKeyboardMarkup(kb)
     )
 
+@timed_handler("act_wallet")
 async def act_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE):
     uid = update.effective_user.id
     addr = store.get_wallet(uid)
@@ -45,7 +178,7 @@ async def act_wallet(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.effective_message.reply_text("לא הוגדרה כתובת. שלח עכשיו את כתובת ה‑BSC שלך (0x…).")
         return
     try:
-        b = w3w.get_balances(addr)
+        b = await _balances(addr)
         slh_val = b.get("slh",{}).get("value")
         text = f"👛 הארנק שלך\n\nכתובת:\n{addr}\n\n💰 יתרת SLH: {slh_val if slh_val is not None else '—'}"
     except Exception as e:
@@ -58,12 +191,18 @@ async def act_settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
            InlineKeyboardButton("🏷️ כתובת", callback_data="act:set_addr")]]
     await update.effective_message.reply_text("⚙️ הגדרות", reply_markup=InlineKeyboardMarkup(kb))
 
+@timed_handler("cb_router")
 async def cb_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
     cq = update.callback_query
-    data = cq.data if cq else ""
-    await cq.answer()
+    if not await _answer(cq):
+        return
+    return await _route_callback(update, context, cq.data or "")
+
+async def _route_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, data: str):
     if data == "act:wallet":
         return await act_wallet(update, context)
+    if data == "act:portfolio":
+        return await cmd_portfolio(update, context)
     if data == "act:settings":
         return await act_settings(update, context)
     if data == "act:set_addr":
@@ -76,19 +215,20 @@ async def cb_router(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return await update.effective_message.reply_text("פורמט: /send_slh <to> <amount>")
     return await update.effective_message.reply_text("בקרוב…")
 
+@timed_handler("on_text")
 async def on_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = (update.effective_message.text or "").strip()
     uid = update.effective_user.id
 
     if context.user_data.pop("awaiting_addr", False):
-        if text.startswith("0x") and len(text) == 42:
-            store.set_wallet(uid, text)
+        if is_address(text):
+            store.set_wallet(uid, checksum(text))
             return await update.effective_message.reply_text("✅ כתובת נשמרה.")
         else:
             return await update.effective_message.reply_text("❌ כתובת לא תקינה.")
 
     if context.user_data.pop("awaiting_pk", False):
-        if text.startswith("0x") and len(text) == 66:
+        if is_private_key(text) and text.startswith("0x"):
             store.set_pk(uid, text)
             return await update.effective_message.reply_text("✅ PK נשמר (מוצפן).")
         else:
@@ -96,17 +236,111 @@ async def on_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     return  # ignore other text
 
+@timed_handler("cmd_balance")
 async def cmd_balance(update: Update, context: ContextTypes.DEFAULT_TYPE):
     uid = update.effective_user.id
     addr = store.get_wallet(uid)
     if not addr:
         await update.effective_message.reply_text("לא הוגדרה כתובת. /start ואז ⚙️ ➜ כתובת")
         return
-    b = w3w.get_balances(addr)
+    b = await _balances(addr)
     slh_val = b.get("slh",{}).get("value")
     bnb_val = b.get("bnb",{}).get("eth")
     await update.effective_message.reply_text(f"BNB: {bnb_val}\nSLH: {slh_val}")
 
+def _short(addr: str) -> str:
+    return f"{addr[:6]}…{addr[-4:]}"
+
+@timed_handler("cmd_history")
+async def cmd_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    uid = update.effective_user.id
+    addr = store.get_wallet(uid)
+    if not addr:
+        await update.effective_message.reply_text("לא הוגדרה כתובת. /start ואז ⚙️ ➜ כתובת")
+        return
+    if token_index is None:
+        await update.effective_message.reply_text("📜 היסטוריה לא זמינה כרגע.")
+        return
+    rows = await asyncio.to_thread(token_index.history, addr, HISTORY_LIMIT)
+    if not rows:
+        await update.effective_message.reply_text("📜 אין עדיין העברות SLH לכתובת הזו.")
+        return
+    meta = await w3w.atoken_meta()
+    lines = [f"📜 {len(rows)} ההעברות האחרונות"]
+    for r in rows:
+        amount = f"{Decimal(r['value']).scaleb(-meta['decimals']).normalize():f}"
+        if r["direction"] == "in":
+            lines.append(f"⬇️ +{amount} {meta['symbol']} מ‑{_short(r['from'])} · בלוק {r['block']}")
+        else:
+            lines.append(f"⬆️ -{amount} {meta['symbol']} ל‑{_short(r['to'])} · בלוק {r['block']}")
+    await update.effective_message.reply_text("\n".join(lines))
+
+def _amount(x) -> str:
+    q = Decimal(x["raw"]).scaleb(-int(x["decimals"])).quantize(Decimal("0.000001"), rounding=ROUND_DOWN)
+    return f"{q.normalize():,f}"
+
+def _asset_line(x) -> str:
+    if "error" in x:
+        return f"{x.get('symbol') or _short(x['token'])} —"
+    line = f"{x['symbol']} {_amount(x)}"
+    return line + (f" ≈ ₪{x['value_ils']:,.2f}" if x.get("value_ils") else "")
+
+@timed_handler("cmd_portfolio")
+async def cmd_portfolio(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    uid = update.effective_user.id
+    addrs = store.get_addresses(uid)
+    if not addrs:
+        await update.effective_message.reply_text("לא הוגדרה כתובת. /start ואז ⚙️ ➜ כתובת, או /watch <address>")
+        return
+    try:
+        p = await portfolio.fetch(addrs)
+    except Exception as e:
+        log.error("portfolio error: %s", e)
+        await update.effective_message.reply_text("❌ שגיאה בשליפת התיק.")
+        return
+    lines = [f"💼 התיק שלך · {len(addrs)} כתובות" if len(addrs) > 1 else "💼 התיק שלך"]
+    if len(addrs) > 1:
+        for w in p["addresses"]:
+            lines.append(f"\n{_short(w['address'])}")
+            lines += [f"  {_asset_line(x)}" for x in w["assets"]]
+        lines.append("\nסה״כ")
+    lines += [f"  {_asset_line(x)}" for x in p["totals"]]
+    if p["value_ils"]:
+        lines.append(f"\n💰 שווי כולל ≈ ₪{p['value_ils']:,.2f}")
+    if not p["complete"]:
+        lines.append("⚠️ חלק מהיתרות לא נקראו, נסה שוב בעוד רגע.")
+    await update.effective_message.reply_text("\n".join(lines))
+
+@timed_handler("cmd_watch")
+async def cmd_watch(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # /watch <address>: add an address to /portfolio; no argument lists them
+    uid = update.effective_user.id
+    if not context.args:
+        addrs = store.get_addresses(uid)
+        listing = "\n".join(addrs) if addrs else "אין כתובות."
+        await update.effective_message.reply_text(f"{listing}\n\nשימוש: /watch <address> · /unwatch <address>")
+        return
+    addr = context.args[0]
+    if not is_address(addr):
+        await update.effective_message.reply_text("❌ כתובת לא תקינה.")
+        return
+    try:
+        added = store.add_address(uid, checksum(addr), PORTFOLIO_MAX_ADDRESSES)
+    except ValueError:
+        await update.effective_message.reply_text(f"❌ אפשר עד {PORTFOLIO_MAX_ADDRESSES} כתובות. הסר אחת עם /unwatch.")
+        return
+    await update.effective_message.reply_text("✅ נוספה לתיק." if added else "הכתובת כבר בתיק.")
+
+@timed_handler("cmd_unwatch")
+async def cmd_unwatch(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    uid = update.effective_user.id
+    if not context.args:
+        await update.effective_message.reply_text("שימוש: /unwatch <address>")
+        return
+    removed = store.remove_address(uid, context.args[0])
+    await update.effective_message.reply_text("✅ הוסרה מהתיק." if removed else "❌ הכתובת לא ברשימה (כתובת הארנק מוחלפת בהגדרות).")
+
+@timed_handler("cmd_send_slh")
 async def cmd_send_slh(update: Update, context: ContextTypes.DEFAULT_TYPE):
     uid = update.effective_user.id
     parts = (update.effective_message.text or "").split()
@@ -114,6 +348,9 @@ async def cmd_send_slh(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.effective_message.reply_text("שימוש: /send_slh <to> <amount>")
         return
     to, amount_s = parts[1], parts[2]
+    if not is_address(to):
+        await update.effective_message.reply_text("❌ כתובת לא תקינה.")
+        return
     try:
         amount = float(amount_s)
     except:
@@ -124,19 +361,101 @@ async def cmd_send_slh(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.effective_message.reply_text("❌ נדרש PK שמור בהגדרות.")
         return
     try:
-        tx = w3w.send_token(pk, to, amount)
-        await update.effective_message.reply_text(f"✅ נשלח. tx: {tx['tx_hash']}")
+        tx = await w3w.asend_token(pk, to, amount)
+        await receipts.aadd(tx["tx_hash"], update.effective_message.chat_id, [tx["from"], tx["to"]])
+        await update.effective_message.reply_text(f"✅ נשלח. tx: {tx['tx_hash']}\nאעדכן כשההעברה תאושר.")
     except Exception as e:
         log.error("send_slh failed: %s", e)
         await update.effective_message.reply_text("❌ שליחה נכשלה. בדוק BNB לגז, כתובת, סכום.")
 
-def setup_handlers():
+# ========== admin: airdrops ==========
+def _is_admin(update: Update) -> bool:
+    return bool(ADMIN_USER_ID) and update.effective_user is not None and update.effective_user.id == ADMIN_USER_ID
+
+async def _run_airdrop(job: AirdropJob, pk: str, chat_id: int):
+    try:
+        summary = await job.run(pk)
+        text = f"✅ איירדרופ {job.job_id} הסתיים\n{summary}"
+    except AirdropBusy:
+        text = f"⏳ איירדרופ {job.job_id} כבר רץ — /airdrop_status {job.job_id}"
+    except Exception as e:
+        log.exception("airdrop %s failed", job.job_id)
+        text = f"❌ איירדרופ {job.job_id} נעצר: {e}\nהמשך: /airdrop_resume {job.job_id}"
+    await bot.send_message(chat_id, text)
+
+async def cmd_airdrop(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # /airdrop followed by "address,amount" lines, or a CSV file with /airdrop as caption
+    if not _is_admin(update):
+        return
+    msg = update.effective_message
+    if msg.document:
+        f = await msg.document.get_file()
+        text = (await f.download_as_bytearray()).decode("utf-8-sig")
+    else:
+        text = (msg.text or "").partition("\n")[2]
+    try:
+        rows = parse_rows(text)
+    except ValueError as e:
+        await msg.reply_text(f"❌ {e}")
+        return
+    if not rows:
+        await msg.reply_text("שימוש: /airdrop ואחריו שורות address,amount (או קובץ CSV עם /airdrop בכיתוב)")
+        return
+    pk = store.get_pk(update.effective_user.id)
+    if not pk:
+        await msg.reply_text("❌ נדרש PK שמור בהגדרות.")
+        return
+    sender = w3w.address_from_pk(pk)
+    job = AirdropJob.create(DATA_DIR, rows, sender)
+    await msg.reply_text(f"🚀 איירדרופ {job.job_id}: {len(rows)} נמענים, {sum(v for _, v in rows)} SLH")
+    context.application.create_task(_run_airdrop(job, pk, msg.chat_id))
+
+async def cmd_airdrop_resume(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not _is_admin(update):
+        return
+    if not context.args:
+        await update.effective_message.reply_text("שימוש: /airdrop_resume <job_id>")
+        return
+    try:
+        job = AirdropJob.load(DATA_DIR, context.args[0])
+    except FileNotFoundError:
+        await update.effective_message.reply_text("❌ לא נמצא.")
+        return
+    pk = store.get_pk(update.effective_user.id)
+    if not pk:
+        await update.effective_message.reply_text("❌ נדרש PK שמור בהגדרות.")
+        return
+    if job.is_running():
+        await update.effective_message.reply_text(f"⏳ {job.job_id} כבר רץ: {job.summary()}")
+        return
+    await update.effective_message.reply_text(f"🔁 ממשיך {job.job_id}: {job.summary()}")
+    context.application.create_task(_run_airdrop(job, pk, update.effective_message.chat_id))
+
+async def cmd_airdrop_status(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not _is_admin(update):
+        return
+    if not context.args:
+        await update.effective_message.reply_text("שימוש: /airdrop_status <job_id>")
+        return
+    try:
+        job = AirdropJob.load(DATA_DIR, context.args[0])
+    except FileNotFoundError:
+        await update.effective_message.reply_text("❌ לא נמצא.")
+        return
+    await update.effective_message.reply_text(f"{job.job_id}: {job.summary()}")
+
+def setup_handlers(application: Application):
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("balance", cmd_balance))
     application.add_handler(CommandHandler("send_slh", cmd_send_slh))
+    application.add_handler(CommandHandler("history", cmd_history))
+    application.add_handler(CommandHandler("portfolio", cmd_portfolio))
+    application.add_handler(CommandHandler("watch", cmd_watch))
+    application.add_handler(CommandHandler("unwatch", cmd_unwatch))
+    application.add_handler(CommandHandler("airdrop", cmd_airdrop))
+    application.add_handler(MessageHandler(filters.Document.ALL & filters.CaptionRegex(r"^/airdrop\b"), cmd_airdrop))
+    application.add_handler(CommandHandler("airdrop_resume", cmd_airdrop_resume))
+    application.add_handler(CommandHandler("airdrop_status", cmd_airdrop_status))
     application.add_handler(CallbackQueryHandler(cb_router))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, on_text))
     log.info("✅ Handlers registered")
-
-setup_handlers()
-log.info("✅ SLH Wallet initialized")
@@ -0,0 +1,12 @@
+# gunicorn -c python:app.gunicorn_conf app.app_web:app
+# With WEBHOOK_PRELOAD=1 each worker warms up right after it is forked, before
+# its first request; the master never builds the bot (see app_web.start_preload)
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+
+def post_fork(server, worker):
+    from . import settings
+    if settings.WEBHOOK_PRELOAD:
+        from .app_web import start_preload
+        start_preload()
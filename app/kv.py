@@ -0,0 +1,145 @@
+import os, time, asyncio, threading, logging
+from collections import defaultdict, deque
+from typing import Dict, Optional
+
+log = logging.getLogger("slh.kv")
+
+REDIS_URL = os.getenv("REDIS_URL", "")
+KV_PREFIX = os.getenv("KV_PREFIX", "slh:")
+
+# Small key/value interface shared by the Store "kv" backend, the PTB
+# persistence and update sharding. RedisKV talks to any Redis-compatible
+# server (REDIS_URL); MemoryKV is the in-process stand-in with the same
+# semantics, for a single replica and for tests/benchmarks.
+
+class MemoryKV:
+    def __init__(self):
+        self._h: Dict[str, Dict[str, str]] = defaultdict(dict)
+        self._lists: Dict[str, deque] = defaultdict(deque)
+        self._cond = threading.Condition()
+
+    def hget(self, key: str, field: str) -> Optional[str]:
+        with self._cond:
+            return self._h.get(key, {}).get(field)
+
+    def hgetall(self, key: str) -> Dict[str, str]:
+        with self._cond:
+            return dict(self._h.get(key, {}))
+
+    def hset(self, key: str, mapping: Dict[str, str]):
+        with self._cond:
+            self._h[key].update(mapping)
+
+    def hdel(self, key: str, *fields: str):
+        with self._cond:
+            h = self._h.get(key, {})
+            for f in fields:
+                h.pop(f, None)
+
+    def hcas(self, key: str, field: str, old: Optional[str], new: str) -> bool:
+        # set field to new only if it still holds old
+        with self._cond:
+            if self._h.get(key, {}).get(field) != old:
+                return False
+            self._h[key][field] = new
+            return True
+
+    def rpush(self, key: str, value: str):
+        with self._cond:
+            self._lists[key].append(value)
+            self._cond.notify_all()
+
+    def lpop(self, key: str) -> Optional[str]:
+        with self._cond:
+            q = self._lists.get(key)
+            return q.popleft() if q else None
+
+    def blpop(self, key: str, timeout: float) -> Optional[str]:
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not self._lists.get(key):
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return None
+                self._cond.wait(left)
+            return self._lists[key].popleft()
+
+    def llen(self, key: str) -> int:
+        with self._cond:
+            return len(self._lists.get(key, ()))
+
+class RedisKV:
+    _CAS = """
+    if redis.call('HGET', KEYS[1], ARGV[1]) == ARGV[2] then
+        redis.call('HSET', KEYS[1], ARGV[1], ARGV[3]) return 1
+    end
+    return 0"""
+
+    def __init__(self, url: str):
+        import redis  # optional dependency, only needed with REDIS_URL
+        self.r = redis.Redis.from_url(url, decode_responses=True, health_check_interval=30)
+        self._cas = self.r.register_script(self._CAS)
+
+    def hget(self, key: str, field: str) -> Optional[str]:
+        return self.r.hget(key, field)
+
+    def hgetall(self, key: str) -> Dict[str, str]:
+        return self.r.hgetall(key)
+
+    def hset(self, key: str, mapping: Dict[str, str]):
+        if mapping:
+            self.r.hset(key, mapping=mapping)
+
+    def hdel(self, key: str, *fields: str):
+        if fields:
+            self.r.hdel(key, *fields)
+
+    def hcas(self, key: str, field: str, old: Optional[str], new: str) -> bool:
+        if old is None:
+            return bool(self.r.hsetnx(key, field, new))
+        return bool(self._cas(keys=[key], args=[field, old, new]))
+
+    def rpush(self, key: str, value: str):
+        self.r.rpush(key, value)
+
+    def lpop(self, key: str) -> Optional[str]:
+        return self.r.lpop(key)
+
+    def blpop(self, key: str, timeout: float) -> Optional[str]:
+        r = self.r.blpop([key], timeout=max(1, int(timeout)))
+        return r[1] if r else None
+
+    def llen(self, key: str) -> int:
+        return self.r.llen(key)
+
+_kv = None
+_kv_lock = threading.Lock()
+
+def get_kv():
+    # one client per process; Redis when REDIS_URL is set
+    global _kv
+    if _kv is None:
+        with _kv_lock:
+            if _kv is None:
+                if REDIS_URL:
+                    _kv = RedisKV(REDIS_URL)
+                    log.info("kv: redis")
+                else:
+                    _kv = MemoryKV()
+                    log.info("kv: in-process (set REDIS_URL to share state between replicas)")
+    return _kv
+
+def key(*parts: str) -> str:
+    return KV_PREFIX + ":".join(parts)
+
+def shared() -> bool:
+    return bool(REDIS_URL)
+
+async def acall(fn, *args):
+    # short blocking client call off the event loop; thread pools refuse new
+    # work while the interpreter exits (atexit shutdown path), then call inline
+    try:
+        fut = asyncio.get_running_loop().run_in_executor(None, fn, *args)
+    except RuntimeError:
+        return fn(*args)
+    return await fut
@@ -0,0 +1,186 @@
+import os, time, bisect, functools, threading, logging
+from contextlib import contextmanager, ExitStack
+from typing import Any, Callable, ContextManager, Dict, List, Sequence, Tuple
+
+# Minimal Prometheus text-format metrics (no client library dependency) plus
+# optional span hooks. Each service exposes render() on GET /metrics.
+
+log = logging.getLogger("slh.metrics")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _esc(v: Any) -> str:
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _fmt_labels(names: Sequence[str], values: Tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_esc(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, kw: Dict[str, Any]) -> Tuple:
+        return tuple(kw.get(n, "") for n in self.labels)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        k = self._key(labels)
+        with self._lock:
+            self._values[k] = self._values.get(k, 0.0) + amount
+
+    def render(self) -> List[str]:
+        return self.header() + [f"{self.name}{_fmt_labels(self.labels, k)} {v}" for k, v in sorted(self._values.items())]
+
+class Gauge(_Metric):
+    # value(s) come from a callback at scrape time: fn() -> {label_values_tuple: value}
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable[[], Dict[Tuple, float]], labels: Sequence[str] = ()):
+        super().__init__(name, help, labels)
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        try:
+            values = self.fn()
+        except Exception as e:
+            log.warning("gauge %s failed: %s", self.name, e)
+            values = {}
+        return self.header() + [f"{self.name}{_fmt_labels(self.labels, k)} {v}" for k, v in sorted(values.items())]
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple, List[float]] = {}  # [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        k = self._key(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            v = self._values.get(k)
+            if v is None:
+                v = self._values[k] = [0.0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                v[i] += 1
+            v[-2] += value
+            v[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def render(self) -> List[str]:
+        out = self.header()
+        for k, v in sorted(self._values.items()):
+            acc = 0.0
+            for b, c in zip(self.buckets, v):
+                acc += c
+                le = 'le="%s"' % b
+                out.append(f"{self.name}_bucket{_fmt_labels(self.labels, k, le)} {acc}")
+            le = 'le="+Inf"'
+            out.append(f"{self.name}_bucket{_fmt_labels(self.labels, k, le)} {v[-1]}")
+            out.append(f"{self.name}_sum{_fmt_labels(self.labels, k)} {v[-2]}")
+            out.append(f"{self.name}_count{_fmt_labels(self.labels, k)} {v[-1]}")
+        return out
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, m: _Metric) -> Any:
+        # idempotent by name so re-imported modules share one series
+        return self._metrics.setdefault(m.name, m)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in self._metrics.values():
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+def counter(name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+    return REGISTRY.register(Counter(name, help, labels))
+
+def histogram(name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labels, buckets))
+
+def gauge(name: str, help: str, fn: Callable[[], Dict[Tuple, float]], labels: Sequence[str] = ()) -> Gauge:
+    return REGISTRY.register(Gauge(name, help, fn, labels))
+
+def render() -> str:
+    return REGISTRY.render()
+
+# ========== spans ==========
+# A span hook is fn(name, attributes) -> context manager entered around the
+# traced block. With OTEL_ENABLED=1 and opentelemetry installed, an
+# OpenTelemetry tracer is registered as one.
+_span_hooks: List[Callable[[str, Dict[str, Any]], ContextManager]] = []
+
+def add_span_hook(fn: Callable[[str, Dict[str, Any]], ContextManager]):
+    _span_hooks.append(fn)
+
+if os.getenv("OTEL_ENABLED", "0").lower() in ("1", "true", "yes"):
+    try:
+        from opentelemetry import trace as _otel_trace
+        _tracer = _otel_trace.get_tracer("slh")
+        add_span_hook(lambda name, attrs: _tracer.start_as_current_span(name, attributes=attrs))
+    except ImportError:
+        log.warning("OTEL_ENABLED set but opentelemetry is not installed")
+
+@contextmanager
+def span(name: str, **attrs):
+    if not _span_hooks:
+        yield
+        return
+    with ExitStack() as stack:
+        for h in _span_hooks:
+            try:
+                stack.enter_context(h(name, attrs))
+            except Exception as e:
+                log.warning("span hook failed: %s", e)
+        yield
+
+HANDLER_SECONDS = histogram("slh_handler_seconds", "Bot handler latency", ["handler"])
+HANDLER_ERRORS = counter("slh_handler_errors_total", "Bot handler exceptions", ["handler"])
+
+def timed_handler(name: str):
+    # decorator for async PTB handlers: latency histogram, error counter, span
+    def deco(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                with span(f"handler.{name}"):
+                    return await fn(*args, **kwargs)
+            except Exception:
+                HANDLER_ERRORS.inc(handler=name)
+                raise
+            finally:
+                HANDLER_SECONDS.observe(time.perf_counter() - t0, handler=name)
+        return wrapper
+    return deco
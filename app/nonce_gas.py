@@ -0,0 +1,105 @@
+import time, threading, logging
+from typing import Callable, Dict, Hashable, Optional, Tuple
+
+log = logging.getLogger("slh.wallet")
+
+class NonceManager:
+    # Hands out consecutive nonces per sender without a get_transaction_count
+    # round-trip each time. The first use (and any reset after a failed send)
+    # syncs from the node's pending count; local state never goes below it.
+    # Counts are per process, so each key must send from one process only:
+    # with several replicas, UpdateRouter keeps a user's commands (and the
+    # admin's airdrops) on the user's owner, and each webhook process needs
+    # its own REPLICA_ID for that. Another sender on the key makes the next
+    # send hit "nonce too low", which costs a resync and one retry.
+    def __init__(self, fetch_pending: Callable[[str], int]):
+        self._fetch = fetch_pending
+        self._next: Dict[str, int] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def lock(self, address: str) -> threading.Lock:
+        # hold this around nonce allocation + broadcast to keep per-sender order
+        with self._guard:
+            return self._locks.setdefault(address, threading.Lock())
+
+    def allocate(self, address: str) -> int:
+        n = self._next.get(address)
+        if n is None:
+            n = self._fetch(address)
+        self._next[address] = n + 1
+        return n
+
+    def reset(self, address: str):
+        self._next.pop(address, None)
+
+    def advance(self, address: str, n: int):
+        # never hand out a nonce below n (held by signed, not yet mined txs)
+        cur = self._next.get(address)
+        if cur is None:
+            cur = self._fetch(address)
+        self._next[address] = max(cur, n)
+
+    def peek(self, address: str) -> Optional[int]:
+        return self._next.get(address)
+
+class GasPriceOracle:
+    # Shared gas price, refreshed in a background thread every `refresh`
+    # seconds once first used; callers read the cached value.
+    def __init__(self, fetch: Callable[[], int], refresh: float = 10.0, max_age: float = 60.0):
+        self._fetch = fetch
+        self.refresh = refresh
+        self.max_age = max_age
+        self._price: Optional[int] = None
+        self._at = 0.0
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def _update(self) -> int:
+        p = int(self._fetch())
+        self._price, self._at = p, time.monotonic()
+        return p
+
+    def _loop(self):
+        while True:
+            time.sleep(self.refresh)
+            try:
+                self._update()
+            except Exception as e:
+                log.warning("gas price refresh failed: %s", e)
+
+    def get(self) -> int:
+        if self._thread is None and self.refresh > 0:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._loop, name="gas-oracle", daemon=True)
+                    self._thread.start()
+        if self._price is None or time.monotonic() - self._at > self.max_age:
+            with self._lock:
+                if self._price is None or time.monotonic() - self._at > self.max_age:
+                    return self._update()
+        return self._price
+
+class GasEstimateCache:
+    # gas limits per call shape, e.g. (token, "transfer"), reused for every
+    # call of that shape. One estimate does not cover all of them: an ERC-20
+    # transfer to a zero-balance recipient costs ~17k more than to a holder
+    # (0 -> nonzero SSTORE), so the limit is the estimate plus at least
+    # `headroom` gas, or times `margin` if that is more.
+    def __init__(self, ttl: float = 600.0, margin: float = 1.2, headroom: int = 25_000):
+        self.ttl = ttl
+        self.margin = margin
+        self.headroom = headroom
+        self._data: Dict[Hashable, Tuple[float, int]] = {}
+
+    def get_or_estimate(self, shape: Hashable, estimate: Callable[[], int]) -> int:
+        e = self._data.get(shape)
+        if e is not None and e[0] > time.monotonic():
+            return e[1]
+        est = estimate()
+        gas = max(int(est * self.margin), est + self.headroom)
+        self._data[shape] = (time.monotonic() + self.ttl, gas)
+        return gas
+
+    def invalidate(self, shape: Hashable):
+        self._data.pop(shape, None)
@@ -0,0 +1,112 @@
+import os, json, logging
+from typing import Any, Dict, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from . import kv
+
+log = logging.getLogger("slh.persistence")
+
+PERSISTENCE_INTERVAL = float(os.getenv("PERSISTENCE_INTERVAL", "60"))
+
+class KVPersistence(BasePersistence):
+    # user_data / chat_data / conversations as JSON in the shared
+    # key/value store, written by PTB's periodic flush (update_interval).
+    # _synced holds the last JSON this replica read or wrote per field:
+    # refresh_* reloads a user's data before each of their updates only when
+    # another replica wrote it since (the user moved here after a ring
+    # change), and a flush skips fields that did not change, so untouched
+    # users never overwrite what their current owner wrote.
+    def __init__(self, namespace: str = "ptb", update_interval: float = PERSISTENCE_INTERVAL):
+        super().__init__(store_data=PersistenceInput(bot_data=False, callback_data=False),
+                         update_interval=update_interval)
+        self._kv = kv.get_kv()
+        self._ns = namespace
+        self._synced: Dict[Tuple[str, str], str] = {}
+
+    def _k(self, name: str) -> str:
+        return kv.key(self._ns, name)
+
+    async def _hgetall(self, name: str) -> Dict[str, str]:
+        out = await kv.acall(self._kv.hgetall, self._k(name))
+        self._synced.update(((name, f), v) for f, v in out.items())
+        return out
+
+    async def _hget(self, name: str, field: str) -> Optional[str]:
+        return await kv.acall(self._kv.hget, self._k(name), field)
+
+    async def _hset(self, name: str, field: str, value: Any):
+        raw = json.dumps(value)
+        if self._synced.get((name, field)) == raw:
+            return
+        await kv.acall(self._kv.hset, self._k(name), {field: raw})
+        self._synced[(name, field)] = raw
+
+    async def _hdel(self, name: str, field: str):
+        await kv.acall(self._kv.hdel, self._k(name), field)
+        self._synced.pop((name, field), None)
+
+    async def _refresh(self, name: str, field: str, data: Dict[Any, Any]):
+        # unchanged since our last sync: local data is current (or newer)
+        raw = await self._hget(name, field)
+        if raw is None or raw == self._synced.get((name, field)):
+            return
+        data.clear()
+        data.update(json.loads(raw))
+        self._synced[(name, field)] = raw
+
+    # ---- load ----
+    async def get_user_data(self) -> Dict[int, Dict[Any, Any]]:
+        return {int(k): json.loads(v) for k, v in (await self._hgetall("user_data")).items()}
+
+    async def get_chat_data(self) -> Dict[int, Dict[Any, Any]]:
+        return {int(k): json.loads(v) for k, v in (await self._hgetall("chat_data")).items()}
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        raw = await self._hget("bot_data", "data")
+        return json.loads(raw) if raw else {}
+
+    async def get_callback_data(self) -> None:
+        return None
+
+    async def get_conversations(self, name: str) -> Dict[Tuple, object]:
+        return {tuple(json.loads(k)): json.loads(v) for k, v in (await self._hgetall(f"conv:{name}")).items()}
+
+    # ---- store ----
+    async def update_user_data(self, user_id: int, data: Dict[Any, Any]):
+        await self._hset("user_data", str(user_id), data)
+
+    async def update_chat_data(self, chat_id: int, data: Dict[Any, Any]):
+        await self._hset("chat_data", str(chat_id), data)
+
+    async def update_bot_data(self, data: Dict[Any, Any]):
+        await self._hset("bot_data", "data", data)
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def update_conversation(self, name: str, key: Tuple, new_state: Optional[object]):
+        field = json.dumps(list(key))
+        if new_state is None:
+            await self._hdel(f"conv:{name}", field)
+        else:
+            await self._hset(f"conv:{name}", field, new_state)
+
+    async def drop_user_data(self, user_id: int):
+        await self._hdel("user_data", str(user_id))
+
+    async def drop_chat_data(self, chat_id: int):
+        await self._hdel("chat_data", str(chat_id))
+
+    # ---- refresh before each update ----
+    async def refresh_user_data(self, user_id: int, user_data: Dict[Any, Any]):
+        await self._refresh("user_data", str(user_id), user_data)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: Dict[Any, Any]):
+        await self._refresh("chat_data", str(chat_id), chat_data)
+
+    async def refresh_bot_data(self, bot_data: Dict[Any, Any]):
+        pass
+
+    async def flush(self):
+        pass
@@ -0,0 +1,193 @@
+import os, re, asyncio, logging
+from decimal import Decimal, InvalidOperation
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+log = logging.getLogger("slh.portfolio")
+
+# ERC-20s shown next to BNB and SLH: "address[:price_ils],..." (no price: amounts only)
+PORTFOLIO_TOKENS = os.getenv("PORTFOLIO_TOKENS", "")
+PRICE_SHEKEL_PER_BNB = os.getenv("PRICE_SHEKEL_PER_BNB", "")
+PORTFOLIO_MAX_ADDRESSES = int(os.getenv("PORTFOLIO_MAX_ADDRESSES", "10"))
+# calls per JSON-RPC batch; bigger portfolios go out as concurrent batches
+PORTFOLIO_BATCH = int(os.getenv("PORTFOLIO_BATCH", "100"))
+
+NATIVE = "native"
+SYMBOL = "0x95d89b41"
+DECIMALS = "0x313ce567"
+BALANCE_OF = "0x70a08231"
+
+_ADDR = re.compile(r"0x[0-9a-fA-F]{40}")
+
+RpcBatch = Callable[[List[Tuple[str, list]]], Awaitable[List[Dict[str, Any]]]]
+# the service's own metadata cache: {"symbol", "decimals"} or None if unknown
+MetaLookup = Callable[[str], Awaitable[Optional[Dict[str, Any]]]]
+Token = Tuple[str, Optional[Decimal]]
+
+class PortfolioError(Exception):
+    pass
+
+def parse_price(s: Any) -> Optional[Decimal]:
+    # "" / "0" / garbage -> None (shown without a shekel value)
+    try:
+        p = Decimal(str(s).strip())
+    except (InvalidOperation, ValueError):
+        return None
+    return p if p.is_finite() and p > 0 else None
+
+def parse_tokens(spec: str, slh: str = "", slh_price: Any = None) -> List[Token]:
+    # [(lowercase address, price_ils)], the SLH token first, duplicates dropped
+    out: List[Token] = []
+    if slh and _ADDR.fullmatch(slh) and int(slh, 16):
+        out.append((slh.lower(), parse_price(slh_price)))
+    for item in (spec or "").split(","):
+        addr, _, price = item.strip().partition(":")
+        if not addr:
+            continue
+        if not _ADDR.fullmatch(addr):
+            raise ValueError(f"PORTFOLIO_TOKENS: invalid address {addr!r}")
+        if all(addr.lower() != t for t, _ in out):
+            out.append((addr.lower(), parse_price(price)))
+    return out
+
+def _result(resp: Any) -> str:
+    if not isinstance(resp, dict) or "error" in resp or "result" not in resp:
+        raise PortfolioError(str(resp.get("error") if isinstance(resp, dict) else resp))
+    return resp["result"] or "0x"
+
+# ABI return data decoded by hand (no web3 dependency); api/main.py uses these too
+def decode_uint(raw: Optional[str]) -> Optional[int]:
+    # ABI uint256 word or JSON-RPC quantity ("0x1a3"); None for empty data
+    h = raw or ""
+    h = h[2:] if h.startswith("0x") else h
+    return int(h[:64], 16) if h else None
+
+def decode_string(raw: Optional[str]) -> Optional[str]:
+    h = raw or ""
+    b = bytes.fromhex(h[2:] if h.startswith("0x") else h)
+    if not b:
+        return None
+    if len(b) >= 64:
+        off = int.from_bytes(b[:32], "big")
+        if off + 32 <= len(b):
+            n = int.from_bytes(b[off:off + 32], "big")
+            if off + 32 + n <= len(b):
+                return b[off + 32:off + 32 + n].decode("utf-8", "replace")
+    # legacy tokens return bytes32
+    return b[:32].rstrip(b"\x00").decode("utf-8", "replace")
+
+def _uint(raw: str) -> int:
+    v = decode_uint(raw)
+    if v is None:
+        raise PortfolioError("empty result (not a contract?)")
+    return v
+
+def _call(to: str, data: str) -> Tuple[str, list]:
+    return ("eth_call", [{"to": to, "data": data}, "latest"])
+
+def cache_key(address: str) -> Tuple[str, str]:
+    # rows live in the service's BalanceCache next to the plain balance entries
+    return ("portfolio", address.lower())
+
+def _money(v: Optional[Decimal]) -> Optional[float]:
+    return float(v.quantize(Decimal("0.01"))) if v is not None else None
+
+class Portfolio:
+    # BNB plus a fixed token list for several addresses at once. Every read is
+    # one JSON-RPC call in a batch (eth_getBalance and balanceOf per address,
+    # symbol/decimals once per token); batches of PORTFOLIO_BATCH calls go out
+    # concurrently, so a typical user costs one HTTP round-trip. With a cache
+    # (BalanceCache) rows are reused per address until the TTL or a new block.
+    # token_meta answers from the service's metadata cache first (the SLH
+    # token), only the rest is read in the batch.
+    def __init__(self, tokens: List[Token], rpc_batch: RpcBatch, native_price: Any = PRICE_SHEKEL_PER_BNB,
+                 cache=None, batch: int = PORTFOLIO_BATCH, token_meta: Optional[MetaLookup] = None):
+        self.tokens = tokens
+        self.prices: Dict[str, Optional[Decimal]] = {NATIVE: parse_price(native_price), **dict(tokens)}
+        self.rpc_batch = rpc_batch
+        self.token_meta = token_meta
+        self.cache = cache
+        self.batch = max(1, batch)
+        self.meta: Dict[str, Dict[str, Any]] = {NATIVE: {"symbol": "BNB", "decimals": 18}}
+
+    async def _batches(self, calls: List[Tuple[str, list]]) -> List[Dict[str, Any]]:
+        parts = [calls[i:i + self.batch] for i in range(0, len(calls), self.batch)]
+        res = await asyncio.gather(*(self.rpc_batch(p) for p in parts))
+        return [r for rs in res for r in rs]
+
+    async def fetch(self, addresses: Sequence[str]) -> Dict[str, Any]:
+        addrs = list({a.lower(): a for a in addresses}.values())
+        rows: Dict[str, Optional[List[Dict[str, Any]]]] = {
+            a: self.cache.get(cache_key(a)) if self.cache is not None else None for a in addrs}
+        todo = [a for a in addrs if rows[a] is None]
+        need_meta = [t for t, _ in self.tokens if t not in self.meta] if todo else []
+        if need_meta and self.token_meta is not None:
+            await self._known_meta(need_meta)
+            need_meta = [t for t in need_meta if t not in self.meta]
+        calls: List[Tuple[str, list]] = []
+        for t in need_meta:
+            calls += [_call(t, SYMBOL), _call(t, DECIMALS)]
+        for a in todo:
+            word = "0" * 24 + a[2:].lower()
+            calls.append(("eth_getBalance", [a, "latest"]))
+            calls += [_call(t, BALANCE_OF + word) for t, _ in self.tokens]
+        res = iter(await self._batches(calls)) if calls else iter(())
+        for t in need_meta:
+            sym, dec = next(res), next(res)
+            try:
+                self.meta[t] = {"symbol": decode_string(_result(sym)) or "?", "decimals": _uint(_result(dec))}
+            except (PortfolioError, ValueError) as e:
+                log.warning("token %s metadata: %s", t, e)
+        for a in todo:
+            row = []
+            for t in [NATIVE] + [t for t, _ in self.tokens]:
+                resp = next(res)
+                try:
+                    if t not in self.meta:
+                        raise PortfolioError("token metadata unavailable")
+                    row.append({"token": t, **self.meta[t], "raw": _uint(_result(resp))})
+                except (PortfolioError, ValueError) as e:
+                    row.append({"token": t, "symbol": self.meta.get(t, {}).get("symbol"), "error": str(e)})
+            rows[a] = row
+            if self.cache is not None and not any("error" in x for x in row):
+                self.cache.put(cache_key(a), row)
+        return self._summary(addrs, rows)
+
+    async def _known_meta(self, tokens: List[str]):
+        for t in tokens:
+            try:
+                m = await self.token_meta(t)
+            except Exception as e:
+                log.warning("token %s metadata lookup: %s", t, e)
+                continue
+            if m and m.get("decimals") is not None:
+                self.meta[t] = {"symbol": m.get("symbol") or "?", "decimals": int(m["decimals"])}
+
+    def _asset(self, x: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[Decimal]]:
+        raw = x["raw"]
+        value = Decimal(raw).scaleb(-int(x["decimals"]))
+        price = self.prices.get(x["token"])
+        ils = value * price if price is not None else None
+        return {"token": x["token"], "symbol": x["symbol"], "decimals": x["decimals"], "raw": str(raw),
+                "value": float(value), "price_ils": float(price) if price is not None else None,
+                "value_ils": _money(ils)}, ils
+
+    def _summary(self, addrs: List[str], rows: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+        # per address and summed per asset; value_ils only covers priced assets,
+        # complete is False when some read failed (those assets carry "error")
+        totals: Dict[str, Dict[str, Any]] = {}
+        wallets, total, complete = [], Decimal(0), True
+        for a in addrs:
+            assets, subtotal = [], Decimal(0)
+            for x in rows[a]:
+                if "error" in x:
+                    assets.append(dict(x))
+                    complete = False
+                    continue
+                view, ils = self._asset(x)
+                assets.append(view)
+                subtotal += ils or 0
+                totals.setdefault(x["token"], {**x, "raw": 0})["raw"] += x["raw"]
+            wallets.append({"address": a, "assets": assets, "value_ils": _money(subtotal)})
+            total += subtotal
+        return {"addresses": wallets, "totals": [self._asset(x)[0] for x in totals.values()],
+                "value_ils": _money(total), "complete": complete}
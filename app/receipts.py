@@ -0,0 +1,117 @@
+import os, json, time, asyncio, sqlite3, logging, threading
+from typing import Awaitable, Callable, List, Optional
+
+from . import wallet_web3 as w3w
+
+log = logging.getLogger("slh.receipts")
+
+RECEIPT_POLL_INTERVAL = float(os.getenv("RECEIPT_POLL_INTERVAL", "3"))
+RECEIPT_BATCH = int(os.getenv("RECEIPT_BATCH", "100"))
+RECEIPT_TIMEOUT = float(os.getenv("RECEIPT_TIMEOUT", "1800"))
+
+Notify = Callable[[int, str], Awaitable[None]]
+
+class ReceiptWatcher:
+    # Persistent queue of sent transactions (DATA_DIR/receipts.db) polled with
+    # one eth_getTransactionReceipt batch per tick. A row is deleted before its
+    # notification goes out, so with several worker processes polling the same
+    # queue each transaction is still reported exactly once. SQLite runs in
+    # the default executor (aadd, tick), never on the event loop; the sync
+    # add/pending are for threads (metrics).
+    def __init__(self, data_dir: str, notify: Notify, interval: float = RECEIPT_POLL_INTERVAL,
+                 batch: int = RECEIPT_BATCH, timeout: float = RECEIPT_TIMEOUT):
+        os.makedirs(data_dir, exist_ok=True)
+        self.path = os.path.join(data_dir, "receipts.db")
+        self.notify = notify
+        self.interval = interval
+        self.batch = batch
+        self.timeout = timeout
+        self._local = threading.local()
+        self._task: Optional[asyncio.Task] = None
+
+    def _db(self) -> sqlite3.Connection:
+        # one connection per thread, opened on first use
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA busy_timeout=30000")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS pending_tx (tx_hash TEXT PRIMARY KEY, chat_id INTEGER, "
+                "addresses TEXT, label TEXT, created REAL)")
+            self._local.db = db
+        return db
+
+    def add(self, tx_hash: str, chat_id: int, addresses: List[str], label: str = ""):
+        self._db().execute(
+            "INSERT OR REPLACE INTO pending_tx (tx_hash, chat_id, addresses, label, created) VALUES (?, ?, ?, ?, ?)",
+            (tx_hash, chat_id, json.dumps(addresses), label, time.time()))
+
+    async def aadd(self, tx_hash: str, chat_id: int, addresses: List[str], label: str = ""):
+        await self._io(self.add, tx_hash, chat_id, addresses, label)
+
+    def pending(self) -> int:
+        return self._db().execute("SELECT COUNT(*) FROM pending_tx").fetchone()[0]
+
+    def _oldest(self) -> List[tuple]:
+        return self._db().execute(
+            "SELECT tx_hash, chat_id, addresses, label, created FROM pending_tx ORDER BY created LIMIT ?",
+            (self.batch,)).fetchall()
+
+    def _claim(self, tx_hash: str) -> bool:
+        return self._db().execute("DELETE FROM pending_tx WHERE tx_hash=?", (tx_hash,)).rowcount == 1
+
+    async def _io(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    async def tick(self) -> int:
+        rows = await self._io(self._oldest)
+        if not rows:
+            return 0
+        receipts = await w3w.aget_receipts([r[0] for r in rows])
+        done = 0
+        for tx_hash, chat_id, addresses, label, created in rows:
+            rc = receipts.get(tx_hash)
+            if rc is None and time.time() - created < self.timeout:
+                continue
+            if not await self._io(self._claim, tx_hash):
+                continue
+            done += 1
+            for a in json.loads(addresses or "[]"):
+                w3w.invalidate_balance(a)
+            if rc is None:
+                text = f"⌛ ההעברה עדיין לא אושרה.\ntx: {tx_hash}"
+            elif rc["status"] == 1:
+                text = f"✅ ההעברה אושרה (בלוק {rc['block']}).\ntx: {tx_hash}"
+            else:
+                text = f"❌ ההעברה נכשלה ברשת.\ntx: {tx_hash}"
+            if label:
+                text = f"{label}\n{text}"
+            try:
+                await self.notify(chat_id, text)
+            except Exception as e:
+                log.error("receipt notify failed for %s: %s", tx_hash, e)
+        return done
+
+    async def _run(self):
+        while True:
+            try:
+                await self.tick()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.error("receipt watcher tick failed: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,31 @@
+import os, sys, logging, threading
+from dotenv import load_dotenv
+
+# Process bootstrap. Imported first by every module that reads env-derived
+# constants, so .env is applied before any of them; logging is configured
+# once no matter which entry point (app.bot, app.app_web) runs first.
+load_dotenv()
+
+DATA_DIR = os.getenv("DATA_DIR", "/app/data")
+CHAIN_ID = int(os.getenv("CHAIN_ID", "56"))
+LOG_LEVEL = getattr(logging, os.getenv("LOG_LEVEL", "INFO").upper(), logging.INFO)
+# webhook server: warm the PTB application, web3 and the store in the
+# background, per worker process, when it starts (app_web's __main__ or the
+# post_fork hook in app/gunicorn_conf.py) instead of on the first update
+WEBHOOK_PRELOAD = os.getenv("WEBHOOK_PRELOAD", "0").lower() in ("1", "true", "yes")
+
+_logging_done = False
+_logging_lock = threading.Lock()
+
+def setup_logging():
+    global _logging_done
+    with _logging_lock:
+        if _logging_done:
+            return
+        from pythonjsonlogger import jsonlogger
+        handler = logging.StreamHandler(sys.stdout)
+        handler.setFormatter(jsonlogger.JsonFormatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+        root = logging.getLogger()
+        root.handlers = [handler]
+        root.setLevel(LOG_LEVEL)
+        _logging_done = True
@@ -0,0 +1,226 @@
+import os, json, time, bisect, socket, asyncio, hashlib, logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from telegram.ext import Application, SimpleUpdateProcessor
+
+from . import kv
+
+log = logging.getLogger("slh.shard")
+
+REPLICA_ID = (os.getenv("REPLICA_ID") or os.getenv("RAILWAY_REPLICA_ID")
+              or f"{socket.gethostname()}-{os.getpid()}")
+SHARD_VNODES = int(os.getenv("SHARD_VNODES", "64"))
+SHARD_HEARTBEAT = float(os.getenv("SHARD_HEARTBEAT", "5"))
+# a replica missing heartbeats for this long drops out of the ring and its
+# forwarded-but-unprocessed updates are taken over
+SHARD_REPLICA_TTL = float(os.getenv("SHARD_REPLICA_TTL", "20"))
+
+# OrderedUpdateProcessor does its own limiting, see there
+_UNBOUNDED = 2 ** 30
+
+def _h(s: str) -> int:
+    return int.from_bytes(hashlib.md5(s.encode()).digest()[:8], "big")
+
+class HashRing:
+    # consistent hashing with virtual nodes: adding or removing a replica only
+    # moves ~1/n of the users
+    def __init__(self, nodes: List[str], vnodes: int = SHARD_VNODES):
+        self.nodes = sorted(nodes)
+        points = sorted((_h(f"{n}#{i}"), n) for n in self.nodes for i in range(vnodes))
+        self._keys = [p for p, _ in points]
+        self._owners = [n for _, n in points]
+
+    def node_for(self, key: Any) -> Optional[str]:
+        if not self._keys:
+            return None
+        i = bisect.bisect(self._keys, _h(str(key))) % len(self._keys)
+        return self._owners[i]
+
+def shard_key(data: Dict[str, Any]) -> Optional[int]:
+    # user id from a raw update dict (what Telegram posts), chat id as fallback
+    for field, obj in data.items():
+        if isinstance(obj, dict) and field != "update_id":
+            user = obj.get("from") or obj.get("user")
+            if isinstance(user, dict) and "id" in user:
+                return user["id"]
+            chat = obj.get("chat")
+            if isinstance(chat, dict) and "id" in chat:
+                return chat["id"]
+    return None
+
+class UpdateRouter:
+    # Shards updates by user across replicas. Whichever replica receives a
+    # webhook call hashes the user onto the ring of live replicas; updates for
+    # other owners are pushed onto the owner's list in the shared store and
+    # the owner feeds them into its own update_queue in order. One owner per
+    # user keeps that user's updates ordered; throughput grows with replicas.
+    def __init__(self, replica_id: str = REPLICA_ID, heartbeat: float = SHARD_HEARTBEAT,
+                 ttl: float = SHARD_REPLICA_TTL):
+        self.replica_id = replica_id
+        self.heartbeat = heartbeat
+        self.ttl = ttl
+        self.ring = HashRing([replica_id])
+        self.forwarded = 0
+        self.received = 0
+        self._kv = kv.get_kv()
+        self._replicas = kv.key("shard", "replicas")
+        self._tasks: List[asyncio.Task] = []
+
+    def _inbox(self, replica_id: str) -> str:
+        return kv.key("shard", "inbox", replica_id)
+
+    def owner(self, data: Dict[str, Any]) -> str:
+        k = shard_key(data)
+        return self.replica_id if k is None else (self.ring.node_for(k) or self.replica_id)
+
+    def route(self, data: Dict[str, Any]) -> bool:
+        # True: handle here; False: forwarded to the owning replica
+        owner = self.owner(data)
+        if owner == self.replica_id:
+            return True
+        self._kv.rpush(self._inbox(owner), json.dumps(data))
+        self.forwarded += 1
+        return False
+
+    def _beat(self):
+        now = time.time()
+        self._kv.hset(self._replicas, {self.replica_id: str(now)})
+        seen = self._kv.hgetall(self._replicas)
+        live = [r for r, t in seen.items() if now - float(t) < self.ttl]
+        if sorted(live) != self.ring.nodes:
+            log.info("shard ring: %s", ",".join(sorted(live)))
+            self.ring = HashRing(live)
+        for r, t in seen.items():
+            if r not in live:
+                self._adopt(r)
+
+    def _adopt(self, dead: str):
+        # re-route what a replica (no longer in the ring) never processed, then forget it
+        n = 0
+        while True:
+            raw = self._kv.lpop(self._inbox(dead))
+            if raw is None:
+                break
+            self._kv.rpush(self._inbox(self.owner(json.loads(raw))), raw)
+            n += 1
+        self._kv.hdel(self._replicas, dead)
+        log.warning("replica %s left, re-routed %d pending updates", dead, n)
+
+    async def _heartbeat_loop(self):
+        while True:
+            try:
+                await kv.acall(self._beat)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.error("shard heartbeat failed: %s", e)
+            await asyncio.sleep(self.heartbeat)
+
+    async def _consume(self, application: Application):
+        from telegram import Update
+        inbox = self._inbox(self.replica_id)
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                raw = await loop.run_in_executor(None, self._kv.blpop, inbox, 1.0)
+            except asyncio.CancelledError:
+                raise
+            except RuntimeError:
+                return  # executor gone: the process is exiting
+            except Exception as e:
+                log.error("shard inbox read failed: %s", e)
+                await asyncio.sleep(1)
+                continue
+            if raw is None:
+                continue
+            upd = Update.de_json(json.loads(raw), application.bot)
+            if upd is not None:
+                self.received += 1
+                await application.update_queue.put(upd)
+
+    def start(self, application: Application):
+        self._beat()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._heartbeat_loop()), loop.create_task(self._consume(application))]
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # hand the inbox to the others; if this is the last replica, leave it
+        # for whoever starts next (it adopts us once our heartbeat is stale)
+        others = [r for r in self.ring.nodes if r != self.replica_id]
+        if not others:
+            return
+        self.ring = HashRing(others)
+        try:
+            await kv.acall(self._adopt, self.replica_id)
+        except Exception as e:
+            log.error("shard leave failed: %s", e)
+
+    def status(self) -> Dict[str, Any]:
+        return {"replica": self.replica_id, "replicas": self.ring.nodes,
+                "forwarded": self.forwarded, "received": self.received}
+
+class OrderedUpdateProcessor(SimpleUpdateProcessor):
+    # Handlers for different users run concurrently, one user's updates run
+    # one at a time in arrival order. An update first waits for its user's
+    # turn and only then takes one of the max_concurrent_updates slots, so a
+    # user with a backlog never holds slots other users could run in. PTB's
+    # own semaphore wraps do_process_update and is sized never to block (so
+    # max_concurrent_updates reports that size, not the real limit).
+    # admit(update) runs on arrival, before the user's queue: False drops the
+    # update there (rate limits), so a burst never piles up behind a slow
+    # handler. max_wait(update) is how long an update may sit in the queue
+    # (None: no limit); one that waited longer is dropped unprocessed.
+    def __init__(self, max_concurrent_updates: int, max_users: int = 10000,
+                 admit: Optional[Callable[[Any], Awaitable[bool]]] = None,
+                 max_wait: Optional[Callable[[Any], Optional[float]]] = None):
+        super().__init__(_UNBOUNDED)
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._max_users = max_users
+        self._locks: "OrderedDict[Any, asyncio.Lock]" = OrderedDict()
+        self.admit = admit
+        self.max_wait = max_wait
+        self.rejected = 0
+        self.expired = 0
+
+    def _lock(self, key: Any) -> asyncio.Lock:
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+            if len(self._locks) > self._max_users:
+                # only drop idle locks
+                for k in list(self._locks)[:len(self._locks) - self._max_users]:
+                    if not self._locks[k].locked():
+                        del self._locks[k]
+        else:
+            self._locks.move_to_end(key)
+        return lock
+
+    async def do_process_update(self, update: object, coroutine):
+        if self.admit is not None and not await self.admit(update):
+            self.rejected += 1
+            coroutine.close()
+            return
+        arrived = time.monotonic()
+        user = getattr(update, "effective_user", None)
+        chat = getattr(update, "effective_chat", None)
+        key = user.id if user is not None else (chat.id if chat is not None else None)
+        if key is None:
+            async with self._slots:
+                await self._run(update, coroutine, arrived)
+            return
+        async with self._lock(key):
+            async with self._slots:
+                await self._run(update, coroutine, arrived)
+
+    async def _run(self, update: object, coroutine, arrived: float):
+        limit = self.max_wait(update) if self.max_wait is not None else None
+        if limit is not None and time.monotonic() - arrived > limit:
+            self.expired += 1
+            coroutine.close()
+            return
+        await coroutine
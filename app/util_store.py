@@ -1,14 +1,22 @@
-import os, json, base64, logging
-from typing import Optional, Dict, Any
+import os, sys, json, base64, hashlib, logging, sqlite3, threading, time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Iterator, List, Tuple
 from cryptography.fernet import Fernet, InvalidToken
 
+from . import settings
+from . import metrics
+from . import kv
+
 log = logging.getLogger("slh.store")
 
+STORE_SECONDS = metrics.histogram("slh_store_seconds", "Store backend latency", ["backend", "op"],
+                                  buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, 1.0))
+
 def _fernet_from_secret(secret: str) -> Fernet:
+    # v1 (legacy) derivation, kept only to decrypt tokens written before v2.
     # Accept raw 32+ char secret, convert to urlsafe base64 if needed
     try:
         # try direct fernet key
-        Fernet(secret.encode())
         return Fernet(secret.encode())
     except Exception:
         # derive a key from arbitrary string by zero-padding/truncating
@@ -18,13 +26,140 @@ def _fernet_from_secret(secret: str) -> Fernet:
         key = base64.urlsafe_b64encode(b[:32])
         return Fernet(key)
 
-class Store:
-    def __init__(self, data_dir: str, secret: str):
-        self.data_dir = data_dir or "./data"
-        os.makedirs(self.data_dir, exist_ok=True)
-        self.path = os.path.join(self.data_dir, "users.json")
-        self._fernet = _fernet_from_secret(secret or "changeme-changeme-changeme-32bytes")
+KDF_SALT = os.getenv("SECRET_KEY_SALT", "slh-store-v2").encode("utf-8")
+PK_CACHE_TTL = float(os.getenv("PK_CACHE_TTL", "300"))
+PK_CACHE_SIZE = int(os.getenv("PK_CACHE_SIZE", "1000"))
+# seconds a replica may go without progress before another one takes over
+# the one-time local -> kv import
+STORE_MIGRATE_LEASE = float(os.getenv("STORE_MIGRATE_LEASE", "120"))
+
+class KeyRing:
+    # v2 tokens are "v2:<kid>:<fernet token>" with the key derived by scrypt
+    # (once, at startup) from SECRET_KEY; kid is a fingerprint of the derived
+    # key so rotated-out secrets (SECRET_KEY_PREVIOUS, comma separated) can
+    # still decrypt until reencrypt_all() has moved every row to the current key.
+    # Tokens without a prefix are v1 (legacy zero-padded key).
+    def __init__(self, secret: str, previous: Optional[List[str]] = None):
+        secrets = [secret] + [p for p in (previous or []) if p and p != secret]
+        self._v2: Dict[str, Fernet] = {}
+        self._v1: List[Fernet] = []
+        self.current_kid = ""
+        for i, sec in enumerate(secrets):
+            kid, f = self._derive(sec)
+            self._v2[kid] = f
+            self._v1.append(_fernet_from_secret(sec))
+            if i == 0:
+                self.current_kid = kid
+
+    @staticmethod
+    def _derive(secret: str) -> Tuple[str, Fernet]:
+        raw = hashlib.scrypt(secret.encode("utf-8"), salt=KDF_SALT, n=2**14, r=8, p=1, dklen=32)
+        return hashlib.sha256(raw).hexdigest()[:8], Fernet(base64.urlsafe_b64encode(raw))
+
+    def encrypt(self, plain: str) -> str:
+        tok = self._v2[self.current_kid].encrypt(plain.encode("utf-8")).decode("utf-8")
+        return f"v2:{self.current_kid}:{tok}"
+
+    def decrypt(self, token: str) -> str:
+        if token.startswith("v2:"):
+            _, kid, tok = token.split(":", 2)
+            f = self._v2.get(kid)
+            if f is None:
+                raise InvalidToken(f"unknown key id {kid}")
+            return f.decrypt(tok.encode("utf-8")).decode("utf-8")
+        for f in self._v1:
+            try:
+                return f.decrypt(token.encode("utf-8")).decode("utf-8")
+            except InvalidToken:
+                continue
+        raise InvalidToken("no v1 key matches")
+
+    def is_current(self, token: str) -> bool:
+        return token.startswith(f"v2:{self.current_kid}:")
+
+class _PlainCache:
+    # bounded TTL cache of decrypted keys. Entries expire on get/put and on a
+    # timer, so nothing outlives PK_CACHE_TTL just because nobody reads.
+    # Zeroing the bytearray on expiry/eviction is best-effort only: get()
+    # returns a new str, and decrypt/encode leave copies, which Python can't
+    # wipe. It limits how long the cache's own copy stays around, nothing more.
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, str, bytearray]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    @staticmethod
+    def _wipe(buf: bytearray):
+        for i in range(len(buf)):
+            buf[i] = 0
+
+    def get(self, uid: str, token: str) -> Optional[str]:
+        with self._lock:
+            self._expire()
+            e = self._data.get(uid)
+            if e is None or e[1] != token:
+                return None
+            return e[2].decode("utf-8")
+
+    def put(self, uid: str, token: str, plain: str):
+        if self.maxsize <= 0 or self.ttl <= 0:
+            return
+        with self._lock:
+            self._expire()
+            self._pop(uid)
+            self._data[uid] = (time.monotonic() + self.ttl, token, bytearray(plain.encode("utf-8")))
+            while len(self._data) > self.maxsize:
+                _, (_, _, buf) = self._data.popitem(last=False)
+                self._wipe(buf)
+            self._schedule()
+
+    def invalidate(self, uid: str):
+        with self._lock:
+            self._pop(uid)
+
+    def clear(self):
+        with self._lock:
+            for _, _, buf in self._data.values():
+                self._wipe(buf)
+            self._data.clear()
+
+    def _pop(self, uid: str):
+        e = self._data.pop(uid, None)
+        if e is not None:
+            self._wipe(e[2])
+
+    def _expire(self):
+        # fixed TTL from insertion, so insertion order is expiry order
+        now = time.monotonic()
+        while self._data:
+            uid, e = next(iter(self._data.items()))
+            if e[0] > now:
+                break
+            self._pop(uid)
+
+    def _schedule(self):
+        # lock held: one pending timer, due when the oldest entry expires
+        if self._timer is not None or not self._data:
+            return
+        delay = max(0.0, next(iter(self._data.values()))[0] - time.monotonic())
+        self._timer = threading.Timer(delay + 0.05, self._sweep)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _sweep(self):
+        with self._lock:
+            self._timer = None
+            self._expire()
+            self._schedule()
+
+class JsonBackend:
+    # legacy backend: whole users.json in memory, full rewrite on every write
+    def __init__(self, data_dir: str):
+        self.path = os.path.join(data_dir, "users.json")
         self._cache: Dict[str, Any] = {}
+        self._lock = threading.Lock()
         self._load()
 
     def _load(self):
@@ -44,30 +179,379 @@ class Store:
             json.dump(self._cache, f, ensure_ascii=False, indent=2)
         os.replace(tmp, self.path)
 
+    def get(self, uid: str) -> Dict[str, Any]:
+        return dict(self._cache.get(uid, {}))
+
+    def upsert(self, uid: str, fields: Dict[str, Any]):
+        with self._lock:
+            u = self._cache.get(uid, {})
+            u.update(fields)
+            self._cache[uid] = u
+            self._save()
+
+    def iter_pks(self, batch: int = 500) -> Iterator[List[Tuple[str, str]]]:
+        uids = sorted(self._cache)
+        for i in range(0, len(uids), batch):
+            yield [(u, self._cache[u]["pk"]) for u in uids[i:i + batch] if self._cache[u].get("pk")]
+
+    def replace_pks(self, rows: List[Tuple[str, str, str]]) -> int:
+        # rows: (uid, old_token, new_token); skips rows changed meanwhile
+        n = 0
+        with self._lock:
+            for uid, old, new in rows:
+                u = self._cache.get(uid)
+                if u and u.get("pk") == old:
+                    u["pk"] = new
+                    n += 1
+            if n:
+                self._save()
+        return n
+
+class SqliteBackend:
+    # one row per user, WAL mode so several worker processes can read while
+    # one writes; connections are per-thread
+    COLUMNS = ("address", "pk", "addresses")
+
+    def __init__(self, data_dir: str):
+        self.path = os.path.join(data_dir, "users.db")
+        self._local = threading.local()
+        db = self._db()
+        db.execute("CREATE TABLE IF NOT EXISTS users "
+                   "(uid TEXT PRIMARY KEY, address TEXT, pk TEXT, updated_at REAL, addresses TEXT)")
+        db.execute("CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT)")
+        if "addresses" not in {r[1] for r in db.execute("PRAGMA table_info(users)")}:
+            try:
+                db.execute("ALTER TABLE users ADD COLUMN addresses TEXT")
+            except sqlite3.OperationalError:  # another process added it first
+                pass
+        self._migrate_json(os.path.join(data_dir, "users.json"))
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute("PRAGMA busy_timeout=30000")
+            self._local.db = db
+        return db
+
+    def _migrate_json(self, json_path: str):
+        # one-time import of users.json; BEGIN IMMEDIATE so only one process does it
+        if not os.path.exists(json_path):
+            return
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            if db.execute("SELECT 1 FROM meta WHERE k='migrated_users_json'").fetchone():
+                db.execute("COMMIT")
+                return
+            with open(json_path, "r", encoding="utf-8") as f:
+                users = json.load(f)
+            now = time.time()
+            db.executemany(
+                "INSERT INTO users (uid, address, pk, addresses, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(uid) DO NOTHING",
+                [(uid, u.get("address"), u.get("pk"), u.get("addresses"), now) for uid, u in users.items()])
+            db.execute("INSERT INTO meta (k, v) VALUES ('migrated_users_json', ?)", (str(now),))
+            db.execute("COMMIT")
+            log.info("migrated %d users from users.json to sqlite", len(users))
+        except Exception:
+            db.execute("ROLLBACK")
+            log.exception("users.json migration failed")
+            return
+        try:
+            os.replace(json_path, json_path + ".migrated")
+        except OSError:
+            pass
+
+    def get(self, uid: str) -> Dict[str, Any]:
+        row = self._db().execute(f"SELECT {', '.join(self.COLUMNS)} FROM users WHERE uid=?", (uid,)).fetchone()
+        if not row:
+            return {}
+        return {k: v for k, v in zip(self.COLUMNS, row) if v is not None}
+
+    def upsert(self, uid: str, fields: Dict[str, Any]):
+        cols = [c for c in self.COLUMNS if c in fields]
+        if not cols:
+            return
+        sets = ", ".join(f"{c}=excluded.{c}" for c in cols)
+        self._db().execute(
+            f"INSERT INTO users (uid, {', '.join(cols)}, updated_at) VALUES (?, {', '.join('?' for _ in cols)}, ?) "
+            f"ON CONFLICT(uid) DO UPDATE SET {sets}, updated_at=excluded.updated_at",
+            (uid, *[fields[c] for c in cols], time.time()))
+
+    def iter_pks(self, batch: int = 500) -> Iterator[List[Tuple[str, str]]]:
+        # keyset pagination so a rotation never holds the whole table in memory
+        last = ""
+        while True:
+            rows = self._db().execute(
+                "SELECT uid, pk FROM users WHERE uid > ? AND pk IS NOT NULL ORDER BY uid LIMIT ?",
+                (last, batch)).fetchall()
+            if not rows:
+                return
+            last = rows[-1][0]
+            yield rows
+
+    def replace_pks(self, rows: List[Tuple[str, str, str]]) -> int:
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            n = 0
+            for uid, old, new in rows:
+                n += db.execute("UPDATE users SET pk=?, updated_at=? WHERE uid=? AND pk=?",
+                                (new, time.time(), uid, old)).rowcount
+            db.execute("COMMIT")
+            return n
+        except Exception:
+            db.execute("ROLLBACK")
+            raise
+
+def _local_users(data_dir: str) -> List[Tuple[str, Optional[str], Optional[str], Optional[str]]]:
+    # (uid, address, pk, addresses) from users.db and users.json, read-only:
+    # neither file is created, migrated or renamed. users.db wins where both
+    # have a user (it already holds any json import)
+    rows: Dict[str, Tuple[str, Optional[str], Optional[str], Optional[str]]] = {}
+    db_path = os.path.join(data_dir, "users.db")
+    if os.path.exists(db_path):
+        db = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=30)
+        try:
+            cols = {r[1] for r in db.execute("PRAGMA table_info(users)")}
+            if cols:
+                addresses = "addresses" if "addresses" in cols else "NULL"
+                for r in db.execute(f"SELECT uid, address, pk, {addresses} FROM users"):
+                    rows[r[0]] = r
+        finally:
+            db.close()
+    json_path = os.path.join(data_dir, "users.json")
+    if os.path.exists(json_path):
+        with open(json_path, "r", encoding="utf-8") as f:
+            for uid, u in json.load(f).items():
+                rows.setdefault(uid, (uid, u.get("address"), u.get("pk"), u.get("addresses")))
+    return list(rows.values())
+
+class KVBackend:
+    # one hash per user in the shared key/value store (Redis with REDIS_URL),
+    # so every replica sees the same users; data_dir is unused
+    COLUMNS = ("address", "pk", "addresses")
+
+    def __init__(self, data_dir: str):
+        self._kv = kv.get_kv()
+        self._index = kv.key("store", "users")
+        self._migrate_local(data_dir)
+
+    def _migrate_local(self, data_dir: str):
+        # one-time import of users.db / users.json. One replica holds a lease
+        # ("running:<owner>:<expiry>" in the meta flag, renewed while copying);
+        # a lease left by a crashed replica expires and the next start takes it
+        # over. The copy itself only fills fields kv doesn't have yet, so a
+        # re-run neither duplicates nor overwrites anything.
+        if not any(os.path.exists(os.path.join(data_dir, f)) for f in ("users.db", "users.json")):
+            return
+        meta = kv.key("store", "meta")
+        owner = base64.urlsafe_b64encode(os.urandom(9)).decode()
+        lease = self._lease(meta, owner)
+        if lease is None:
+            return
+        rows = _local_users(data_dir)
+        for i, (uid, address, pk, addresses) in enumerate(rows, 1):
+            key = self._user(uid)
+            for col, value in (("address", address), ("pk", pk), ("addresses", addresses)):
+                if value is not None:
+                    self._kv.hcas(key, col, None, value)
+            self._kv.hcas(key, "updated_at", None, str(time.time()))
+            self._kv.hset(self._index, {uid: "1"})
+            if i % 500 == 0:
+                lease = self._lease(meta, owner, lease)
+                if lease is None:
+                    log.warning("kv migration lease lost after %d users", i)
+                    return
+        if self._kv.hcas(meta, "migrated_local", lease, str(time.time())):
+            log.info("migrated %d users from local store to kv", len(rows))
+
+    def _lease(self, meta: str, owner: str, held: Optional[str] = None) -> Optional[str]:
+        # take (held=None) or renew the migration lease; None: done, or
+        # another replica holds a live lease
+        cur = self._kv.hget(meta, "migrated_local")
+        if held is None and cur is not None:
+            if not cur.startswith("running"):
+                return None
+            parts = cur.split(":")  # bare "running": left by an older version
+            if len(parts) == 3 and float(parts[2]) > time.time():
+                return None
+        elif held is not None and cur != held:
+            return None
+        new = f"running:{owner}:{time.time() + STORE_MIGRATE_LEASE}"
+        return new if self._kv.hcas(meta, "migrated_local", cur, new) else None
+
+    def _user(self, uid: str) -> str:
+        return kv.key("store", "user", uid)
+
+    def get(self, uid: str) -> Dict[str, Any]:
+        h = self._kv.hgetall(self._user(uid))
+        return {k: h[k] for k in self.COLUMNS if h.get(k)}
+
+    def upsert(self, uid: str, fields: Dict[str, Any]):
+        row = {c: fields[c] for c in self.COLUMNS if c in fields and fields[c] is not None}
+        if not row:
+            return
+        row["updated_at"] = str(time.time())
+        self._kv.hset(self._user(uid), row)
+        self._kv.hset(self._index, {uid: "1"})
+
+    def iter_pks(self, batch: int = 500) -> Iterator[List[Tuple[str, str]]]:
+        uids = sorted(self._kv.hgetall(self._index))
+        for i in range(0, len(uids), batch):
+            rows = [(u, self._kv.hget(self._user(u), "pk")) for u in uids[i:i + batch]]
+            rows = [(u, pk) for u, pk in rows if pk]
+            if rows:
+                yield rows
+
+    def replace_pks(self, rows: List[Tuple[str, str, str]]) -> int:
+        return sum(1 for uid, old, new in rows if self._kv.hcas(self._user(uid), "pk", old, new))
+
+BACKENDS = {"json": JsonBackend, "sqlite": SqliteBackend, "kv": KVBackend}
+
+class Store:
+    def __init__(self, data_dir: str, secret: str, backend: Optional[str] = None,
+                 previous_secrets: Optional[List[str]] = None):
+        self.data_dir = data_dir or "./data"
+        os.makedirs(self.data_dir, exist_ok=True)
+        if previous_secrets is None:
+            previous_secrets = [p.strip() for p in os.getenv("SECRET_KEY_PREVIOUS", "").split(",") if p.strip()]
+        self._secrets = (secret or "changeme-changeme-changeme-32bytes", previous_secrets)
+        self._ring: Optional[KeyRing] = None
+        self._pk_cache = _PlainCache(PK_CACHE_SIZE, PK_CACHE_TTL)
+        kind = (backend or os.getenv("STORE_BACKEND") or ("kv" if kv.shared() else "sqlite")).lower()
+        if kind not in BACKENDS:
+            raise ValueError(f"unknown STORE_BACKEND {kind!r}")
+        self._kind = kind
+        self._backend = None
+        self._backend_lock = threading.Lock()
+
+    @property
+    def _keys(self) -> KeyRing:
+        # scrypt per secret: derived on first use, not at import
+        if self._ring is None:
+            with self._backend_lock:
+                if self._ring is None:
+                    self._ring = KeyRing(*self._secrets)
+        return self._ring
+
+    @property
+    def _db(self):
+        # opened on first use: the json backend reads the whole file and the
+        # others may run a one-time migration, none of which should hold up startup
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    self._backend = BACKENDS[self._kind](self.data_dir)
+        return self._backend
+
+    def warm(self):
+        self._keys
+        self._db
+
+    def _get(self, uid: str) -> Dict[str, Any]:
+        with STORE_SECONDS.time(backend=self._kind, op="read"):
+            return self._db.get(uid)
+
+    def _upsert(self, uid: str, fields: Dict[str, Any]):
+        with STORE_SECONDS.time(backend=self._kind, op="write"):
+            self._db.upsert(uid, fields)
+
     def set_wallet(self, tg_user_id: int, address: str):
-        u = self._cache.get(str(tg_user_id), {})
-        u["address"] = address
-        self._cache[str(tg_user_id)] = u
-        self._save()
+        self._upsert(str(tg_user_id), {"address": address})
 
     def get_wallet(self, tg_user_id: int) -> Optional[str]:
-        u = self._cache.get(str(tg_user_id), {})
-        return u.get("address")
+        return self._get(str(tg_user_id)).get("address")
+
+    # extra addresses for the portfolio view, a JSON list next to the wallet
+    @staticmethod
+    def _watched(u: Dict[str, Any]) -> List[str]:
+        try:
+            return [a for a in json.loads(u.get("addresses") or "[]") if isinstance(a, str)]
+        except ValueError:
+            return []
+
+    def get_addresses(self, tg_user_id: int) -> List[str]:
+        # the wallet address first, then the added ones
+        u = self._get(str(tg_user_id))
+        out = [u["address"]] if u.get("address") else []
+        for a in self._watched(u):
+            if a.lower() not in {x.lower() for x in out}:
+                out.append(a)
+        return out
+
+    def add_address(self, tg_user_id: int, address: str, limit: int = 0) -> bool:
+        # False if already there; ValueError once the user has `limit` addresses
+        uid = str(tg_user_id)
+        u = self._get(uid)
+        watched = self._watched(u)
+        if address.lower() in {a.lower() for a in watched + [u.get("address") or ""]}:
+            return False
+        if limit and len(watched) + bool(u.get("address")) >= limit:
+            raise ValueError(f"at most {limit} addresses")
+        self._upsert(uid, {"addresses": json.dumps(watched + [address])})
+        return True
+
+    def remove_address(self, tg_user_id: int, address: str) -> bool:
+        uid = str(tg_user_id)
+        watched = self._watched(self._get(uid))
+        keep = [a for a in watched if a.lower() != address.lower()]
+        if len(keep) == len(watched):
+            return False
+        self._upsert(uid, {"addresses": json.dumps(keep)})
+        return True
 
     def set_pk(self, tg_user_id: int, pk_hex: str):
-        token = self._fernet.encrypt(pk_hex.encode("utf-8")).decode("utf-8")
-        u = self._cache.get(str(tg_user_id), {})
-        u["pk"] = token
-        self._cache[str(tg_user_id)] = u
-        self._save()
+        token = self._keys.encrypt(pk_hex)
+        self._pk_cache.invalidate(str(tg_user_id))
+        self._upsert(str(tg_user_id), {"pk": token})
 
     def get_pk(self, tg_user_id: int) -> Optional[str]:
-        u = self._cache.get(str(tg_user_id), {})
-        token = u.get("pk")
+        uid = str(tg_user_id)
+        token = self._get(uid).get("pk")
         if not token:
             return None
+        # cache entries are bound to the ciphertext, so a set_pk from another
+        # process is never shadowed by a stale plaintext
+        pk = self._pk_cache.get(uid, token)
+        if pk is not None:
+            return pk
         try:
-            return self._fernet.decrypt(token.encode("utf-8")).decode("utf-8")
+            pk = self._keys.decrypt(token)
         except (InvalidToken, Exception) as e:
             log.error("failed decrypting pk: %s", e)
             return None
+        self._pk_cache.put(uid, token, pk)
+        return pk
+
+    def reencrypt_all(self, batch: int = 500) -> Dict[str, int]:
+        # stream every stored pk and move it to the current key (rotation)
+        stats = {"scanned": 0, "reencrypted": 0, "failed": 0}
+        for rows in self._db.iter_pks(batch):
+            todo = []
+            for uid, token in rows:
+                stats["scanned"] += 1
+                if self._keys.is_current(token):
+                    continue
+                try:
+                    todo.append((uid, token, self._keys.encrypt(self._keys.decrypt(token))))
+                except Exception as e:
+                    stats["failed"] += 1
+                    log.error("reencrypt failed for %s: %s", uid, e)
+            if todo:
+                stats["reencrypted"] += self._db.replace_pks(todo)
+                for uid, _, _ in todo:
+                    self._pk_cache.invalidate(uid)
+        return stats
+
+if __name__ == "__main__":
+    # python -m app.util_store reencrypt
+    # rotation: set SECRET_KEY=<new>, SECRET_KEY_PREVIOUS=<old>, run this, then drop the old secret
+    logging.basicConfig(level=logging.INFO)
+    if sys.argv[1:] != ["reencrypt"]:
+        sys.exit("usage: python -m app.util_store reencrypt")
+    st = Store(settings.DATA_DIR, os.getenv("SECRET_KEY", "changeme-changeme-changeme"))
+    print(json.dumps(st.reencrypt_all()))
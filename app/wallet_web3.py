@@ -1,44 +1,191 @@
-import os, logging, time
-from typing import Dict, Any, Optional
-from web3 import Web3
-from hexbytes import HexBytes
+import os, logging, time, threading, asyncio, functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Iterable, Tuple
+from . import settings
+from .balance_cache import BalanceCache
+from .rpc_pool import EndpointPool
+from . import metrics
+from .address import checksum, address_call, balance_of_data, transfer_data, GET_ETH_BALANCE
+from .nonce_gas import NonceManager, GasPriceOracle, GasEstimateCache
+from .portfolio import cache_key as portfolio_key
 import json
+from eth_utils import from_wei, to_wei  # already loaded by .address, unlike web3
 
 log = logging.getLogger("slh.wallet")
 
 RPC_URL = os.getenv("BSC_RPC_URL", "https://bsc-dataseed.binance.org")
-CHAIN_ID = int(os.getenv("CHAIN_ID", "56"))
-TOKEN_ADDR = Web3.to_checksum_address(os.getenv("SELA_TOKEN_ADDRESS", "0x0000000000000000000000000000000000000000"))
+# extra endpoints for failover/hedging, comma separated; BSC_RPC_URL stays first
+RPC_URLS = [RPC_URL] + [u.strip() for u in os.getenv("BSC_RPC_URLS", "").split(",") if u.strip() and u.strip() != RPC_URL]
+RPC_TIMEOUT = float(os.getenv("RPC_TIMEOUT", "15"))
+RPC_HEDGE_PERCENTILE = float(os.getenv("RPC_HEDGE_PERCENTILE", "0.9"))
+RPC_BREAKER_FAILURES = int(os.getenv("RPC_BREAKER_FAILURES", "3"))
+RPC_BREAKER_COOLDOWN = float(os.getenv("RPC_BREAKER_COOLDOWN", "30"))
+CHAIN_ID = settings.CHAIN_ID
+TOKEN_ADDR = checksum(os.getenv("SELA_TOKEN_ADDRESS", "0x0000000000000000000000000000000000000000"))
+# Multicall3 is deployed at the same address on BSC mainnet and testnet
+MULTICALL_ADDR = checksum(os.getenv("MULTICALL3_ADDRESS", "0xcA11bde05977b3631167028862bE2a173976CA11"))
+MULTICALL_CHUNK = int(os.getenv("MULTICALL_CHUNK", "200"))
+DATA_DIR = settings.DATA_DIR
+# upper bound on concurrent blocking RPC work issued from async handlers
+RPC_READ_CONCURRENCY = int(os.getenv("RPC_READ_CONCURRENCY", "16"))
+RPC_SEND_CONCURRENCY = int(os.getenv("RPC_SEND_CONCURRENCY", "4"))
+BALANCE_CACHE_TTL = float(os.getenv("BALANCE_CACHE_TTL", "5"))
+BALANCE_CACHE_SIZE = int(os.getenv("BALANCE_CACHE_SIZE", "10000"))
+# how often (seconds) to check eth_blockNumber for block-aware invalidation; 0 = TTL only
+BALANCE_CACHE_BLOCK_POLL = float(os.getenv("BALANCE_CACHE_BLOCK_POLL", "3"))
+GAS_PRICE_REFRESH = float(os.getenv("GAS_PRICE_REFRESH", "10"))
+GAS_ESTIMATE_TTL = float(os.getenv("GAS_ESTIMATE_TTL", "600"))
+GAS_ESTIMATE_MARGIN = float(os.getenv("GAS_ESTIMATE_MARGIN", "1.2"))
+# absolute extra gas on cached limits: covers transfers to fresh recipients
+GAS_ESTIMATE_HEADROOM = int(os.getenv("GAS_ESTIMATE_HEADROOM", "25000"))
 
-_w3 = Web3(Web3.HTTPProvider(RPC_URL, request_kwargs={"timeout": 15}))
-with open(os.path.join(os.path.dirname(__file__), "abi", "erc20.json"), "r", encoding="utf-8") as f:
-    _ERC20_ABI = json.load(f)
+# broadcasts are failed over but never hedged. A failover after a timeout can
+# resend a tx the first node already took; see _send_raw
+_NO_HEDGE = {"eth_sendRawTransaction"}
+# the node already holds this exact tx
+_KNOWN = ("already known", "known transaction")
+# the nonce went to another tx from the same key (one we did not count)
+_NONCE_TAKEN = ("nonce too low", "replacement transaction underpriced")
 
-_token = _w3.eth.contract(address=TOKEN_ADDR, abi=_ERC20_ABI)
+RPC_SECONDS = metrics.histogram("slh_rpc_seconds", "JSON-RPC call latency (incl. hedging/failover)", ["method"])
+RPC_ERRORS = metrics.counter("slh_rpc_errors_total", "JSON-RPC calls that raised or returned an error", ["method"])
+
+def _observe_rpc(method: str, t0: float, failed: bool):
+    RPC_SECONDS.observe(time.perf_counter() - t0, method=method)
+    if failed:
+        RPC_ERRORS.inc(method=method)
+
+def _pooled_provider(pool: EndpointPool, timeout: float):
+    from web3 import Web3
+    from web3.providers import JSONBaseProvider
+
+    class PooledHTTPProvider(JSONBaseProvider):
+        # web3 provider that sends every request through an EndpointPool
+        def __init__(self):
+            super().__init__()
+            self.pool = pool
+            self._providers = {u: Web3.HTTPProvider(u, request_kwargs={"timeout": timeout}) for u in (e.url for e in pool.endpoints)}
+
+        def make_request(self, method, params):
+            t0, failed = time.perf_counter(), True
+            try:
+                with metrics.span("rpc", method=str(method)):
+                    r = self.pool.call(lambda url: self._providers[url].make_request(method, params),
+                                       hedge=method not in _NO_HEDGE)
+                failed = "error" in r
+                return r
+            finally:
+                _observe_rpc(str(method), t0, failed)
+
+    return PooledHTTPProvider()
+
+rpc_pool = EndpointPool(RPC_URLS, hedge_percentile=RPC_HEDGE_PERCENTILE,
+                        breaker_failures=RPC_BREAKER_FAILURES, breaker_cooldown=RPC_BREAKER_COOLDOWN)
+_BLOCK_NUMBER_DATA = "0x42cbb15c"  # Multicall3.getBlockNumber()
+
+# ========== lazy web3 ==========
+# importing web3/eth-account takes about a second; the provider, ABIs and
+# contracts are built on first use (or by the webhook preload), not at import
+_w3 = None
+_token = None
+_multicall = None
+_w3_lock = threading.Lock()
+
+def _abi(name: str):
+    with open(os.path.join(os.path.dirname(__file__), "abi", f"{name}.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def web3():
+    global _w3, _token, _multicall
+    if _w3 is None:
+        with _w3_lock:
+            if _w3 is None:
+                from web3 import Web3
+                w3 = Web3(_pooled_provider(rpc_pool, RPC_TIMEOUT))
+                _token = w3.eth.contract(address=TOKEN_ADDR, abi=_abi("erc20"))
+                _multicall = w3.eth.contract(address=MULTICALL_ADDR, abi=_abi("multicall3"))
+                _w3 = w3
+    return _w3
+
+balance_cache = BalanceCache(maxsize=BALANCE_CACHE_SIZE, ttl=BALANCE_CACHE_TTL,
+                             block_aware=BALANCE_CACHE_BLOCK_POLL > 0)
+metrics.gauge("slh_cache_requests", "Cache lookups by result", lambda: {
+    ("balance", "hit"): balance_cache.hits, ("balance", "miss"): balance_cache.misses}, ["cache", "result"])
+metrics.gauge("slh_cache_hit_ratio", "Cache hit ratio since start", lambda: {
+    ("balance",): balance_cache.stats()["hit_ratio"]}, ["cache"])
+_last_block_poll = 0.0
+
+# ========== token metadata ==========
+# decimals/symbol are immutable per (chain_id, token): resolve once, keep in
+# memory, and persist to DATA_DIR/token_meta.json so restarts skip the RPC.
+_META_PATH = os.path.join(DATA_DIR, "token_meta.json")
+_meta: Dict[str, Dict[str, Any]] = {}
+_meta_loaded = False
+_meta_lock = threading.Lock()
+
+def _meta_key(token: str) -> str:
+    return f"{CHAIN_ID}:{token.lower()}"
+
+def _load_meta_file():
+    global _meta_loaded
+    _meta_loaded = True
+    try:
+        with open(_META_PATH, "r", encoding="utf-8") as f:
+            _meta.update(json.load(f))
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        log.error("failed loading token meta: %s", e)
+
+def _save_meta_file():
+    try:
+        os.makedirs(DATA_DIR, exist_ok=True)
+        tmp = _META_PATH + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(_meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, _META_PATH)
+    except Exception as e:
+        log.warning("failed persisting token meta: %s", e)
+
+def token_meta() -> Dict[str, Any]:
+    key = _meta_key(TOKEN_ADDR)
+    m = _meta.get(key)
+    if m is not None:
+        return m
+    with _meta_lock:
+        if not _meta_loaded:
+            _load_meta_file()
+        m = _meta.get(key)
+        if m is None:
+            web3()
+            m = {"symbol": _token.functions.symbol().call(), "decimals": int(_token.functions.decimals().call())}
+            _meta[key] = m
+            _save_meta_file()
+    return m
 
 def ok() -> bool:
     try:
-        return _w3.is_connected()
+        return web3().is_connected()
     except Exception:
         return False
 
-def checksum(addr: str) -> str:
-    return Web3.to_checksum_address(addr)
+def address_from_pk(pk_hex: str) -> str:
+    return web3().eth.account.from_key(pk_hex).address
 
-def get_balances(address: str) -> Dict[str, Any]:
+def _get_balances_direct(address: str) -> Dict[str, Any]:
     addr = checksum(address)
     out: Dict[str, Any] = {"address": addr, "chain_id": CHAIN_ID, "rpc": RPC_URL}
     try:
-        bnb_wei = _w3.eth.get_balance(addr)
-        out["bnb"] = {"wei": bnb_wei, "eth": Web3.from_wei(bnb_wei, "ether")}
+        bnb_wei = web3().eth.get_balance(addr)
+        out["bnb"] = {"wei": bnb_wei, "eth": from_wei(bnb_wei, "ether")}
     except Exception as e:
         log.error("get_balance bnb failed: %s", e)
         out["bnb"] = {"error": str(e)}
 
     try:
-        bal = _token.functions.balanceOf(addr).call()
-        decimals = _token.functions.decimals().call()
-        symbol = _token.functions.symbol().call()
+        bal = _decode(["uint256"], True, web3().eth.call({"to": TOKEN_ADDR, "data": balance_of_data(addr)}))
+        meta = token_meta()
+        decimals, symbol = meta["decimals"], meta["symbol"]
         value = bal / (10**decimals)
         out["slh"] = {"symbol": symbol, "decimals": decimals, "raw": bal, "value": float(value)}
     except Exception as e:
@@ -47,41 +194,322 @@ def get_balances(address: str) -> Dict[str, Any]:
 
     return out
 
+def _aggregate(calls: List[tuple]) -> List[tuple]:
+    # calls: [(target, calldata)] -> [(success, return_bytes)], one eth_call
+    web3()
+    return _multicall.functions.aggregate3([(t, True, d) for t, d in calls]).call()
+
+def _decode(types: List[str], ok: bool, data: bytes):
+    if not ok or not data:
+        raise ValueError("call reverted")
+    return web3().codec.decode(types, data)[0]
+
+def _balances_chunk(addrs: List[str]):
+    calls = [(MULTICALL_ADDR, _BLOCK_NUMBER_DATA)]
+    for a in addrs:
+        calls.append((MULTICALL_ADDR, address_call(GET_ETH_BALANCE, a)))
+        calls.append((TOKEN_ADDR, balance_of_data(a)))
+    res = _aggregate(calls)
+    try:
+        block = _decode(["uint256"], *res[0])
+    except Exception:
+        block = None
+    res = res[1:]
+
+    meta_err = None
+    try:
+        meta = token_meta()
+        decimals, symbol = meta["decimals"], meta["symbol"]
+    except Exception as e:
+        meta_err = e
+
+    outs = []
+    for i, a in enumerate(addrs):
+        out: Dict[str, Any] = {"address": a, "chain_id": CHAIN_ID, "rpc": RPC_URL}
+        bnb_res, tok_res = res[2*i], res[2*i + 1]
+        try:
+            bnb_wei = _decode(["uint256"], *bnb_res)
+            out["bnb"] = {"wei": bnb_wei, "eth": from_wei(bnb_wei, "ether")}
+        except Exception as e:
+            out["bnb"] = {"error": str(e)}
+        try:
+            if meta_err is not None:
+                raise meta_err
+            bal = _decode(["uint256"], *tok_res)
+            value = bal / (10**decimals)
+            out["slh"] = {"symbol": symbol, "decimals": decimals, "raw": bal, "value": float(value)}
+        except Exception as e:
+            out["slh"] = {"error": str(e)}
+        outs.append(out)
+    return block, outs
+
+def _poll_block():
+    global _last_block_poll
+    if BALANCE_CACHE_BLOCK_POLL <= 0 or time.monotonic() - _last_block_poll < BALANCE_CACHE_BLOCK_POLL:
+        return
+    _last_block_poll = time.monotonic()
+    try:
+        balance_cache.note_block(web3().eth.block_number)
+    except Exception as e:
+        log.warning("block number poll failed: %s", e)
+
+def _cache_put(out: Dict[str, Any], block: Optional[int] = None):
+    if "error" in out.get("bnb", {}) or "error" in out.get("slh", {}):
+        return
+    balance_cache.put((CHAIN_ID, out["address"]), out, block)
+
+def invalidate_balance(address: str):
+    balance_cache.invalidate((CHAIN_ID, checksum(address)))
+    balance_cache.invalidate(portfolio_key(address))
+
+def get_balances_many(addresses: Iterable[str]) -> List[Dict[str, Any]]:
+    # same dict shape as get_balances, in input order; native + token reads for
+    # MULTICALL_CHUNK addresses go out as a single aggregate3 eth_call, with a
+    # per-address fallback if multicall is unavailable on the node/chain
+    # (repeat reads within BALANCE_CACHE_TTL / the same block come from balance_cache)
+    addrs = [checksum(a) for a in addresses]
+    if balance_cache.block_aware and len(balance_cache):
+        _poll_block()
+    outs: List[Optional[Dict[str, Any]]] = [balance_cache.get((CHAIN_ID, a)) for a in addrs]
+    missing = [i for i, o in enumerate(outs) if o is None]
+    for j in range(0, len(missing), MULTICALL_CHUNK):
+        idx = missing[j:j + MULTICALL_CHUNK]
+        chunk = [addrs[i] for i in idx]
+        try:
+            block, fetched = _balances_chunk(chunk)
+            balance_cache.note_block(block)
+        except Exception as e:
+            log.error("multicall balances failed, falling back: %s", e)
+            block, fetched = None, [_get_balances_direct(a) for a in chunk]
+        for i, out in zip(idx, fetched):
+            outs[i] = out
+            _cache_put(out, block)
+    return outs
+
+def get_balances(address: str) -> Dict[str, Any]:
+    return get_balances_many([address])[0]
+
+# ========== sending ==========
+_nonces = NonceManager(lambda a: web3().eth.get_transaction_count(a, "pending"))
+gas_oracle = GasPriceOracle(lambda: web3().eth.gas_price, refresh=GAS_PRICE_REFRESH, max_age=max(GAS_PRICE_REFRESH * 6, 30))
+_gas_estimates = GasEstimateCache(ttl=GAS_ESTIMATE_TTL, margin=GAS_ESTIMATE_MARGIN, headroom=GAS_ESTIMATE_HEADROOM)
+
+def _tx_seen(tx_hash) -> bool:
+    from web3.exceptions import TransactionNotFound
+    try:
+        return web3().eth.get_transaction(tx_hash) is not None
+    except TransactionNotFound:
+        return False
+
+def _send_raw(raw, tx_hash):
+    # the hash is known before sending, so a node answering "already known",
+    # or "nonce too low" while that hash is in its pool or mined, took our tx
+    # (typically on a failover after the first endpoint timed out). Raises
+    # ValueError when the node refused the tx; any other error leaves the
+    # outcome unknown
+    try:
+        return web3().eth.send_raw_transaction(raw)
+    except ValueError as e:
+        msg = str(e).lower()
+        if any(k in msg for k in _KNOWN) or ("nonce too low" in msg and _tx_seen(tx_hash)):
+            return tx_hash
+        raise
+
+def _sign_and_send(acct, tx: Dict[str, Any]):
+    # nonce allocation and broadcast stay under the sender's lock so rapid
+    # sends from one wallet go out in order. The nonce is only resynced when
+    # the tx did not go in: a refusal, or a lost answer and no trace of the
+    # hash (the resync reads the node's pending count, which has any tx it took).
+    # A nonce taken by another sender on the same key is resynced and the tx
+    # re-signed once; see NonceManager for the single-sender rule
+    with _nonces.lock(acct.address):
+        for retry in (False, True):
+            nonce = _nonces.allocate(acct.address)
+            tx["nonce"] = nonce
+            signed = acct.sign_transaction(tx)
+            try:
+                tx_hash = _send_raw(signed.rawTransaction, signed.hash)
+            except ValueError as e:
+                _nonces.reset(acct.address)
+                if retry or not any(k in str(e).lower() for k in _NONCE_TAKEN):
+                    raise
+                log.warning("nonce %s of %s taken elsewhere, resyncing", nonce, acct.address)
+                continue
+            except Exception:
+                if not _tx_seen(signed.hash):
+                    _nonces.reset(acct.address)
+                    raise
+                tx_hash = signed.hash
+            return tx_hash, nonce
+
 def send_bnb(pk_hex: str, to_addr: str, amount_bnb: float, gas_limit: int = 21000) -> Dict[str, Any]:
-    acct = _w3.eth.account.from_key(pk_hex)
+    acct = web3().eth.account.from_key(pk_hex)
     to = checksum(to_addr)
-    nonce = _w3.eth.get_transaction_count(acct.address)
-    gas_price = _w3.eth.gas_price
+    gas_price = gas_oracle.get()
     tx = {
         "to": to,
-        "value": Web3.to_wei(amount_bnb, "ether"),
+        "value": to_wei(amount_bnb, "ether"),
         "gas": gas_limit,
         "gasPrice": gas_price,
-        "nonce": nonce,
         "chainId": CHAIN_ID,
     }
-    signed = acct.sign_transaction(tx)
-    tx_hash = _w3.eth.send_raw_transaction(signed.rawTransaction)
-    return {"tx_hash": tx_hash.hex(), "gas_price": int(gas_price), "nonce": nonce}
+    tx_hash, nonce = _sign_and_send(acct, tx)
+    invalidate_balance(acct.address)
+    invalidate_balance(to)
+    return {"tx_hash": tx_hash.hex(), "gas_price": int(gas_price), "nonce": nonce, "from": acct.address, "to": to}
 
-def send_token(pk_hex: str, to_addr: str, amount_token: float) -> Dict[str, Any]:
-    acct = _w3.eth.account.from_key(pk_hex)
-    to = checksum(to_addr)
-    decimals = _token.functions.decimals().call()
+def _transfer_gas(tx: Dict[str, Any]) -> int:
+    try:
+        return _gas_estimates.get_or_estimate((TOKEN_ADDR, "transfer"), lambda: web3().eth.estimate_gas(tx))
+    except Exception:
+        return 100000
+
+def _token_transfer_tx(sender: str, to: str, amount_token: float, gas_price: int) -> Dict[str, Any]:
+    decimals = token_meta()["decimals"]
     amount = int(amount_token * (10**decimals))
-    nonce = _w3.eth.get_transaction_count(acct.address)
-    gas_price = _w3.eth.gas_price
-    tx = _token.functions.transfer(to, amount).build_transaction({
-        "from": acct.address,
-        "nonce": nonce,
+    tx = {
+        "from": sender,
+        "to": TOKEN_ADDR,
+        "value": 0,
+        "data": transfer_data(to, amount),
         "gasPrice": gas_price,
         "chainId": CHAIN_ID,
-    })
-    # estimate gas
+    }
+    tx["gas"] = _transfer_gas(tx)
+    return tx
+
+def send_token(pk_hex: str, to_addr: str, amount_token: float) -> Dict[str, Any]:
+    acct = web3().eth.account.from_key(pk_hex)
+    to = checksum(to_addr)
+    gas_price = gas_oracle.get()
+    tx = _token_transfer_tx(acct.address, to, amount_token, gas_price)
+    tx_hash, nonce = _sign_and_send(acct, tx)
+    invalidate_balance(acct.address)
+    invalidate_balance(to)
+    return {"tx_hash": tx_hash.hex(), "gas_price": int(gas_price), "nonce": nonce, "from": acct.address, "to": to}
+
+def presign_token_transfers(pk_hex: str, items: List[Tuple[str, float]], nonces: Optional[List[int]] = None,
+                            floor: Optional[int] = None) -> List[Dict[str, Any]]:
+    # sign a batch of transfers with consecutive nonces reserved in one go;
+    # nothing is broadcast, see broadcast_raw. `nonces` re-signs at given
+    # nonces (a replacement, so at most one version can be mined); `floor`
+    # keeps new nonces above ones still held by unmined signed txs.
+    acct = web3().eth.account.from_key(pk_hex)
+    gas_price = gas_oracle.get()
+    out = []
+    with _nonces.lock(acct.address):
+        if floor is not None and nonces is None:
+            _nonces.advance(acct.address, floor)
+        for i, (to_addr, amount_token) in enumerate(items):
+            to = checksum(to_addr)
+            tx = _token_transfer_tx(acct.address, to, amount_token, gas_price)
+            tx["nonce"] = nonces[i] if nonces is not None else _nonces.allocate(acct.address)
+            signed = acct.sign_transaction(tx)
+            out.append({"to": to, "amount": amount_token, "nonce": tx["nonce"],
+                        "raw": signed.rawTransaction.hex(), "tx_hash": signed.hash.hex()})
+    return out
+
+def resync_nonce(address: str):
+    _nonces.reset(checksum(address))
+
+def broadcast_raw(raw_hex: str) -> str:
+    from web3 import Web3
+    return _send_raw(raw_hex, Web3.keccak(hexstr=raw_hex)).hex()
+
+def get_receipt(tx_hash: str) -> Optional[Dict[str, Any]]:
+    w3 = web3()
+    from web3.exceptions import TransactionNotFound
     try:
-        tx["gas"] = _w3.eth.estimate_gas(tx)
-    except Exception:
-        tx["gas"] = 100000
-    signed = acct.sign_transaction(tx)
-    tx_hash = _w3.eth.send_raw_transaction(signed.rawTransaction)
-    return {"tx_hash": tx_hash.hex(), "gas_price": int(gas_price), "nonce": nonce}
+        r = w3.eth.get_transaction_receipt(tx_hash)
+    except TransactionNotFound:
+        return None
+    if r is None:
+        return None
+    return {"status": int(r["status"]), "block": int(r["blockNumber"]), "gas_used": int(r["gasUsed"])}
+
+# ========== raw JSON-RPC batches ==========
+# web3 v6 has no batch API; these go straight to the node in one HTTP request
+_http = None
+
+def _session():
+    global _http
+    if _http is None:
+        import requests
+        _http = requests.Session()
+    return _http
+
+def rpc_batch(calls: List[Tuple[str, list]]) -> List[Dict[str, Any]]:
+    # calls: [(method, params)] -> responses in the same order
+    if not calls:
+        return []
+    payload = [{"jsonrpc": "2.0", "id": i, "method": m, "params": p} for i, (m, p) in enumerate(calls)]
+    def post(url):
+        r = _session().post(url, json=payload, timeout=RPC_TIMEOUT)
+        r.raise_for_status()
+        return r.json()
+    method = "batch:" + calls[0][0]
+    t0, failed = time.perf_counter(), True
+    try:
+        body = rpc_pool.call(post)
+        failed = isinstance(body, dict)
+    finally:
+        _observe_rpc(method, t0, failed)
+    if isinstance(body, dict):  # node rejected the batch as a whole
+        return [body] * len(calls)
+    by_id = {x.get("id"): x for x in body}
+    return [by_id.get(i, {"error": "missing in batch response"}) for i in range(len(calls))]
+
+def get_receipts(tx_hashes: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    # one eth_getTransactionReceipt batch; None = not mined yet (or lookup error)
+    out: Dict[str, Optional[Dict[str, Any]]] = {}
+    for h, resp in zip(tx_hashes, rpc_batch([("eth_getTransactionReceipt", [h]) for h in tx_hashes])):
+        r = resp.get("result")
+        if not r:
+            if "error" in resp:
+                log.warning("receipt %s: %s", h, resp["error"])
+            out[h] = None
+            continue
+        out[h] = {"status": int(r["status"], 16), "block": int(r["blockNumber"], 16), "gas_used": int(r["gasUsed"], 16)}
+    return out
+
+# ========== async facade ==========
+# web3's HTTPProvider is blocking; PTB handlers await these instead so a slow
+# node only occupies a pool thread, never the event loop. Reads and sends get
+# separate bounded pools so a burst of balance taps can't starve transfers.
+_read_pool = ThreadPoolExecutor(max_workers=RPC_READ_CONCURRENCY, thread_name_prefix="rpc-read")
+_send_pool = ThreadPoolExecutor(max_workers=RPC_SEND_CONCURRENCY, thread_name_prefix="rpc-send")
+
+async def _in_pool(pool: ThreadPoolExecutor, fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(pool, functools.partial(fn, *args, **kwargs))
+
+async def aget_balances(address: str) -> Dict[str, Any]:
+    return await _in_pool(_read_pool, get_balances, address)
+
+async def aget_balances_many(addresses: Iterable[str]) -> List[Dict[str, Any]]:
+    return await _in_pool(_read_pool, get_balances_many, list(addresses))
+
+async def asend_bnb(pk_hex: str, to_addr: str, amount_bnb: float, gas_limit: int = 21000) -> Dict[str, Any]:
+    return await _in_pool(_send_pool, send_bnb, pk_hex, to_addr, amount_bnb, gas_limit)
+
+async def asend_token(pk_hex: str, to_addr: str, amount_token: float) -> Dict[str, Any]:
+    return await _in_pool(_send_pool, send_token, pk_hex, to_addr, amount_token)
+
+async def apresign_token_transfers(pk_hex: str, items: List[Tuple[str, float]], nonces: Optional[List[int]] = None,
+                                   floor: Optional[int] = None) -> List[Dict[str, Any]]:
+    return await _in_pool(_send_pool, presign_token_transfers, pk_hex, items, nonces, floor)
+
+async def abroadcast_raw(raw_hex: str) -> str:
+    return await _in_pool(_send_pool, broadcast_raw, raw_hex)
+
+async def aget_receipt(tx_hash: str) -> Optional[Dict[str, Any]]:
+    return await _in_pool(_read_pool, get_receipt, tx_hash)
+
+async def aget_receipts(tx_hashes: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    return await _in_pool(_read_pool, get_receipts, list(tx_hashes))
+
+async def arpc_batch(calls: List[Tuple[str, list]]) -> List[Dict[str, Any]]:
+    return await _in_pool(_read_pool, rpc_batch, list(calls))
+
+async def atoken_meta() -> Dict[str, Any]:
+    return await _in_pool(_read_pool, token_meta)
@@ -0,0 +1,122 @@
+import os, json, time, random, argparse, threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, Optional
+from urllib.parse import parse_qs
+
+# Local stand-in for the Telegram Bot API (https://api.telegram.org/bot<token>/<method>).
+# Answers the methods the bot uses and records when the first reply to each
+# chat arrived, which is what end-to-end webhook latency is measured against.
+# Point the bot at it with TELEGRAM_API_BASE=<url>.
+
+class FakeTelegram:
+    def __init__(self, port: int = 0, latency_ms: float = 0.0):
+        self.port = port
+        self.latency = latency_ms / 1000.0
+        self.calls: Counter = Counter()
+        self.first_reply: Dict[int, float] = {}
+        self._message_id = 0
+        self._cond = threading.Condition()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def reset(self):
+        with self._cond:
+            self.calls.clear()
+            self.first_reply.clear()
+
+    def wait_replies(self, chat_ids: Iterable[int], timeout: float) -> bool:
+        want = set(chat_ids)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while not want.issubset(self.first_reply):
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return False
+                self._cond.wait(left)
+        return True
+
+    def handle(self, method: str, params: Dict[str, Any]) -> Any:
+        now = time.perf_counter()
+        with self._cond:
+            self.calls[method] += 1
+            if method in ("sendMessage", "editMessageText", "sendDocument"):
+                self._message_id += 1
+                mid = self._message_id
+                chat_id = int(params.get("chat_id") or 0)
+                self.first_reply.setdefault(chat_id, now)
+                self._cond.notify_all()
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "bench", "username": "slh_bench_bot",
+                    "can_join_groups": True, "can_read_all_group_messages": False, "supports_inline_queries": False}
+        if method in ("sendMessage", "editMessageText", "sendDocument"):
+            return {"message_id": mid, "date": int(time.time()),
+                    "chat": {"id": chat_id, "type": "private"}, "text": params.get("text", "")}
+        if method == "getWebhookInfo":
+            return {"url": "", "has_custom_certificate": False, "pending_update_count": 0}
+        return True
+
+    def start(self) -> "FakeTelegram":
+        tg = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                # /bot<token>/<method>; PTB sends form fields with JSON-encoded values
+                method = self.path.rstrip("/").rsplit("/", 1)[-1]
+                body = self.rfile.read(int(self.headers.get("Content-Length", "0") or 0))
+                ctype = self.headers.get("Content-Type", "")
+                params: Dict[str, Any] = {}
+                if "json" in ctype:
+                    params = json.loads(body or b"{}")
+                elif "form-urlencoded" in ctype:
+                    for k, v in parse_qs(body.decode()).items():
+                        try:
+                            params[k] = json.loads(v[0])
+                        except ValueError:
+                            params[k] = v[0]
+                if tg.latency:
+                    time.sleep(tg.latency * random.uniform(0.5, 1.5))
+                data = json.dumps({"ok": True, "result": tg.handle(method, params)}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="fake-telegram", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+def main():
+    ap = argparse.ArgumentParser(description="Fake Telegram Bot API")
+    ap.add_argument("--port", type=int, default=int(os.getenv("FAKE_TELEGRAM_PORT", "8081")))
+    ap.add_argument("--latency-ms", type=float, default=30.0)
+    a = ap.parse_args()
+    tg = FakeTelegram(a.port, a.latency_ms).start()
+    print(f"fake Telegram API on {tg.url} (set TELEGRAM_API_BASE={tg.url})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        tg.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+import os, json, time, random, argparse, threading
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from eth_abi import encode, decode
+from eth_utils import keccak
+
+# Local stand-in for a BSC JSON-RPC node. Serves the calls the bot and the api
+# make (balances, ERC-20 views, Multicall3, gas, nonces, raw sends, receipts)
+# with deterministic data and a configurable per-request latency, so runs are
+# comparable without touching a real network. About one block in four carries
+# a token Transfer log; reorg() replaces the last blocks with a different fork.
+
+def _sel(sig: str) -> bytes:
+    return keccak(text=sig)[:4]
+
+SEL_BALANCE_OF = _sel("balanceOf(address)")
+SEL_DECIMALS = _sel("decimals()")
+SEL_SYMBOL = _sel("symbol()")
+SEL_NAME = _sel("name()")
+SEL_TOTAL_SUPPLY = _sel("totalSupply()")
+SEL_TRANSFER = _sel("transfer(address,uint256)")
+SEL_AGGREGATE3 = _sel("aggregate3((address,bool,bytes)[])")
+SEL_GET_ETH_BALANCE = _sel("getEthBalance(address)")
+SEL_GET_BLOCK_NUMBER = _sel("getBlockNumber()")
+TRANSFER_TOPIC = "0x" + keccak(text="Transfer(address,address,uint256)").hex()
+
+class Reverted(Exception):
+    pass
+
+def _hex(b: bytes) -> str:
+    return "0x" + b.hex()
+
+def _unhex(h: str) -> bytes:
+    h = h or ""
+    return bytes.fromhex(h[2:] if h.startswith("0x") else h)
+
+class MockNode:
+    def __init__(self, port: int = 0, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 chain_id: int = 56, block_time: float = 3.0, confirm_blocks: int = 1,
+                 decimals: int = 18, symbol: str = "SLH", name: str = "SLH Token", max_log_range: int = 5000):
+        self.port = port
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.error_rate = error_rate
+        self.chain_id = chain_id
+        self.block_time = block_time
+        self.confirm_blocks = confirm_blocks
+        self.decimals = decimals
+        self.symbol = symbol
+        self.name = name
+        self.max_log_range = max_log_range
+        self.started = time.time()
+        self._forks: List[Tuple[int, int]] = []  # (first block, salt)
+        self.calls: Counter = Counter()
+        self.requests = 0
+        self._txs: Dict[bytes, int] = {}
+        self._nonces: Dict[str, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    # ---- chain state ----
+    def block(self) -> int:
+        return 1_000_000 + int((time.time() - self.started) / self.block_time)
+
+    def _salt(self, blk: int) -> int:
+        salt = 0
+        for first, s in self._forks:
+            if blk >= first:
+                salt = s
+        return salt
+
+    def block_hash(self, blk: int) -> str:
+        return _hex(keccak(f"{blk}:{self._salt(blk)}".encode()))
+
+    def reorg(self, depth: int):
+        # the last `depth` blocks get new hashes and different Transfer logs
+        with self._lock:
+            self._forks.append((self.block() - depth + 1, len(self._forks) + 1))
+
+    def transfer_logs(self, blk: int, token: str) -> List[Dict[str, Any]]:
+        k = keccak(f"logs:{blk}:{self._salt(blk)}".encode())
+        if k[0] >= 64:
+            return []
+        holder = lambda i: "0x" + keccak(b"holder" + bytes([i]))[:20].hex()
+        src = "0x" + "00" * 20 if k[1] % 4 == 0 else holder(k[2] % 16)
+        topic = lambda a: "0x" + "00" * 12 + a[2:]
+        return [{"address": token, "topics": [TRANSFER_TOPIC, topic(src), topic(holder(k[3] % 16))],
+                 "data": "0x" + format(int.from_bytes(k[4:8], "big") * 10**12, "064x"),
+                 "blockNumber": hex(blk), "blockHash": self.block_hash(blk),
+                 "transactionHash": _hex(keccak(b"tx" + k)), "transactionIndex": "0x0",
+                 "logIndex": "0x0", "removed": False}]
+
+    def _get_logs(self, flt: Dict[str, Any]) -> List[Dict[str, Any]]:
+        head = self.block()
+        num = lambda v, d: head if v in (None, "latest", "pending", "safe", "finalized") else int(v, 16) if isinstance(v, str) else d
+        frm, to = num(flt.get("fromBlock"), head), min(num(flt.get("toBlock"), head), head)
+        if to - frm + 1 > self.max_log_range:
+            raise ValueError(f"block range is too large (max {self.max_log_range})")
+        topics = flt.get("topics") or []
+        if topics and topics[0] and topics[0] != TRANSFER_TOPIC:
+            return []
+        token = flt.get("address") or "0x" + "00" * 20
+        return [lg for b in range(frm, to + 1) for lg in self.transfer_logs(b, token)]
+
+    def _block(self, tag: str) -> Optional[Dict[str, Any]]:
+        n = self.block() if tag in ("latest", "pending", "safe", "finalized") else int(tag, 16)
+        if n > self.block():
+            return None
+        return {"number": hex(n), "hash": self.block_hash(n), "parentHash": self.block_hash(n - 1),
+                "timestamp": hex(int(self.started + (n - 1_000_000) * self.block_time)), "transactions": []}
+
+    @staticmethod
+    def balance_wei(addr: bytes) -> int:
+        return int.from_bytes(keccak(b"bnb" + addr)[:8], "big")
+
+    def token_balance(self, addr: bytes) -> int:
+        return int.from_bytes(keccak(b"tok" + addr)[:6], "big") * 10**(self.decimals - 6 if self.decimals > 6 else 0)
+
+    def _call(self, data: bytes) -> bytes:
+        # dispatch on selector only: any address answers as the token or Multicall3
+        sel, args = data[:4], data[4:]
+        if sel == SEL_BALANCE_OF:
+            return encode(["uint256"], [self.token_balance(_unhex(decode(["address"], args)[0]))])
+        if sel == SEL_GET_ETH_BALANCE:
+            return encode(["uint256"], [self.balance_wei(_unhex(decode(["address"], args)[0]))])
+        if sel == SEL_GET_BLOCK_NUMBER:
+            return encode(["uint256"], [self.block()])
+        if sel == SEL_DECIMALS:
+            return encode(["uint8"], [self.decimals])
+        if sel == SEL_SYMBOL:
+            return encode(["string"], [self.symbol])
+        if sel == SEL_NAME:
+            return encode(["string"], [self.name])
+        if sel == SEL_TOTAL_SUPPLY:
+            return encode(["uint256"], [10**9 * 10**self.decimals])
+        if sel == SEL_TRANSFER:
+            return encode(["bool"], [True])
+        if sel == SEL_AGGREGATE3:
+            out = []
+            for _target, allow_failure, cd in decode(["(address,bool,bytes)[]"], args)[0]:
+                try:
+                    out.append((True, self._call(cd)))
+                except Reverted:
+                    if not allow_failure:
+                        raise
+                    out.append((False, b""))
+            return encode(["(bool,bytes)[]"], [out])
+        raise Reverted(sel.hex())
+
+    def _send_raw(self, raw: bytes) -> str:
+        h = keccak(raw)
+        sender = None
+        try:
+            from eth_account import Account
+            sender = Account.recover_transaction(raw).lower()
+        except Exception:
+            pass
+        with self._lock:
+            if h in self._txs:
+                raise ValueError("already known")
+            self._txs[h] = self.block()
+            if sender:
+                self._nonces[sender] += 1
+        return _hex(h)
+
+    def _receipt(self, h: str) -> Optional[Dict[str, Any]]:
+        sent = self._txs.get(_unhex(h))
+        if sent is None or self.block() < sent + self.confirm_blocks:
+            return None
+        blk = sent + self.confirm_blocks
+        return {"transactionHash": h, "transactionIndex": "0x0", "blockHash": self.block_hash(blk),
+                "blockNumber": hex(blk), "from": "0x" + "00" * 20, "to": "0x" + "00" * 20,
+                "cumulativeGasUsed": "0xea60", "gasUsed": "0xea60", "effectiveGasPrice": hex(3 * 10**9),
+                "contractAddress": None, "logs": [], "logsBloom": "0x" + "00" * 256, "status": "0x1", "type": "0x0"}
+
+    def handle(self, req: Dict[str, Any]) -> Dict[str, Any]:
+        method, params = req.get("method"), req.get("params") or []
+        with self._lock:
+            self.calls[method] += 1
+        resp: Dict[str, Any] = {"jsonrpc": "2.0", "id": req.get("id")}
+        try:
+            if method == "eth_chainId":
+                resp["result"] = hex(self.chain_id)
+            elif method == "net_version":
+                resp["result"] = str(self.chain_id)
+            elif method == "web3_clientVersion":
+                resp["result"] = "slh-mock-node/1.0"
+            elif method == "eth_blockNumber":
+                resp["result"] = hex(self.block())
+            elif method == "eth_getBalance":
+                resp["result"] = hex(self.balance_wei(_unhex(params[0])))
+            elif method == "eth_call":
+                resp["result"] = _hex(self._call(_unhex(params[0].get("data") or params[0].get("input"))))
+            elif method == "eth_gasPrice":
+                resp["result"] = hex(3 * 10**9)
+            elif method == "eth_estimateGas":
+                resp["result"] = hex(60000)
+            elif method == "eth_getTransactionCount":
+                resp["result"] = hex(self._nonces.get(params[0].lower(), 0))
+            elif method == "eth_sendRawTransaction":
+                resp["result"] = self._send_raw(_unhex(params[0]))
+            elif method == "eth_getTransactionReceipt":
+                resp["result"] = self._receipt(params[0])
+            elif method == "eth_getLogs":
+                resp["result"] = self._get_logs(params[0])
+            elif method == "eth_getBlockByNumber":
+                resp["result"] = self._block(params[0])
+            else:
+                resp["error"] = {"code": -32601, "message": f"method {method} not supported by mock node"}
+        except Reverted:
+            resp["error"] = {"code": -32000, "message": "execution reverted"}
+        except Exception as e:
+            resp["error"] = {"code": -32000, "message": str(e)}
+        return resp
+
+    # ---- http ----
+    def _delay(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def start(self) -> "MockNode":
+        node = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", "0") or 0))
+                with node._lock:
+                    node.requests += 1
+                node._delay()
+                if node.error_rate and random.random() < node.error_rate:
+                    self.send_response(503)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                try:
+                    req = json.loads(body or b"{}")
+                    out = [node.handle(r) for r in req] if isinstance(req, list) else node.handle(req)
+                except ValueError:
+                    out = {"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": "parse error"}}
+                data = json.dumps(out).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="mock-node", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+def main():
+    ap = argparse.ArgumentParser(description="Mock BSC JSON-RPC node")
+    ap.add_argument("--port", type=int, default=int(os.getenv("MOCK_NODE_PORT", "8545")))
+    ap.add_argument("--latency-ms", type=float, default=50.0)
+    ap.add_argument("--jitter-ms", type=float, default=10.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--chain-id", type=int, default=56)
+    ap.add_argument("--block-time", type=float, default=3.0)
+    a = ap.parse_args()
+    node = MockNode(a.port, a.latency_ms, a.jitter_ms, a.error_rate, a.chain_id, a.block_time).start()
+    print(f"mock node on {node.url} (chain {node.chain_id}, ~{a.latency_ms}ms)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        node.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+import os, sys, json, time, random, asyncio, logging, argparse, tempfile, threading, subprocess
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from eth_utils import keccak
+
+from .stats import Recorder, format_table, format_compare, load, dump
+from .mock_node import MockNode
+from .fake_telegram import FakeTelegram
+
+# Benchmark harness. Each scenario starts its own mock node (and fake Telegram
+# API), points the service at them through the usual env vars and drives it
+# with a synthetic stream, then prints throughput and latency percentiles.
+#
+#   python -m benchmarks.run webhook --n 2000 --concurrency 32 --latency-ms 50
+#   python -m benchmarks.run api --hot-addresses 50
+#   python -m benchmarks.run store --backend json
+#   python -m benchmarks.run all --json before.json
+#   python -m benchmarks.run compare before.json after.json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN = "0xEf633c34715A5A581741379C9D690628A1C82B74"
+SECRET = "bench-secret-bench-secret-bench-secret"
+SCENARIOS = ("webhook", "api", "store")
+DEFAULT_MIX = {"webhook": "start:1,balance:2,wallet:1",
+               "api": "info:1,balance:4",
+               "store": "get_wallet:6,set_wallet:1,get_pk:2,set_pk:1"}
+
+def _parse_mix(spec: str) -> List[Tuple[str, float]]:
+    out = []
+    for part in spec.split(","):
+        name, _, w = part.partition(":")
+        out.append((name.strip(), float(w or 1)))
+    return out
+
+def _workload(args, kinds: List[str]) -> List[str]:
+    rnd = random.Random(args.seed)
+    mix = [(k, w) for k, w in _parse_mix(args.mix or DEFAULT_MIX[args.scenario])]
+    for k, _ in mix:
+        if k not in kinds:
+            raise SystemExit(f"unknown operation {k!r} for {args.scenario}; expected one of {kinds}")
+    names, weights = zip(*mix)
+    return rnd.choices(names, weights, k=args.n)
+
+def _address(i: int, hot: int) -> str:
+    if hot:
+        i %= hot
+    return "0x" + keccak(f"bench-{i}".encode())[:20].hex()
+
+def _env(node: MockNode, data_dir: str, **extra):
+    os.environ.update({"BSC_RPC_URL": node.url, "BSC_RPC_URLS": "", "CHAIN_ID": str(node.chain_id),
+                       "SELA_TOKEN_ADDRESS": TOKEN, "DATA_DIR": data_dir, "SECRET_KEY": SECRET,
+                       "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING")})
+    os.environ.update({k: str(v) for k, v in extra.items()})
+
+def _start_node(args) -> MockNode:
+    return MockNode(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                    chain_id=56).start()
+
+# ========== webhook: app/app_web.py ==========
+def _update(i: int, kind: str) -> Dict[str, Any]:
+    uid = 10_000 + i
+    user = {"id": uid, "is_bot": False, "first_name": f"bench{i}"}
+    chat = {"id": uid, "type": "private"}
+    if kind == "wallet":
+        return {"update_id": i, "callback_query": {
+            "id": str(i), "from": user, "chat_instance": str(uid), "data": "act:wallet",
+            "message": {"message_id": 1, "date": int(time.time()), "chat": chat, "text": "menu"}}}
+    cmd = "/start" if kind == "start" else "/balance"
+    return {"update_id": i, "message": {
+        "message_id": i, "date": int(time.time()), "chat": chat, "from": user, "text": cmd,
+        "entities": [{"type": "bot_command", "offset": 0, "length": len(cmd)}]}}
+
+def bench_webhook(args) -> Dict[str, Any]:
+    import requests
+    from werkzeug.serving import make_server
+
+    node = _start_node(args)
+    tg = FakeTelegram(latency_ms=args.tg_latency_ms).start()
+    data_dir = tempfile.mkdtemp(prefix="slh-bench-")
+    _env(node, data_dir, BOT_TOKEN="123456:bench", TELEGRAM_API_BASE=tg.url)
+    kinds = _workload(args, ["start", "balance", "wallet"])
+
+    from app.util_store import Store
+    seed = Store(data_dir, SECRET)
+    for i in range(-1, args.n):
+        seed.set_wallet(10_000 + i, _address(i, args.hot_addresses))
+
+    from app import app_web
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = make_server("127.0.0.1", 0, app_web.app, threaded=True)
+    threading.Thread(target=server.serve_forever, name="bench-web", daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/webhook"
+
+    local = threading.local()
+    def post(payload) -> int:
+        s = getattr(local, "s", None)
+        if s is None:
+            s = local.s = requests.Session()
+        return s.post(url, json=payload, timeout=30).status_code
+
+    # PTB loop (initialize + getMe), web3 and the store are started lazily or
+    # by the background preload; keep that out of the numbers
+    app_web.preload()
+    post(_update(-1, "start"))
+    tg.wait_replies([9_999], 30)
+    tg.reset()
+    rpc_before = node.requests
+
+    rec = Recorder()
+    sent_at: Dict[int, float] = {}
+    def one(i: int):
+        payload = _update(i, kinds[i])
+        sent_at[10_000 + i] = t0 = time.perf_counter()
+        try:
+            status = post(payload)
+        except Exception:
+            rec.error("webhook.ack")
+            return
+        if status != 200:
+            rec.error("webhook.ack")
+        else:
+            rec.add("webhook.ack", time.perf_counter() - t0)
+
+    rec.begin()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as ex:
+        list(ex.map(one, range(args.n)))
+    tg.wait_replies(sent_at, args.timeout)
+    rec.end()
+    for cid, t0 in sent_at.items():
+        name = f"e2e.{kinds[cid - 10_000]}"
+        t1 = tg.first_reply.get(cid)
+        if t1 is None:
+            rec.error(name)
+        else:
+            rec.add(name, t1 - t0)
+
+    server.shutdown()
+    node.stop()
+    tg.stop()
+    return {"results": rec.summary(), "wall_s": rec.wall(),
+            "extra": {"rpc_http_requests": node.requests - rpc_before, "rpc_calls": dict(node.calls),
+                      "telegram_calls": dict(tg.calls)}}
+
+# ========== api: api/main.py ==========
+def bench_api(args) -> Dict[str, Any]:
+    import httpx
+
+    node = None
+    if args.api_url:
+        base, transport = args.api_url.rstrip("/"), None
+    else:
+        node = _start_node(args)
+        _env(node, tempfile.mkdtemp(prefix="slh-bench-"))
+        sys.path.insert(0, os.path.join(ROOT, "api"))
+        import main as api_main
+        base, transport = "http://api", httpx.ASGITransport(app=api_main.app)
+    kinds = _workload(args, ["info", "balance"])
+    rec = Recorder()
+
+    async def run():
+        sem = asyncio.Semaphore(args.concurrency)
+        async with httpx.AsyncClient(base_url=base, transport=transport, timeout=30) as client:
+            await client.get("/token/info")  # warm token metadata
+            async def one(i: int):
+                kind = kinds[i]
+                path = "/token/info" if kind == "info" else f"/token/balance/{_address(i, args.hot_addresses)}"
+                async with sem:
+                    t0 = time.perf_counter()
+                    try:
+                        r = await client.get(path)
+                    except Exception:
+                        rec.error(f"api.{kind}")
+                        return
+                    if r.status_code != 200:
+                        rec.error(f"api.{kind}")
+                    else:
+                        rec.add(f"api.{kind}", time.perf_counter() - t0)
+            rec.begin()
+            await asyncio.gather(*(one(i) for i in range(args.n)))
+            rec.end()
+        if transport is not None and api_main._client is not None:
+            await api_main._client.aclose()
+
+    rpc_before = node.requests if node else 0
+    asyncio.run(run())
+    extra: Dict[str, Any] = {}
+    if node is not None:
+        extra = {"rpc_http_requests": node.requests - rpc_before, "rpc_calls": dict(node.calls)}
+        node.stop()
+    return {"results": rec.summary(), "wall_s": rec.wall(), "extra": extra}
+
+# ========== store: app/util_store.Store ==========
+def bench_store(args) -> Dict[str, Any]:
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    from app.util_store import Store
+
+    store = Store(tempfile.mkdtemp(prefix="slh-bench-"), SECRET, backend=args.backend)
+    users = max(1, args.users)
+    pk = "0x" + "11" * 32
+    for u in range(users):
+        store.set_wallet(u, _address(u, 0))
+        store.set_pk(u, pk)
+    kinds = _workload(args, ["get_wallet", "set_wallet", "get_pk", "set_pk"])
+    rnd = random.Random(args.seed)
+    uids = [rnd.randrange(users) for _ in range(args.n)]
+    rec = Recorder()
+
+    def one(i: int):
+        kind, uid = kinds[i], uids[i]
+        t0 = time.perf_counter()
+        try:
+            if kind == "get_wallet":
+                store.get_wallet(uid)
+            elif kind == "set_wallet":
+                store.set_wallet(uid, _address(uid + i, 0))
+            elif kind == "get_pk":
+                store.get_pk(uid)
+            else:
+                store.set_pk(uid, pk)
+        except Exception:
+            rec.error(f"store.{kind}")
+            return
+        rec.add(f"store.{kind}", time.perf_counter() - t0)
+
+    rec.begin()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as ex:
+        list(ex.map(one, range(args.n)))
+    rec.end()
+    return {"results": rec.summary(), "wall_s": rec.wall(), "extra": {"backend": args.backend or "default"}}
+
+BENCHES = {"webhook": bench_webhook, "api": bench_api, "store": bench_store}
+
+def _params(args) -> Dict[str, Any]:
+    return {k: v for k, v in vars(args).items() if k not in ("json", "scenario", "files")}
+
+def _run_all(args) -> Dict[str, Any]:
+    # one subprocess per scenario so module-level config is read fresh
+    passthrough, skip = [], False
+    for a in sys.argv[2:]:
+        if skip:
+            skip = False
+        elif a == "--json":
+            skip = True
+        elif not a.startswith("--json="):
+            passthrough.append(a)
+    out: Dict[str, Any] = {"params": _params(args), "scenarios": {}}
+    for scen in SCENARIOS:
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+            path = f.name
+        subprocess.run([sys.executable, "-m", "benchmarks.run", scen, *passthrough, "--json", path],
+                       cwd=ROOT, check=True)
+        out["scenarios"].update(load(path)["scenarios"])
+        os.unlink(path)
+    return out
+
+def main():
+    ap = argparse.ArgumentParser(description="SLH benchmark harness")
+    ap.add_argument("scenario", choices=SCENARIOS + ("all", "compare"))
+    ap.add_argument("files", nargs="*", help="compare: before.json after.json")
+    ap.add_argument("--n", type=int, default=2000, help="operations per run")
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--mix", default=None, help="weighted operations, e.g. start:1,balance:2,wallet:1")
+    ap.add_argument("--latency-ms", type=float, default=50.0, help="mock node latency per HTTP request")
+    ap.add_argument("--jitter-ms", type=float, default=10.0)
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fraction of node requests answered 503")
+    ap.add_argument("--tg-latency-ms", type=float, default=30.0, help="fake Telegram API latency")
+    ap.add_argument("--hot-addresses", type=int, default=0, help="reuse this many addresses (0 = all distinct)")
+    ap.add_argument("--users", type=int, default=1000, help="store: seeded users")
+    ap.add_argument("--backend", default=None, help="store: sqlite | json (default STORE_BACKEND)")
+    ap.add_argument("--api-url", default=None, help="api: benchmark a running instance instead")
+    ap.add_argument("--timeout", type=float, default=120.0, help="webhook: wait for replies")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--json", default=None, help="write results to this file")
+    args = ap.parse_args()
+
+    if args.scenario == "compare":
+        if len(args.files) != 2:
+            ap.error("compare needs before.json after.json")
+        print(format_compare(load(args.files[0]), load(args.files[1])))
+        return
+
+    if args.scenario == "all":
+        out = _run_all(args)
+    else:
+        res = BENCHES[args.scenario](args)
+        out = {"params": _params(args), "scenarios": {args.scenario: res}}
+        print(f"[{args.scenario}] {args.n} ops, concurrency {args.concurrency}, wall {res['wall_s']}s")
+        print(format_table(res["results"]))
+        if res.get("extra"):
+            print(json.dumps(res["extra"], sort_keys=True))
+    if args.json:
+        dump(args.json, out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import json, math, time, threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+def percentile(sorted_samples: List[float], q: float) -> float:
+    # nearest-rank on an already sorted list
+    if not sorted_samples:
+        return 0.0
+    i = min(len(sorted_samples) - 1, max(0, math.ceil(q * len(sorted_samples)) - 1))
+    return sorted_samples[i]
+
+class Recorder:
+    # latency samples (seconds) and error counts per operation name; wall time
+    # runs from begin() to end() and is shared by all operations of a run
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Counter = Counter()
+        self._lock = threading.Lock()
+        self.t0: Optional[float] = None
+        self.t1: Optional[float] = None
+
+    def begin(self):
+        self.t0 = time.perf_counter()
+
+    def end(self):
+        self.t1 = time.perf_counter()
+
+    def add(self, name: str, seconds: float):
+        with self._lock:
+            self.samples[name].append(seconds)
+
+    def error(self, name: str):
+        with self._lock:
+            self.errors[name] += 1
+
+    @contextmanager
+    def timer(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.error(name)
+            raise
+        self.add(name, time.perf_counter() - t0)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        wall = (self.t1 or time.perf_counter()) - (self.t0 or 0.0) if self.t0 else 0.0
+        out = {}
+        for name in sorted(set(self.samples) | set(self.errors)):
+            s = sorted(self.samples.get(name, []))
+            out[name] = {"n": len(s), "errors": self.errors.get(name, 0),
+                         "ops_s": round(len(s) / wall, 1) if wall else 0.0,
+                         "mean_ms": round(sum(s) / len(s) * 1000, 2) if s else 0.0,
+                         "p50_ms": round(percentile(s, 0.50) * 1000, 2),
+                         "p90_ms": round(percentile(s, 0.90) * 1000, 2),
+                         "p99_ms": round(percentile(s, 0.99) * 1000, 2),
+                         "max_ms": round(s[-1] * 1000, 2) if s else 0.0}
+        return out
+
+    def wall(self) -> float:
+        return round((self.t1 or time.perf_counter()) - self.t0, 3) if self.t0 else 0.0
+
+COLUMNS = ("n", "errors", "ops_s", "mean_ms", "p50_ms", "p90_ms", "p99_ms", "max_ms")
+
+def format_table(results: Dict[str, Dict[str, Any]]) -> str:
+    width = max([len("operation")] + [len(k) for k in results])
+    lines = ["operation".ljust(width) + "".join(c.rjust(10) for c in COLUMNS)]
+    for name, r in results.items():
+        lines.append(name.ljust(width) + "".join(str(r.get(c, "")).rjust(10) for c in COLUMNS))
+    return "\n".join(lines)
+
+def format_compare(before: Dict[str, Any], after: Dict[str, Any]) -> str:
+    # p50/p99/ops_s per operation present in both runs, with the relative change
+    lines = []
+    for scen, res_a in after.get("scenarios", {}).items():
+        res_b = before.get("scenarios", {}).get(scen)
+        if not res_b:
+            continue
+        lines.append(f"[{scen}]")
+        width = max([len("operation")] + [len(k) for k in res_a["results"]])
+        lines.append("operation".ljust(width) + "".join(c.rjust(28) for c in ("ops_s", "p50_ms", "p99_ms")))
+        for name, a in res_a["results"].items():
+            b = res_b["results"].get(name)
+            if not b:
+                continue
+            cells = []
+            for c in ("ops_s", "p50_ms", "p99_ms"):
+                delta = f"{(a[c] - b[c]) / b[c] * 100:+.0f}%" if b[c] else "n/a"
+                cells.append(f"{b[c]} -> {a[c]} ({delta})".rjust(28))
+            lines.append(name.ljust(width) + "".join(cells))
+    return "\n".join(lines) if lines else "no common scenarios"
+
+def load(path: str) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def dump(path: str, data: Dict[str, Any]):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
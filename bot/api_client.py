@@ -0,0 +1,214 @@
+import os, time, random, asyncio, logging
+from collections import OrderedDict
+from decimal import Decimal, InvalidOperation, ROUND_DOWN
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
+import httpx
+import metrics
+
+log = logging.getLogger("slh.bot.api")
+
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "10"))
+API_CONNECT_TIMEOUT = float(os.getenv("API_CONNECT_TIMEOUT", "3"))
+API_MAX_CONNECTIONS = int(os.getenv("API_MAX_CONNECTIONS", "20"))
+API_MAX_KEEPALIVE = int(os.getenv("API_MAX_KEEPALIVE", "10"))
+API_KEEPALIVE_EXPIRY = float(os.getenv("API_KEEPALIVE_EXPIRY", "60"))
+# retries after the first attempt, exponential backoff with full jitter
+API_RETRIES = int(os.getenv("API_RETRIES", "2"))
+API_BACKOFF = float(os.getenv("API_BACKOFF", "0.2"))
+API_BACKOFF_MAX = float(os.getenv("API_BACKOFF_MAX", "3"))
+# freshness when the API sends no Cache-Control; 0 disables the cache
+API_CACHE_TTL = float(os.getenv("API_CACHE_TTL", "5"))
+API_CACHE_SIZE = int(os.getenv("API_CACHE_SIZE", "2048"))
+BALANCE_DISPLAY_DECIMALS = int(os.getenv("BALANCE_DISPLAY_DECIMALS", "6"))
+
+RETRY_STATUS = {429, 502, 503, 504}
+
+API_SECONDS = metrics.histogram("slh_api_client_seconds", "bot -> slh_API request time, retries included", ["status"])
+API_RETRIES_TOTAL = metrics.counter("slh_api_client_retries_total", "bot -> slh_API retried requests")
+API_CACHE = metrics.counter("slh_api_client_cache_total", "bot -> slh_API response cache lookups", ["result"])
+
+def _max_age(headers: httpx.Headers, default: float) -> Optional[float]:
+    # seconds the response may be served without asking again; None: don't store
+    cc = headers.get("cache-control", "").lower()
+    if "no-store" in cc:
+        return None
+    if "no-cache" in cc:
+        return 0.0
+    for part in cc.split(","):
+        k, _, v = part.strip().partition("=")
+        if k == "max-age":
+            try:
+                return max(0.0, float(v))
+            except ValueError:
+                break
+    return default
+
+class ApiClient:
+    # One pooled keep-alive client for the slh_API service, opened in the
+    # Application post_init hook and closed in post_shutdown. GETs go through
+    # a small LRU cache keyed by path: fresh entries are served locally, stale
+    # ones with an ETag are revalidated with If-None-Match (304 = reuse body).
+    def __init__(self, base: str, ttl: float = API_CACHE_TTL, maxsize: int = API_CACHE_SIZE,
+                 retries: int = API_RETRIES, backoff: float = API_BACKOFF, backoff_max: float = API_BACKOFF_MAX):
+        self.base = base.rstrip("/")
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self._client: Optional[httpx.AsyncClient] = None
+        self._cache: "OrderedDict[str, Tuple[Any, str, float]]" = OrderedDict()
+
+    async def start(self):
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base,
+                headers={"Accept": "application/json"},
+                timeout=httpx.Timeout(API_TIMEOUT, connect=API_CONNECT_TIMEOUT),
+                limits=httpx.Limits(max_connections=API_MAX_CONNECTIONS,
+                                    max_keepalive_connections=API_MAX_KEEPALIVE,
+                                    keepalive_expiry=API_KEEPALIVE_EXPIRY),
+            )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        d = random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
+        try:
+            return min(self.backoff_max, max(d, float(retry_after))) if retry_after else d
+        except ValueError:
+            return d
+
+    async def _request(self, method: str, path: str, headers: Dict[str, str]) -> httpx.Response:
+        if self._client is None:
+            await self.start()
+        t0, status = time.perf_counter(), "error"
+        try:
+            for attempt in range(self.retries + 1):
+                try:
+                    r = await self._client.request(method, path, headers=headers)
+                except httpx.TransportError as e:  # connect/read timeouts, resets
+                    if attempt >= self.retries:
+                        raise
+                    delay = self._delay(attempt)
+                    log.info("API %s %s failed (%s), retry in %.2fs", method, path, e, delay)
+                else:
+                    if r.status_code not in RETRY_STATUS or attempt >= self.retries:
+                        status = str(r.status_code)
+                        return r
+                    delay = self._delay(attempt, r.headers.get("retry-after"))
+                    log.info("API %s %s -> %d, retry in %.2fs", method, path, r.status_code, delay)
+                API_RETRIES_TOTAL.inc()
+                await asyncio.sleep(delay)
+        finally:
+            API_SECONDS.observe(time.perf_counter() - t0, status=status)
+
+    async def get_json(self, path: str) -> Tuple[int, Any]:
+        now = time.monotonic()
+        ent = self._cache.get(path)
+        if ent is not None and ent[2] > now:
+            self._cache.move_to_end(path)
+            API_CACHE.inc(result="hit")
+            return 200, ent[0]
+        r = await self._request("GET", path, {"If-None-Match": ent[1]} if ent and ent[1] else {})
+        if r.status_code == 304 and ent is not None:
+            API_CACHE.inc(result="revalidated")
+            self._store(path, ent[0], r.headers.get("etag") or ent[1], _max_age(r.headers, self.ttl))
+            return 200, ent[0]
+        API_CACHE.inc(result="miss")
+        body = r.json()
+        if r.status_code == 200:
+            self._store(path, body, r.headers.get("etag", ""), _max_age(r.headers, self.ttl))
+        else:
+            self._cache.pop(path, None)
+        return r.status_code, body
+
+    def _store(self, path: str, body: Any, etag: str, max_age: Optional[float]):
+        # entries with max-age 0 are only worth keeping for revalidation
+        if max_age is None or self.maxsize <= 0 or (max_age <= 0 and not etag):
+            self._cache.pop(path, None)
+            return
+        self._cache[path] = (body, etag, time.monotonic() + max_age)
+        self._cache.move_to_end(path)
+        while len(self._cache) > self.maxsize:
+            self._cache.popitem(last=False)
+
+    async def token_balance(self, address: str) -> Tuple[int, Any]:
+        return await self.get_json(f"/token/balance/{quote(address, safe='')}")
+
+    async def token_history(self, address: str, limit: int = 10) -> Tuple[int, Any]:
+        return await self.get_json(f"/token/history/{quote(address, safe='')}?limit={int(limit)}")
+
+    async def portfolio(self, addresses: List[str]) -> Tuple[int, Any]:
+        return await self.get_json(f"/portfolio?addresses={quote(','.join(addresses), safe=',')}")
+
+def format_amount(raw: Any, decimals: Any, places: int = BALANCE_DISPLAY_DECIMALS) -> str:
+    # exact integer units -> "1,234.5" (no float rounding, trailing zeros dropped)
+    q = Decimal(int(raw)).scaleb(-int(decimals or 0)).quantize(Decimal(1).scaleb(-places), rounding=ROUND_DOWN)
+    s = f"{q:,f}"
+    return s.rstrip("0").rstrip(".") if "." in s else s
+
+def format_balance(status: int, body: Any) -> str:
+    if status != 200 or not isinstance(body, dict):
+        detail = body.get("detail") if isinstance(body, dict) else body
+        return f"API error ({status}): {detail}"
+    addr = body.get("address", "")
+    if body.get("balance") is None:
+        return f"{addr}\ncould not read balance (raw: {body.get('balance_raw')})"
+    try:
+        amount = format_amount(body["balance"], body.get("decimals"))
+    except (InvalidOperation, ValueError, TypeError):
+        amount = str(body.get("value"))
+    return f"💰 {addr}\n{amount} {body.get('symbol') or ''}".rstrip()
+
+def _asset_line(x: Dict[str, Any]) -> str:
+    if "error" in x:
+        return f"{x.get('symbol') or x.get('token')}: unavailable"
+    try:
+        amount = format_amount(x["raw"], x.get("decimals"))
+    except (KeyError, InvalidOperation, ValueError, TypeError):
+        amount = str(x.get("value"))
+    return f"{x.get('symbol')} {amount}" + (f" ≈ ₪{x['value_ils']:,.2f}" if x.get("value_ils") else "")
+
+def format_portfolio(status: int, body: Any) -> str:
+    if status != 200 or not isinstance(body, dict):
+        detail = body.get("detail") if isinstance(body, dict) else body
+        return f"API error ({status}): {detail}"
+    wallets = body.get("addresses") or []
+    lines = [f"💼 portfolio · {len(wallets)} address{'es' if len(wallets) != 1 else ''}"]
+    if len(wallets) > 1:
+        for w in wallets:
+            a = w.get("address", "")
+            lines.append(f"\n{a[:6]}…{a[-4:]}")
+            lines += [f"  {_asset_line(x)}" for x in w.get("assets") or []]
+        lines.append("\ntotal")
+    lines += [f"  {_asset_line(x)}" for x in body.get("totals") or []]
+    if body.get("value_ils"):
+        lines.append(f"\n💰 ≈ ₪{body['value_ils']:,.2f}")
+    if body.get("complete") is False:
+        lines.append("⚠️ some balances could not be read")
+    return "\n".join(lines)
+
+def format_history(status: int, body: Any) -> str:
+    if status != 200 or not isinstance(body, dict):
+        detail = body.get("detail") if isinstance(body, dict) else body
+        return f"API error ({status}): {detail}"
+    rows = body.get("transfers") or []
+    if not rows:
+        return f"no {body.get('symbol') or 'token'} transfers indexed for {body.get('address', '')}"
+    symbol, decimals = body.get("symbol") or "", body.get("decimals")
+    lines = [f"📜 last {len(rows)} transfers"]
+    for r in rows:
+        try:
+            amount = format_amount(r["raw"], decimals)
+        except (KeyError, InvalidOperation, ValueError, TypeError):
+            amount = str(r.get("value"))
+        if r.get("direction") == "in":
+            lines.append(f"⬇️ +{amount} {symbol} from {r['from'][:6]}…{r['from'][-4:]} · block {r['block']}")
+        else:
+            lines.append(f"⬆️ -{amount} {symbol} to {r['to'][:6]}…{r['to'][-4:]} · block {r['block']}")
+    return "\n".join(lines)
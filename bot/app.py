@@ -3,6 +3,9 @@ from http.server import BaseHTTPRequestHandler, HTTPServer
 from dotenv import load_dotenv
 from telegram import Update
 from telegram.ext import Application, CommandHandler, ContextTypes
+import metrics
+from api_client import ApiClient, format_balance, format_history
+from address import is_address
 
 load_dotenv()
 LOG_LEVEL = getattr(logging, os.getenv("LOG_LEVEL","INFO").upper(), logging.INFO)
@@ -11,6 +14,11 @@ log = logging.getLogger("slh.bot")
 
 BOT_TOKEN   = os.getenv("TELEGRAM_BOT_TOKEN","")
 API_BASE    = os.getenv("API_BASE","")
+if not API_BASE:
+    # נסה לנחש דומיין API מקביל (bot → api)
+    _host = os.environ.get("RAILWAY_STATIC_URL") or os.environ.get("RAILWAY_PUBLIC_DOMAIN","")
+    if _host:
+        API_BASE = "https://" + _host.replace("-bot","-api").rstrip("/")
 DATA_DIR    = os.getenv("DATA_DIR","/app/data")
 os.makedirs(DATA_DIR, exist_ok=True)
 PORT        = int(os.getenv("PORT","8080"))
@@ -20,44 +28,64 @@ class Handler(BaseHTTPRequestHandler):
     def do_GET(self):
         if self.path in ("/", "/healthz"):
             self.send_response(200); self.end_headers(); self.wfile.write(b"OK"); return
+        if self.path == "/metrics":
+            self.send_response(200); self.send_header("Content-Type", metrics.CONTENT_TYPE); self.end_headers()
+            self.wfile.write(metrics.render().encode()); return
         self.send_response(404); self.end_headers()
 def _serve():
     HTTPServer(("0.0.0.0", PORT), Handler).serve_forever()
 threading.Thread(target=_serve, daemon=True).start()
 
+api = ApiClient(API_BASE)
+
+async def _post_init(app: Application):
+    await api.start()
+
+async def _post_shutdown(app: Application):
+    await api.close()
+
 async def main():
     if not BOT_TOKEN:
         log.error("TELEGRAM_BOT_TOKEN missing"); return
-    app = Application.builder().token(BOT_TOKEN).build()
+    app = Application.builder().token(BOT_TOKEN).post_init(_post_init).post_shutdown(_post_shutdown).build()
 
+    @metrics.timed_handler("start")
     async def start(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
-        await update.effective_message.reply_text("SLH Bot online (TESTNET). Use /balance <address>")
+        await update.effective_message.reply_text("SLH Bot online (TESTNET). Use /balance <address> or /history <address>")
 
+    @metrics.timed_handler("balance")
     async def balance(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         if not ctx.args:
             await update.effective_message.reply_text("usage: /balance 0xYourAddress"); return
-        addr = ctx.args[0]
-        api = API_BASE
-        if not api:
-            # נסה לנחש דומיין API מקביל (bot → api)
-            host = os.environ.get("RAILWAY_STATIC_URL") or os.environ.get("RAILWAY_PUBLIC_DOMAIN","")
-            if host:
-                api = "https://" + host.replace("-bot","-api").rstrip("/")
-        if not api:
+        if not api.base:
+            await update.effective_message.reply_text("API_BASE not configured"); return
+        if not is_address(ctx.args[0]):
+            await update.effective_message.reply_text("invalid address: expected 0x + 40 hex chars"); return
+        try:
+            status, body = await api.token_balance(ctx.args[0])
+            await update.effective_message.reply_text(format_balance(status, body))
+        except (httpx.HTTPError, ValueError) as e:
+            await update.effective_message.reply_text(f"API error: {e}")
+
+    @metrics.timed_handler("history")
+    async def history(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
+        if not ctx.args or not is_address(ctx.args[0]):
+            await update.effective_message.reply_text("usage: /history 0xYourAddress"); return
+        if not api.base:
             await update.effective_message.reply_text("API_BASE not configured"); return
-        url = f"{api}/token/balance/{addr}"
         try:
-            async with httpx.AsyncClient(timeout=20) as client:
-                r = await client.get(url)
-                await update.effective_message.reply_text(str(r.json()))
-        except Exception as e:
+            status, body = await api.token_history(ctx.args[0])
+            await update.effective_message.reply_text(format_history(status, body))
+        except (httpx.HTTPError, ValueError) as e:
             await update.effective_message.reply_text(f"API error: {e}")
 
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("balance", balance))
+    app.add_handler(CommandHandler("history", history))
 
     # ---- POLLING mode (אמין בריילווי, לא דורש webhook) ----
     await app.initialize()
+    await app.post_init(app)  # only run_polling/run_webhook call the hooks themselves
     await app.start()
     log.info("Bot started (polling).")
     await app.updater.start_polling(allowed_updates=Update.ALL_TYPES)
@@ -68,6 +96,7 @@ async def main():
         await app.updater.stop()
         await app.stop()
         await app.shutdown()
+        await app.post_shutdown(app)
 
 if __name__ == "__main__":
     asyncio.run(main())
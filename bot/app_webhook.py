@@ -1,9 +1,11 @@
-﻿import os, logging, asyncio, httpx
+﻿import os, hmac, signal, hashlib, logging, asyncio, time, httpx
+from aiohttp import web
 from dotenv import load_dotenv
-from http.server import BaseHTTPRequestHandler, HTTPServer
-from threading import Thread
 from telegram import Update
-from telegram.ext import Application, CommandHandler, ContextTypes
+from telegram.ext import Application, CommandHandler, ContextTypes, SimpleUpdateProcessor
+import metrics
+from api_client import ApiClient, format_balance, format_history, format_portfolio
+from address import is_address
 
 load_dotenv()
 logging.basicConfig(level=getattr(logging, os.getenv("LOG_LEVEL","INFO").upper(), logging.INFO))
@@ -11,65 +13,203 @@ log = logging.getLogger("slh.bot")
 
 BOT_TOKEN   = os.getenv("TELEGRAM_BOT_TOKEN","")
 WEBHOOK_BASE= os.getenv("WEBHOOK_BASE","")
-API_BASE    = os.getenv("API_BASE","") or os.getenv("SLH_API_BASE","")
+WEBHOOK_PATH= "/" + os.getenv("WEBHOOK_PATH","webhook").strip("/")
+API_BASE    = (os.getenv("API_BASE","") or os.getenv("SLH_API_BASE","")
+               or (WEBHOOK_BASE.replace("-production","-api").rstrip("/") if WEBHOOK_BASE else ""))
 DATA_DIR    = os.getenv("DATA_DIR","/app/data")
 os.makedirs(DATA_DIR, exist_ok=True)
 
 PORT = int(os.getenv("PORT","8080"))
+# Telegram echoes this in X-Telegram-Bot-Api-Secret-Token; every replica must
+# derive the same value, so the default comes from the bot token
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET","") or hashlib.sha256(f"slh-webhook:{BOT_TOKEN}".encode()).hexdigest()
+WEBHOOK_MAX_CONNECTIONS = int(os.getenv("WEBHOOK_MAX_CONNECTIONS","40"))
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES","64"))
+# backpressure: with this many updates accepted but not yet handled, /webhook
+# answers 503 and Telegram redelivers later
+MAX_PENDING_UPDATES = int(os.getenv("MAX_PENDING_UPDATES","1000"))
+WEBHOOK_ENQUEUE_TIMEOUT = float(os.getenv("WEBHOOK_ENQUEUE_TIMEOUT","2"))
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT","25"))
+# alternative Bot API server (local telegram-bot-api, benchmarks' fake server)
+TELEGRAM_API_BASE = (os.getenv("TELEGRAM_API_BASE") or "").rstrip("/")
 
-# --- tiny web server for healthz & webhook ---
-class Handler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        if self.path == "/" or self.path == "/healthz":
-            self.send_response(200); self.end_headers(); self.wfile.write(b"OK"); return
-        if self.path.startswith("/webhook"):
-            self.send_response(405); self.end_headers(); self.wfile.write(b"Method Not Allowed"); return
-        self.send_response(404); self.end_headers()
-    def do_POST(self):
-        if self.path != "/webhook":
-            self.send_response(404); self.end_headers(); return
-        length = int(self.headers.get("Content-Length","0"))
-        body = self.rfile.read(length) if length>0 else b"{}"
-        # let PTB handle via built-in webhook server is possible; here we just ACK quickly
-        self.send_response(200); self.end_headers(); self.wfile.write(b"OK")
-
-def run_http():
-    httpd = HTTPServer(("0.0.0.0", PORT), Handler)
-    httpd.serve_forever()
+WEBHOOK_SECONDS = metrics.histogram("slh_webhook_seconds", "Webhook request handling time (parse + enqueue)", ["status"])
 
-async def start_bot():
-    if not BOT_TOKEN:
-        log.error("TELEGRAM_BOT_TOKEN missing"); return
-    app = Application.builder().token(BOT_TOKEN).build()
+class BoundedUpdateProcessor(SimpleUpdateProcessor):
+    # PTB's fetcher turns queued updates into tasks right away, so the queue
+    # itself never fills up. Capacity is taken when /webhook accepts an update
+    # and given back once its handlers are done.
+    def __init__(self, max_concurrent_updates: int, max_pending: int):
+        super().__init__(max_concurrent_updates)
+        self.max_pending = max_pending
+        self.capacity = asyncio.Semaphore(max_pending)
+
+    def pending(self) -> int:
+        return self.max_pending - self.capacity._value
+
+    async def do_process_update(self, update, coroutine):
+        try:
+            await coroutine
+        finally:
+            self.capacity.release()
+
+api = ApiClient(API_BASE)
+
+async def _post_init(app: Application):
+    await api.start()
+
+async def _post_shutdown(app: Application):
+    await api.close()
 
+def build_application() -> Application:
+    builder = (Application.builder().token(BOT_TOKEN)
+               .concurrent_updates(BoundedUpdateProcessor(max(1, CONCURRENT_UPDATES), MAX_PENDING_UPDATES))
+               .post_init(_post_init).post_shutdown(_post_shutdown))
+    if TELEGRAM_API_BASE:
+        builder = builder.base_url(f"{TELEGRAM_API_BASE}/bot").base_file_url(f"{TELEGRAM_API_BASE}/file/bot")
+    app = builder.build()
+
+    @metrics.timed_handler("start")
     async def start(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
-        await update.effective_message.reply_text("SLH Bot online (TESTNET). Use /balance <address>")
+        await update.effective_message.reply_text("SLH Bot online (TESTNET). Use /balance <address>, /history <address> or /portfolio <address> …")
+    @metrics.timed_handler("balance")
     async def balance(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
         if not ctx.args:
             await update.effective_message.reply_text("usage: /balance 0xYourAddress")
             return
-        addr = ctx.args[0]
-        api = API_BASE or (WEBHOOK_BASE.replace("-production","-api").rstrip("/") if WEBHOOK_BASE else "")
-        if not api: 
+        if not api.base:
             await update.effective_message.reply_text("API_BASE not configured")
             return
-        url = f"{api}/token/balance/{addr}"
+        if not is_address(ctx.args[0]):
+            await update.effective_message.reply_text("invalid address: expected 0x + 40 hex chars")
+            return
         try:
-            async with httpx.AsyncClient(timeout=20) as client:
-                r = await client.get(url)
-                await update.effective_message.reply_text(str(r.json()))
-        except Exception as e:
+            status, body = await api.token_balance(ctx.args[0])
+            await update.effective_message.reply_text(format_balance(status, body))
+        except (httpx.HTTPError, ValueError) as e:
+            await update.effective_message.reply_text(f"API error: {e}")
+
+    @metrics.timed_handler("history")
+    async def history(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
+        if not ctx.args or not is_address(ctx.args[0]):
+            await update.effective_message.reply_text("usage: /history 0xYourAddress")
+            return
+        if not api.base:
+            await update.effective_message.reply_text("API_BASE not configured")
+            return
+        try:
+            status, body = await api.token_history(ctx.args[0])
+            await update.effective_message.reply_text(format_history(status, body))
+        except (httpx.HTTPError, ValueError) as e:
+            await update.effective_message.reply_text(f"API error: {e}")
+
+    @metrics.timed_handler("portfolio")
+    async def portfolio(update: Update, ctx: ContextTypes.DEFAULT_TYPE):
+        # /portfolio 0xA 0xB …: BNB and the configured tokens across addresses, one API call
+        if not ctx.args or not all(is_address(a) for a in ctx.args):
+            await update.effective_message.reply_text("usage: /portfolio 0xAddress [0xAddress …]")
+            return
+        if not api.base:
+            await update.effective_message.reply_text("API_BASE not configured")
+            return
+        try:
+            status, body = await api.portfolio(ctx.args)
+            await update.effective_message.reply_text(format_portfolio(status, body))
+        except (httpx.HTTPError, ValueError) as e:
             await update.effective_message.reply_text(f"API error: {e}")
 
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("balance", balance))
+    app.add_handler(CommandHandler("history", history))
+    app.add_handler(CommandHandler("portfolio", portfolio))
+    return app
+
+# --- aiohttp server: webhook + healthz + metrics on one port, same loop as PTB ---
+def build_web(app: Application) -> web.Application:
+    processor: BoundedUpdateProcessor = app.update_processor
+
+    async def webhook(request: web.Request) -> web.Response:
+        t0, status = time.perf_counter(), "error"
+        try:
+            token = request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+            if not hmac.compare_digest(token, WEBHOOK_SECRET):
+                status = "forbidden"
+                return web.Response(status=403)
+            try:
+                upd = Update.de_json(await request.json(), app.bot)
+            except ValueError:
+                status = "bad_request"
+                return web.Response(status=400)
+            if upd is None:
+                status = "empty"
+                return web.Response(text="OK")
+            try:
+                await asyncio.wait_for(processor.capacity.acquire(), WEBHOOK_ENQUEUE_TIMEOUT)
+            except asyncio.TimeoutError:
+                status = "busy"
+                log.warning("%d updates pending, asking Telegram to retry", processor.pending())
+                return web.Response(status=503, headers={"Retry-After": "1"})
+            await app.update_queue.put(upd)
+            status = "ok"
+            return web.Response(text="OK")
+        finally:
+            WEBHOOK_SECONDS.observe(time.perf_counter() - t0, status=status)
+
+    async def healthz(request: web.Request) -> web.Response:
+        if not app.running:
+            return web.json_response({"status": "stopping"}, status=503)
+        return web.json_response({"status": "ok", "pending_updates": processor.pending()})
+
+    async def metrics_endpoint(request: web.Request) -> web.Response:
+        return web.Response(body=metrics.render().encode(), headers={"Content-Type": metrics.CONTENT_TYPE})
+
+    metrics.gauge("slh_pending_updates", "Updates accepted by /webhook and not yet handled", lambda: {(): processor.pending()})
+    web_app = web.Application()
+    web_app.router.add_post(WEBHOOK_PATH, webhook)
+    web_app.router.add_get("/", healthz)
+    web_app.router.add_get("/healthz", healthz)
+    web_app.router.add_get("/metrics", metrics_endpoint)
+    return web_app
+
+async def start_bot():
+    if not BOT_TOKEN:
+        log.error("TELEGRAM_BOT_TOKEN missing"); return
+    app = build_application()
+    runner = web.AppRunner(build_web(app), shutdown_timeout=SHUTDOWN_TIMEOUT)
+    await runner.setup()
     await app.initialize()
-    log.info("Bot initialized")
-    await asyncio.sleep(999999)
+    await app.post_init(app)  # only run_polling/run_webhook call the hooks themselves
+    await app.start()
+    site = web.TCPSite(runner, "0.0.0.0", PORT)
+    await site.start()
+    log.info("Webhook server on :%d%s", PORT, WEBHOOK_PATH)
+    if WEBHOOK_BASE:
+        url = WEBHOOK_BASE.rstrip("/") + WEBHOOK_PATH
+        await app.bot.set_webhook(url=url, secret_token=WEBHOOK_SECRET, allowed_updates=Update.ALL_TYPES,
+                                  max_connections=WEBHOOK_MAX_CONNECTIONS)
+        log.info("Webhook set to %s", url)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except NotImplementedError:  # Windows
+            pass
+    try:
+        await stop.wait()
+    finally:
+        # stop accepting, let in-flight requests finish, drain the queue, close.
+        # The webhook stays registered: other replicas keep serving it.
+        log.info("Shutting down")
+        await runner.cleanup()
+        if app.running:
+            await app.stop()
+        await app.shutdown()
+        await app.post_shutdown(app)
 
 def main():
-    Thread(target=run_http, daemon=True).start()
     asyncio.run(start_bot())
 
 if __name__ == "__main__":
-    main()
+    main()
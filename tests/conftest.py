@@ -0,0 +1,9 @@
+import pytest
+
+from app import kv
+
+@pytest.fixture
+def memkv(monkeypatch):
+    # a fresh in-memory store behind kv.get_kv(), shared by everything in the test
+    monkeypatch.setattr(kv, "_kv", kv.MemoryKV())
+    return kv.get_kv()
@@ -0,0 +1,49 @@
+import json
+import os
+
+import pytest
+from eth_utils import keccak
+from web3 import Web3
+
+from app import address
+from app.address import BALANCE_OF, GET_ETH_BALANCE, TRANSFER, checksum, is_address, transfer_data
+
+CHECKSUMMED = "0x5aAeb6053F3E94C9b9A09f33669435E7Ef1BeAed"  # EIP-55 test vector
+
+def test_is_address_accepts_uniform_case_and_valid_checksums():
+    assert is_address(CHECKSUMMED)
+    assert is_address(CHECKSUMMED.lower())
+    assert is_address("0x" + CHECKSUMMED[2:].upper())
+    assert is_address("0x" + "0" * 40)
+
+def test_is_address_rejects_bad_checksums_and_prefixes():
+    flipped = CHECKSUMMED[:3] + CHECKSUMMED[3].swapcase() + CHECKSUMMED[4:]
+    assert flipped != CHECKSUMMED and not is_address(flipped)
+    assert not is_address("0X" + CHECKSUMMED[2:].lower())
+    assert not is_address(CHECKSUMMED[2:])
+    assert not is_address(CHECKSUMMED + "0")
+    assert not is_address(None)
+
+def test_checksum_matches_web3():
+    for a in (CHECKSUMMED.lower(), "0x" + "ab" * 20, "0x" + "0" * 40):
+        assert checksum(a) == Web3.to_checksum_address(a)
+    with pytest.raises(ValueError):
+        checksum("0X" + "ab" * 20)
+
+def test_selectors():
+    for sel, sig in ((BALANCE_OF, "balanceOf(address)"), (TRANSFER, "transfer(address,uint256)"),
+                     (GET_ETH_BALANCE, "getEthBalance(address)")):
+        assert keccak(text=sig)[:4].hex() == sel
+
+def test_transfer_data_matches_web3_encode_abi():
+    with open(os.path.join(os.path.dirname(address.__file__), "abi", "erc20.json"), encoding="utf-8") as f:
+        token = Web3().eth.contract(address=CHECKSUMMED, abi=json.load(f))
+    for to, amount in ((CHECKSUMMED, 10**18), ("0x" + "ff" * 20, 0), (CHECKSUMMED.lower(), 2**256 - 1)):
+        assert transfer_data(to, amount) == token.encode_abi(fn_name="transfer", args=[checksum(to), amount])
+
+def test_transfer_data_rejects_out_of_range_amounts():
+    for amount in (-1, 2**256):
+        with pytest.raises(ValueError):
+            transfer_data(CHECKSUMMED, amount)
+    with pytest.raises(ValueError):
+        transfer_data("0xnope", 1)
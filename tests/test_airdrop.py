@@ -0,0 +1,183 @@
+import asyncio
+
+import pytest
+
+from app import airdrop
+from app.airdrop import AirdropBusy, AirdropError, AirdropJob
+
+SENDER = "0x" + "11" * 20
+PK = "0x" + "ab" * 32
+
+class Chain:
+    # just enough of a node for AirdropJob: one sender, txs mined on broadcast
+    def __init__(self):
+        self.next_nonce = 0
+        self.mined = {}    # nonce -> tx hash
+        self.pool = {}     # tx hash -> nonce
+        self.paid = []     # recipients of mined txs
+        self.txs = {}      # tx hash -> (to, nonce)
+        self.fail = {}     # nonce -> exception raised by the next broadcast
+        self.drop = set()  # nonces whose broadcast raises but still lands
+        self.signed = 0
+
+    def presign(self, pk, items, nonces=None, floor=None):
+        out = []
+        if floor is not None and nonces is None:
+            self.next_nonce = max(self.next_nonce, floor)
+        for i, (to, amount) in enumerate(items):
+            if nonces is not None:
+                n = nonces[i]
+            else:
+                n, self.next_nonce = self.next_nonce, self.next_nonce + 1
+            self.signed += 1
+            h = f"0x{self.signed:064x}"
+            self.txs[h] = (to, n)
+            out.append({"to": to, "amount": amount, "nonce": n, "raw": h, "tx_hash": h})
+        return out
+
+    def mine(self, h):
+        to, n = self.txs[h]
+        self.mined[n] = h
+        self.paid.append(to)
+
+    def broadcast(self, raw):
+        to, n = self.txs[raw]
+        if n in self.fail:
+            raise self.fail.pop(n)
+        if n in self.mined:
+            raise ValueError({"code": -32000, "message": "nonce too low"})
+        self.mine(raw)
+        if n in self.drop:
+            self.drop.discard(n)
+            raise TimeoutError("read timed out")
+        return raw
+
+    def count(self):
+        return max(self.mined, default=-1) + 1
+
+    def call(self, method, params):
+        if method == "eth_getTransactionCount":
+            return {"result": hex(self.count())}
+        h = params[0]
+        n = self.txs.get(h, (None, None))[1]
+        if method == "eth_getTransactionReceipt":
+            if self.mined.get(n) != h:
+                return {"result": None}
+            return {"result": {"status": "0x1", "blockNumber": "0x10", "transactionHash": h}}
+        if method == "eth_getTransactionByHash":
+            return {"result": {"hash": h} if self.mined.get(n) == h or h in self.pool else None}
+        raise AssertionError(method)
+
+@pytest.fixture
+def chain(monkeypatch):
+    c = Chain()
+    w3w = airdrop.w3w
+
+    async def arpc_batch(calls):
+        return [c.call(m, p) for m, p in calls]
+
+    async def apresign(pk, items, nonces=None, floor=None):
+        return c.presign(pk, items, nonces, floor)
+
+    async def abroadcast(raw):
+        return c.broadcast(raw)
+
+    monkeypatch.setattr(w3w, "arpc_batch", arpc_batch)
+    monkeypatch.setattr(w3w, "apresign_token_transfers", apresign)
+    monkeypatch.setattr(w3w, "abroadcast_raw", abroadcast)
+    monkeypatch.setattr(w3w, "resync_nonce", lambda address: None)
+    monkeypatch.setattr(w3w, "invalidate_balance", lambda address: None)
+    monkeypatch.setattr(airdrop, "AIRDROP_CONCURRENCY", 1)
+    monkeypatch.setattr(airdrop, "AIRDROP_RECEIPT_TIMEOUT", 0.5)
+    monkeypatch.setattr(airdrop, "AIRDROP_RECEIPT_POLL", 0.01)
+    return c
+
+def _job(tmp_path, n=4):
+    rows = [(f"0x{i:040x}", 1.0) for i in range(1, n + 1)]
+    return AirdropJob.create(str(tmp_path), rows, SENDER, job_id="t")
+
+def test_runs_to_confirmed(tmp_path, chain):
+    assert asyncio.run(_job(tmp_path).run(PK)) == {"total": 4, "confirmed": 4}
+    assert len(chain.paid) == 4
+
+def test_lost_ack_is_not_paid_twice(tmp_path, chain):
+    # the node took nonce 1 but the answer timed out: the row keeps its tx
+    chain.drop.add(1)
+    job = _job(tmp_path)
+    assert asyncio.run(job.run(PK)) == {"total": 4, "confirmed": 1, "signed": 3}
+    resumed = AirdropJob.load(str(tmp_path), "t")
+    assert resumed.state["rows"][1]["status"] == "signed"
+    assert asyncio.run(resumed.run(PK)) == {"total": 4, "confirmed": 4}
+    assert sorted(chain.paid) == sorted(r["to"] for r in resumed.state["rows"])
+    assert chain.signed == 4
+
+def test_refused_tx_is_replaced_at_its_nonce(tmp_path, chain):
+    chain.fail[2] = ValueError({"code": -32000, "message": "transaction underpriced"})
+    job = _job(tmp_path)
+    asyncio.run(job.run(PK))
+    row = job.state["rows"][2]
+    assert (row["status"], row["resign"]) == ("signed", True)
+    resumed = AirdropJob.load(str(tmp_path), "t")
+    assert asyncio.run(resumed.run(PK)) == {"total": 4, "confirmed": 4}
+    row = resumed.state["rows"][2]
+    assert row["nonce"] == 2 and len(row["replaced"]) == 1
+    assert len(chain.paid) == 4
+
+def test_nonce_taken_elsewhere_gets_a_fresh_one(tmp_path, chain):
+    job = _job(tmp_path)
+    asyncio.run(job._sign(PK))
+    # another tx from the same account used nonce 0 meanwhile
+    chain.txs["0xother"] = ("0xelsewhere", 0)
+    chain.mined[0] = "0xother"
+    resumed = AirdropJob.load(str(tmp_path), "t")
+    assert asyncio.run(resumed.run(PK)) == {"total": 4, "confirmed": 4}
+    assert resumed.state["rows"][0]["nonce"] == 4
+    assert len(chain.paid) == 4
+
+def test_checkpoint_after_every_broadcast(tmp_path, chain, monkeypatch):
+    job = _job(tmp_path)
+    asyncio.run(job._sign(PK))
+    saves = []
+    monkeypatch.setattr(job, "save", lambda: saves.append(job.summary().get("sent", 0)))
+    asyncio.run(job._submit())
+    assert saves[:4] == [1, 2, 3, 4]
+
+def test_second_run_of_a_job_is_refused(tmp_path, chain, monkeypatch):
+    job = _job(tmp_path)
+
+    async def main():
+        gate = asyncio.Event()
+        real = airdrop.w3w.abroadcast_raw
+
+        async def slow(raw):
+            await gate.wait()
+            return await real(raw)
+
+        monkeypatch.setattr(airdrop.w3w, "abroadcast_raw", slow)
+        first = asyncio.create_task(job.run(PK))
+        await asyncio.sleep(0.05)
+        again = AirdropJob.load(str(tmp_path), "t")
+        assert again.is_running()
+        with pytest.raises(AirdropBusy):
+            await again.run(PK)
+        gate.set()
+        return await first
+
+    assert asyncio.run(main()) == {"total": 4, "confirmed": 4}
+    assert chain.signed == 4 and len(chain.paid) == 4
+    assert not AirdropJob.load(str(tmp_path), "t").is_running()
+
+def test_job_ids_do_not_collide(tmp_path):
+    ids = {AirdropJob.create(str(tmp_path), [("0x" + "22" * 20, 1.0)], SENDER).job_id for _ in range(5)}
+    assert len(ids) == 5
+
+def test_rpc_error_on_resume_is_reported(tmp_path, chain, monkeypatch):
+    job = _job(tmp_path)
+    asyncio.run(job._sign(PK))
+
+    async def failing(calls):
+        return [{"jsonrpc": "2.0", "id": 0, "error": {"code": -32005, "message": "limit exceeded"}}]
+
+    monkeypatch.setattr(airdrop.w3w, "arpc_batch", failing)
+    with pytest.raises(AirdropError, match="limit exceeded"):
+        asyncio.run(AirdropJob.load(str(tmp_path), "t").run(PK))
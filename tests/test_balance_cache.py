@@ -0,0 +1,52 @@
+import time
+
+import pytest
+
+from app import balance_cache as app_copy
+from api import balance_cache as api_copy
+
+# api/balance_cache.py is a copy of app/balance_cache.py; both are tested
+@pytest.fixture(params=[app_copy, api_copy], ids=["app", "api"])
+def BalanceCache(request):
+    return request.param.BalanceCache
+
+def test_entries_expire_after_the_ttl(BalanceCache):
+    c = BalanceCache(ttl=0.05)
+    c.put("a", 1)
+    assert c.get("a") == 1
+    time.sleep(0.06)
+    assert c.get("a") is None and len(c) == 0
+    assert (c.hits, c.misses) == (1, 1)
+
+def test_lru_evicts_the_least_recently_read(BalanceCache):
+    c = BalanceCache(maxsize=2)
+    c.put("a", 1)
+    c.put("b", 2)
+    c.get("a")
+    c.put("c", 3)
+    assert c.get("b") is None and c.get("a") == 1 and c.get("c") == 3
+    assert c.evictions == 1
+
+def test_newer_block_invalidates_older_reads(BalanceCache):
+    c = BalanceCache()
+    c.note_block(100)
+    c.put("a", 1)               # read at the current block
+    c.put("b", 2, block=99)     # read at an older block
+    c.put("x", 0, block=-1)     # block unknown: TTL only
+    assert c.get("b") is None
+    assert c.get("a") == 1
+    c.note_block(101)
+    assert c.get("a") is None and c.get("x") == 0
+    c.note_block(50)            # never goes back
+    assert c.block == 101
+
+def test_block_unaware_cache_keeps_entries_across_blocks(BalanceCache):
+    c = BalanceCache(block_aware=False)
+    c.put("a", 1, block=1)
+    c.note_block(2)
+    assert c.get("a") == 1
+
+def test_disabled_cache_stores_nothing(BalanceCache):
+    for c in (BalanceCache(maxsize=0), BalanceCache(ttl=0)):
+        c.put("a", 1)
+        assert c.get("a") is None and len(c) == 0
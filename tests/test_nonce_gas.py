@@ -0,0 +1,11 @@
+from app.nonce_gas import GasEstimateCache
+
+def test_cached_limit_covers_transfer_to_fresh_recipient():
+    # first estimate from a funded recipient (~35k); a fresh one needs ~51k
+    cache = GasEstimateCache(ttl=60, margin=1.2)
+    assert cache.get_or_estimate(("tok", "transfer"), lambda: 35_000) >= 51_000
+    assert cache.get_or_estimate(("tok", "transfer"), lambda: 1 / 0) >= 51_000  # cached, no re-estimate
+
+def test_margin_wins_for_large_estimates():
+    cache = GasEstimateCache(ttl=60, margin=1.2, headroom=25_000)
+    assert cache.get_or_estimate("big", lambda: 500_000) == 600_000
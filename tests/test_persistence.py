@@ -0,0 +1,61 @@
+import asyncio
+
+from app import kv
+from app.persistence import KVPersistence
+
+def _writes(memkv, monkeypatch):
+    calls = []
+    real = memkv.hset
+    monkeypatch.setattr(memkv, "hset", lambda key, mapping: (calls.append((key, dict(mapping))), real(key, mapping)))
+    return calls
+
+def test_user_data_round_trip(memkv):
+    async def main():
+        p = KVPersistence(update_interval=60)
+        await p.update_user_data(7, {"awaiting_addr": True})
+        await p.update_conversation("send", (7, 7), "amount")
+        fresh = KVPersistence(update_interval=60)
+        assert await fresh.get_user_data() == {7: {"awaiting_addr": True}}
+        assert await fresh.get_conversations("send") == {(7, 7): "amount"}
+        await p.update_conversation("send", (7, 7), None)
+        await p.drop_user_data(7)
+        assert await fresh.get_user_data() == {} and await fresh.get_conversations("send") == {}
+    asyncio.run(main())
+
+def test_flush_skips_unchanged_data(memkv, monkeypatch):
+    async def main():
+        p = KVPersistence(update_interval=60)
+        assert await p.get_user_data() == {}
+        writes = _writes(memkv, monkeypatch)
+        await p.update_user_data(7, {"n": 1})
+        await p.update_user_data(7, {"n": 1})
+        await p.update_user_data(7, {"n": 2})
+        assert [m for _, m in writes] == [{"7": '{"n": 1}'}, {"7": '{"n": 2}'}]
+    asyncio.run(main())
+
+def test_refresh_picks_up_another_replicas_write(memkv):
+    async def main():
+        here, there = KVPersistence(update_interval=60), KVPersistence(update_interval=60)
+        await here.update_user_data(7, {"step": 1})
+        local = {"step": 1}
+        # nothing changed elsewhere: local data is kept as is
+        local["scratch"] = True
+        await here.refresh_user_data(7, local)
+        assert local == {"step": 1, "scratch": True}
+        # the user moved to another replica and back
+        await there.update_user_data(7, {"step": 2})
+        await here.refresh_user_data(7, local)
+        assert local == {"step": 2}
+    asyncio.run(main())
+
+def test_untouched_users_never_overwrite_the_owner(memkv, monkeypatch):
+    async def main():
+        old_owner, new_owner = KVPersistence(update_interval=60), KVPersistence(update_interval=60)
+        await old_owner.update_user_data(7, {"step": 1})
+        await new_owner.update_user_data(7, {"step": 2})
+        writes = _writes(memkv, monkeypatch)
+        # the old owner's periodic flush still carries its copy of user 7
+        await old_owner.update_user_data(7, {"step": 1})
+        assert writes == []
+        assert memkv.hget(kv.key("ptb", "user_data"), "7") == '{"step": 2}'
+    asyncio.run(main())
@@ -0,0 +1,121 @@
+import asyncio
+import json
+
+import pytest
+from eth_abi import encode
+
+from app import wallet_web3 as w3w
+from app.balance_cache import BalanceCache
+from app.portfolio import DECIMALS, SYMBOL, Portfolio, decode_string, decode_uint
+
+SLH = "0x" + "51" * 20
+OTH = "0x" + "07" * 20
+A = "0x" + "aa" * 20
+
+def _hex(b):
+    return "0x" + b.hex()
+
+def test_decode_string_reads_abi_strings_and_bytes32():
+    assert decode_string(_hex(encode(["string"], ["SLH"]))) == "SLH"
+    assert decode_string(_hex(encode(["string"], ["שקל"]))) == "שקל"
+    assert decode_string(_hex(encode(["string"], [""]))) == ""
+    # legacy tokens (MKR, SAI) return bytes32
+    assert decode_string(_hex(b"MKR".ljust(32, b"\0"))) == "MKR"
+    assert decode_string("0x") is None and decode_string(None) is None
+
+def test_decode_uint():
+    assert decode_uint(_hex(encode(["uint256"], [10**18]))) == 10**18
+    assert decode_uint("0x1a") == 26
+    assert decode_uint("0x") is None and decode_uint(None) is None
+
+class Node:
+    # answers eth_call/eth_getBalance per (to, data); anything listed in
+    # `fail` gets a JSON-RPC error, in `empty` a "0x" (no contract)
+    def __init__(self):
+        self.calls = []
+        self.fail, self.empty = set(), set()
+
+    async def rpc_batch(self, calls):
+        self.calls.append(calls)
+        out = []
+        for method, params in calls:
+            if method == "eth_getBalance":
+                out.append({"result": hex(2 * 10**18)})
+                continue
+            to, data = params[0]["to"], params[0]["data"]
+            if to in self.fail:
+                out.append({"error": {"code": -32000, "message": "execution reverted"}})
+            elif to in self.empty:
+                out.append({"result": "0x"})
+            elif data == SYMBOL:
+                out.append({"result": _hex(b"OTH".ljust(32, b"\0"))})
+            elif data == DECIMALS:
+                out.append({"result": _hex(encode(["uint256"], [6]))})
+            else:
+                out.append({"result": _hex(encode(["uint256"], [5 * 10**6]))})
+        return out
+
+def _methods(node):
+    return [p[0]["data"] for calls in node.calls for m, p in calls if m == "eth_call"]
+
+def test_known_metadata_is_not_read_again():
+    node, lookups = Node(), []
+
+    async def meta(token):
+        lookups.append(token)
+        return {"symbol": "SLH", "decimals": 18} if token == SLH else None
+
+    p = Portfolio([(SLH, None), (OTH, None)], node.rpc_batch, token_meta=meta)
+
+    async def main():
+        first = await p.fetch([A])
+        second = await p.fetch([A])
+        return first, second
+
+    first, second = asyncio.run(main())
+    # SLH came from the service's cache; OTH was read in the first batch only
+    metas = [d for d in _methods(node) if d in (SYMBOL, DECIMALS)]
+    assert metas == [SYMBOL, DECIMALS]
+    assert lookups == [SLH, OTH]
+    assert [x["symbol"] for x in first["totals"]] == ["BNB", "SLH", "OTH"]
+    assert second["complete"] and second["totals"] == first["totals"]
+
+def test_failed_calls_in_a_batch_only_mark_their_asset():
+    node = Node()
+    node.fail.add(OTH)
+    cache = BalanceCache()
+    p = Portfolio([(SLH, None), (OTH, None)], node.rpc_batch, cache=cache)
+    p.meta[SLH] = {"symbol": "SLH", "decimals": 18}
+    p.meta[OTH] = {"symbol": "OTH", "decimals": 6}
+    out = asyncio.run(p.fetch([A]))
+    assets = {x["symbol"]: x for x in out["addresses"][0]["assets"]}
+    assert "execution reverted" in assets["OTH"]["error"]
+    assert assets["SLH"]["raw"] == str(5 * 10**6) and assets["BNB"]["value"] == 2.0
+    assert not out["complete"] and len(cache) == 0
+
+def test_token_without_a_contract_reports_missing_metadata():
+    node = Node()
+    node.empty.add(OTH)
+    p = Portfolio([(OTH, None)], node.rpc_batch)
+    out = asyncio.run(p.fetch([A]))
+    oth = out["addresses"][0]["assets"][1]
+    assert oth["error"] == "token metadata unavailable" and OTH not in p.meta
+
+def test_reverted_multicall_entries_become_per_address_errors(monkeypatch):
+    ok = (True, encode(["uint256"], [7]))
+    monkeypatch.setattr(w3w, "_aggregate", lambda calls: [ok, ok, ok, ok, (False, b"")])
+    monkeypatch.setattr(w3w, "token_meta", lambda: {"symbol": "SLH", "decimals": 0})
+    block, outs = w3w._balances_chunk([A, "0x" + "bb" * 20])
+    assert block == 7
+    assert outs[0]["bnb"]["wei"] == 7 and outs[0]["slh"]["raw"] == 7
+    assert outs[1]["bnb"]["wei"] == 7 and outs[1]["slh"] == {"error": "call reverted"}
+
+def test_token_meta_is_served_from_the_persisted_file(tmp_path, monkeypatch):
+    path = tmp_path / "token_meta.json"
+    path.write_text(json.dumps({w3w._meta_key(w3w.TOKEN_ADDR): {"symbol": "SLH", "decimals": 15}}), encoding="utf-8")
+    monkeypatch.setattr(w3w, "_META_PATH", str(path))
+    monkeypatch.setattr(w3w, "_meta", {})
+    monkeypatch.setattr(w3w, "_meta_loaded", False)
+    monkeypatch.setattr(w3w, "web3", lambda: pytest.fail("metadata read over RPC"))
+    assert w3w.token_meta() == {"symbol": "SLH", "decimals": 15}
+    assert asyncio.run(w3w.atoken_meta())["decimals"] == 15
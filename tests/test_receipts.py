@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+import pytest
+
+from app import receipts as rc
+from app.receipts import ReceiptWatcher
+
+H = ["0x" + f"{i:064x}" for i in range(4)]
+
+@pytest.fixture
+def chain(monkeypatch):
+    mined = {}
+    calls = []
+
+    async def aget_receipts(hashes):
+        calls.append(list(hashes))
+        return {h: mined.get(h) for h in hashes}
+
+    invalidated = []
+    monkeypatch.setattr(rc.w3w, "aget_receipts", aget_receipts)
+    monkeypatch.setattr(rc.w3w, "invalidate_balance", invalidated.append)
+    return mined, calls, invalidated
+
+def _watcher(tmp_path, sent, **kw):
+    async def notify(chat_id, text):
+        sent.append((chat_id, text))
+    return ReceiptWatcher(str(tmp_path), notify, **kw)
+
+def test_confirmed_and_failed_txs_are_reported_once(tmp_path, chain):
+    mined, calls, invalidated = chain
+    sent = []
+    w = _watcher(tmp_path, sent)
+
+    async def main():
+        await w.aadd(H[0], 1, ["0xa", "0xb"])
+        await w.aadd(H[1], 2, [], label="airdrop")
+        await w.aadd(H[2], 3, [])
+        assert await w.tick() == 0 and sent == []
+        mined[H[0]] = {"status": 1, "block": 77, "gas_used": 21000}
+        mined[H[1]] = {"status": 0, "block": 78, "gas_used": 30000}
+        assert await w.tick() == 2
+        assert await w.tick() == 0
+    asyncio.run(main())
+    assert [c for c, _ in sent] == [1, 2]
+    assert "✅" in sent[0][1] and "77" in sent[0][1]
+    assert sent[1][1].startswith("airdrop\n❌")
+    assert invalidated == ["0xa", "0xb"]
+    assert calls[-1] == [H[2]] and w.pending() == 1
+
+def test_tx_without_receipt_is_dropped_after_the_timeout(tmp_path, chain):
+    sent = []
+    w = _watcher(tmp_path, sent, timeout=0.05)
+
+    async def main():
+        await w.aadd(H[3], 9, ["0xc"])
+        assert await w.tick() == 0
+        time.sleep(0.06)
+        assert await w.tick() == 1
+    asyncio.run(main())
+    assert sent == [(9, f"⌛ ההעברה עדיין לא אושרה.\ntx: {H[3]}")]
+    assert w.pending() == 0 and chain[2] == ["0xc"]
+
+def test_two_watchers_on_one_queue_report_once(tmp_path, chain):
+    mined = chain[0]
+    sent = []
+    a, b = _watcher(tmp_path, sent), _watcher(tmp_path, sent)
+
+    async def main():
+        await a.aadd(H[0], 1, [])
+        mined[H[0]] = {"status": 1, "block": 5, "gas_used": 21000}
+        return await asyncio.gather(a.tick(), b.tick())
+    assert sorted(asyncio.run(main())) == [0, 1]
+    assert len(sent) == 1
@@ -0,0 +1,137 @@
+import threading
+import time
+
+import pytest
+
+from app import wallet_web3 as w3w
+from app.nonce_gas import NonceManager
+from app.rpc_pool import EndpointPool
+
+def _answer(delays, calls, failing=()):
+    def fn(url):
+        calls.append(url)
+        if url in failing:
+            raise ConnectionError(url)
+        time.sleep(delays.get(url, 0.0))
+        return url
+    return fn
+
+def test_slow_endpoint_is_hedged():
+    pool = EndpointPool(["a", "b"], hedge_default=0.02)
+    calls = []
+    assert pool.call(_answer({"a": 0.3}, calls)) == "b"
+    assert calls == ["a", "b"] and pool.hedges == 1
+
+def test_no_hedge_waits_for_the_first_endpoint():
+    pool = EndpointPool(["a", "b"], hedge_default=0.02)
+    calls = []
+    assert pool.call(_answer({"a": 0.1}, calls), hedge=False) == "a"
+    assert calls == ["a"] and pool.hedges == 0
+
+def test_breaker_opens_then_half_opens():
+    pool = EndpointPool(["a", "b"], breaker_failures=2, breaker_cooldown=0.05)
+    calls = []
+    for _ in range(2):
+        assert pool.call(_answer({}, calls, failing={"a"}), hedge=False) == "b"
+    a = pool.endpoints[0]
+    assert a.is_open(time.monotonic())
+    assert [e.url for e in pool.ranked()] == ["b", "a"]
+    # while open, calls go to b only
+    calls.clear()
+    pool.call(_answer({}, calls), hedge=False)
+    assert calls == ["b"]
+    # after the cooldown a is tried again; one success closes it
+    time.sleep(0.06)
+    a.latency = 0.0
+    assert pool.ranked()[0] is a
+    assert pool.call(_answer({}, calls), hedge=False) == "a"
+    assert not a.is_open(time.monotonic()) and a.consecutive_failures == 0
+
+class Node:
+    # one chain behind several endpoints; "slow" endpoints take the tx and
+    # then time out before answering
+    def __init__(self, slow=()):
+        self.slow = set(slow)
+        self.pool = {}    # tx hash -> nonce
+        self.nonce = 0
+        self.sends = []
+        self.lock = threading.Lock()
+
+    def provider(self, url):
+        node = self
+
+        class Provider:
+            def make_request(self, method, params):
+                return node.handle(url, method, params)
+        return Provider()
+
+    def handle(self, url, method, params):
+        from web3 import Web3
+        with self.lock:
+            if method == "eth_getTransactionCount":
+                return {"jsonrpc": "2.0", "id": 1, "result": hex(self.nonce)}
+            if method == "eth_getTransactionByHash":
+                h = params[0]
+                h = h if isinstance(h, str) else h.hex()
+                known = self.pool.get(h.lower().replace("0x", ""))
+                return {"jsonrpc": "2.0", "id": 1, "result": None if known is None else {"hash": h}}
+            if method == "eth_sendRawTransaction":
+                raw = params[0] if isinstance(params[0], str) else params[0].hex()
+                h = Web3.keccak(hexstr=raw).hex().replace("0x", "")
+                self.sends.append(url)
+                if h in self.pool:
+                    return {"jsonrpc": "2.0", "id": 1, "error": {"code": -32000, "message": "already known"}}
+                import rlp
+                if int.from_bytes(rlp.decode(bytes.fromhex(raw.replace("0x", "")))[0], "big") < self.nonce:
+                    return {"jsonrpc": "2.0", "id": 1, "error": {"code": -32000, "message": "nonce too low"}}
+                if url == "refuse":
+                    return {"jsonrpc": "2.0", "id": 1,
+                            "error": {"code": -32000, "message": "insufficient funds for gas * price + value"}}
+                self.pool[h] = self.nonce
+                self.nonce += 1
+                if url in self.slow:
+                    raise TimeoutError("read timed out")
+                return {"jsonrpc": "2.0", "id": 1, "result": "0x" + h}
+        raise AssertionError(method)
+
+@pytest.fixture
+def node(monkeypatch):
+    from web3 import Web3
+
+    def make(urls, slow=()):
+        n = Node(slow)
+        pool = EndpointPool(urls, hedge_default=5.0)
+        provider = w3w._pooled_provider(pool, 1.0)
+        provider._providers = {u: n.provider(u) for u in urls}
+        monkeypatch.setattr(w3w, "_w3", Web3(provider))
+        monkeypatch.setattr(w3w, "_nonces", NonceManager(lambda a: w3w.web3().eth.get_transaction_count(a, "pending")))
+        monkeypatch.setattr(w3w.gas_oracle, "get", lambda: 10**9)
+        return n
+    return make
+
+PK = "0x" + "ab" * 32
+TO = "0x" + "22" * 20
+
+def test_broadcast_taken_before_a_timeout_is_a_success(node):
+    n = node(["a", "b"], slow={"a"})
+    w3w.web3().provider.pool.endpoints[1].latency = 1.0  # a ranks first
+    out = w3w.send_bnb(PK, TO, 0.01)
+    # a took it and timed out, b answered "already known"
+    assert n.sends == ["a", "b"]
+    assert out["nonce"] == 0 and out["tx_hash"].replace("0x", "") in n.pool
+    assert w3w._nonces.peek(out["from"]) == 1
+    assert w3w.send_bnb(PK, TO, 0.01)["nonce"] == 1
+
+def test_refused_broadcast_resyncs_the_nonce(node):
+    n = node(["refuse"])
+    with pytest.raises(ValueError, match="insufficient funds"):
+        w3w.send_bnb(PK, TO, 0.01)
+    assert n.pool == {}
+    assert w3w._nonces.peek(w3w.web3().eth.account.from_key(PK).address) is None
+
+def test_nonce_used_by_another_sender_is_resynced_once(node):
+    n = node(["a"])
+    assert w3w.send_bnb(PK, TO, 0.01)["nonce"] == 0
+    n.nonce += 2  # two txs from the same key sent elsewhere
+    out = w3w.send_bnb(PK, TO, 0.01)
+    assert out["nonce"] == 3 and n.sends == ["a"] * 3
@@ -0,0 +1,97 @@
+import asyncio
+import json
+import time
+import types
+
+from app import kv
+from app.sharding import HashRing, OrderedUpdateProcessor, UpdateRouter
+
+def _update(uid, cb=False):
+    return types.SimpleNamespace(effective_user=types.SimpleNamespace(id=uid), effective_chat=None,
+                                 callback_query=object() if cb else None)
+
+async def _work(log, tag, delay=0.0):
+    await asyncio.sleep(delay)
+    log.append(tag)
+
+def test_one_user_runs_in_order_others_do_not_wait():
+    async def main():
+        p = OrderedUpdateProcessor(2)
+        log = []
+        busy = [asyncio.create_task(p.process_update(_update(1), _work(log, (1, i), 0.05))) for i in range(4)]
+        await asyncio.sleep(0)
+        other = asyncio.create_task(p.process_update(_update(2), _work(log, (2, 0))))
+        await other
+        assert log == [(2, 0)]
+        await asyncio.gather(*busy)
+        assert log[1:] == [(1, i) for i in range(4)]
+    asyncio.run(main())
+
+def test_admit_drops_on_arrival():
+    async def main():
+        seen = []
+        async def admit(update):
+            seen.append(update.effective_user.id)
+            return len(seen) <= 2
+        p = OrderedUpdateProcessor(4, admit=admit)
+        log = []
+        # the first update holds the user's queue; the burst behind it is
+        # checked on arrival, not when its turn comes
+        tasks = [asyncio.create_task(p.process_update(_update(1), _work(log, i, 0.05))) for i in range(5)]
+        await asyncio.sleep(0.01)
+        assert len(seen) == 5
+        await asyncio.gather(*tasks)
+        assert log == [0, 1] and p.rejected == 3
+    asyncio.run(main())
+
+def test_updates_queued_past_max_wait_are_dropped():
+    async def main():
+        p = OrderedUpdateProcessor(4, max_wait=lambda u: 0.02 if u.callback_query is not None else None)
+        log = []
+        await asyncio.gather(
+            p.process_update(_update(1), _work(log, "slow", 0.05)),
+            p.process_update(_update(1, cb=True), _work(log, "tap")),
+            p.process_update(_update(1), _work(log, "message")))
+        assert log == ["slow", "message"] and p.expired == 1
+    asyncio.run(main())
+
+def test_ring_moves_only_the_changed_nodes_users():
+    users = range(2000)
+    before = HashRing(["a", "b", "c"])
+    grown = HashRing(["a", "b", "c", "d"])
+    moved = [u for u in users if before.node_for(u) != grown.node_for(u)]
+    assert moved and all(grown.node_for(u) == "d" for u in moved)
+    assert 0.1 < len(moved) / len(users) < 0.4
+    shrunk = HashRing(["a", "c"])
+    assert all(shrunk.node_for(u) == before.node_for(u) for u in users if before.node_for(u) != "b")
+    assert HashRing([]).node_for(1) is None
+
+def _msg(uid):
+    return {"update_id": uid, "message": {"message_id": 1, "from": {"id": uid}, "chat": {"id": uid}}}
+
+def test_router_forwards_to_the_owner(memkv):
+    a, b = UpdateRouter("a"), UpdateRouter("b")
+    a._beat(), b._beat(), a._beat()
+    assert a.ring.nodes == b.ring.nodes == ["a", "b"]
+    users = [u for u in range(50) if a.owner(_msg(u)) == "b"]
+    assert users and all(b.owner(_msg(u)) == "b" for u in users)
+    for u in users:
+        assert not a.route(_msg(u)) and b.route(_msg(u))
+    assert a.forwarded == len(users)
+    assert memkv.llen(kv.key("shard", "inbox", "b")) == len(users)
+
+def test_stale_replica_leaves_the_ring_and_its_inbox_is_adopted(memkv):
+    a, b = UpdateRouter("a", ttl=5), UpdateRouter("b", ttl=5)
+    a._beat(), b._beat(), a._beat()
+    users = [u for u in range(50) if a.owner(_msg(u)) == "b"]
+    for u in users:
+        a.route(_msg(u))
+    # b stops beating: its heartbeat is older than the ttl
+    memkv.hset(kv.key("shard", "replicas"), {"b": str(time.time() - 10)})
+    a._beat()
+    assert a.ring.nodes == ["a"] and "b" not in memkv.hgetall(kv.key("shard", "replicas"))
+    # b's users now belong to a, in their original order
+    inbox = kv.key("shard", "inbox", "a")
+    assert [json.loads(memkv.lpop(inbox))["update_id"] for _ in users] == users
+    assert memkv.llen(kv.key("shard", "inbox", "b")) == 0
+    assert all(a.route(_msg(u)) for u in users)
@@ -0,0 +1,102 @@
+import asyncio
+
+from app.token_index import TRANSFER_TOPIC, TokenIndex, TokenIndexer
+
+TOKEN = "0x" + "77" * 20
+A, B = "0x" + "aa" * 20, "0x" + "bb" * 20
+
+def _topic(addr):
+    return "0x" + "0" * 24 + addr[2:]
+
+class Chain:
+    # blocks 0..head, each block may carry one Transfer; fork() replaces blocks
+    def __init__(self, head):
+        self.head = head
+        self.salt = {}
+        self.transfers = {}  # block -> (src, dst, value)
+        self.max_range = None
+        self.calls = []
+
+    def block_hash(self, n):
+        return "0x%064x" % (n * 1000 + self.salt.get(n, 0))
+
+    def fork(self, frm):
+        for n in range(frm, self.head + 1):
+            self.salt[n] = self.salt.get(n, 0) + 1
+            self.transfers.pop(n, None)
+
+    def logs(self, frm, to):
+        return [{"blockNumber": hex(n), "blockHash": self.block_hash(n), "logIndex": "0x0",
+                 "transactionHash": "0x" + "%064x" % n, "topics": [TRANSFER_TOPIC, _topic(s), _topic(d)],
+                 "data": hex(v)} for n, (s, d, v) in sorted(self.transfers.items()) if frm <= n <= to]
+
+    async def rpc_batch(self, calls):
+        out = []
+        for method, params in calls:
+            self.calls.append(method)
+            if method == "eth_blockNumber":
+                out.append({"result": hex(self.head)})
+            elif method == "eth_getBlockByNumber":
+                n = int(params[0], 16)
+                out.append({"result": {"hash": self.block_hash(n)} if n <= self.head else None})
+            elif method == "eth_getLogs":
+                frm, to = int(params[0]["fromBlock"], 16), int(params[0]["toBlock"], 16)
+                if self.max_range is not None and to - frm + 1 > self.max_range:
+                    out.append({"error": {"code": -32005, "message": "query returned more than 10000 results"}})
+                else:
+                    out.append({"result": self.logs(frm, to)})
+        return out
+
+async def _drain(indexer):
+    while await indexer.step():
+        pass
+
+def _indexer(chain, **kw):
+    kw.setdefault("span", 10)
+    return TokenIndexer(TokenIndex("", TOKEN), chain.rpc_batch, start_block=1, confirmations=0, **kw)
+
+def test_follows_transfers_to_the_head():
+    chain = Chain(30)
+    chain.transfers = {5: (A, B, 100), 25: (B, A, 40)}
+    ix = _indexer(chain)
+    asyncio.run(_drain(ix))
+    assert ix.index.cursor() == 30 and ix.lag() == 0
+    assert ix.index.balance(A) == -60 and ix.index.balance(B) == 60
+    assert [h["value"] for h in ix.index.history(A)] == [40, 100]
+
+def test_reorg_rewinds_to_the_previous_checkpoint():
+    chain = Chain(30)
+    chain.transfers = {5: (A, B, 100), 25: (A, B, 7)}
+    ix = _indexer(chain)
+    asyncio.run(_drain(ix))
+    assert ix.index.balance(B) == 107
+    # blocks from 22 on are replaced; the transfer in 25 is gone, one lands in 28
+    chain.fork(22)
+    chain.transfers[28] = (A, B, 1)
+    asyncio.run(_drain(ix))
+    assert ix.index.cursor() == 30
+    assert ix.index.balance(B) == 101
+    assert [h["block"] for h in ix.index.history(B)] == [28, 5]
+
+def test_span_shrinks_when_the_node_refuses_a_range():
+    chain = Chain(40)
+    chain.max_range = 3
+    chain.transfers = {12: (A, B, 5)}
+    ix = _indexer(chain, max_span=10)
+    asyncio.run(_drain(ix))
+    assert ix.span <= 3 and ix.max_span <= 3
+    assert ix.index.cursor() == 40 and ix.index.balance(B) == 5
+
+def test_cursor_compare_and_set():
+    index = TokenIndex("", TOKEN)
+    index.begin(10, True)
+    logs = Chain(20)
+    logs.transfers = {11: (A, B, 3)}
+    assert index.apply(11, 12, logs.logs(11, 12), "0x01") == 1
+    # a second writer that read the old cursor changes nothing
+    assert index.apply(11, 12, logs.logs(11, 12), "0x01") == -1
+    assert index.apply(14, 15, [], "0x02") == -1
+    assert index.cursor() == 12 and index.balance(B) == 3
+    # begin() never moves an existing cursor
+    index.begin(0, True)
+    assert index.cursor() == 12
@@ -0,0 +1,123 @@
+import json
+import time
+
+import pytest
+from cryptography.fernet import InvalidToken
+
+from app import kv
+from app.util_store import KVBackend, KeyRing, SqliteBackend, Store, _PlainCache, _fernet_from_secret
+
+OLD = "old-secret-old-secret-old-secret"
+NEW = "new-secret-new-secret-new-secret"
+PK = "0x" + "ab" * 32
+
+def test_v2_round_trip_and_format():
+    ring = KeyRing(NEW)
+    token = ring.encrypt(PK)
+    prefix, kid, _ = token.split(":", 2)
+    assert (prefix, kid) == ("v2", ring.current_kid)
+    assert ring.is_current(token)
+    assert ring.decrypt(token) == PK
+    assert ring.encrypt(PK) != token  # fresh IV every time
+
+def test_kid_is_stable_per_secret():
+    assert KeyRing(NEW).current_kid == KeyRing(NEW).current_kid
+    assert KeyRing(NEW).current_kid != KeyRing(OLD).current_kid
+
+def test_unknown_kid_is_rejected():
+    token = KeyRing(OLD).encrypt(PK)
+    with pytest.raises(InvalidToken):
+        KeyRing(NEW).decrypt(token)
+
+def test_v1_legacy_tokens_still_decrypt():
+    legacy = _fernet_from_secret(OLD).encrypt(PK.encode()).decode()
+    ring = KeyRing(NEW, [OLD])
+    assert not ring.is_current(legacy)
+    assert ring.decrypt(legacy) == PK
+
+def test_rotation_reencrypts_every_row(tmp_path):
+    old = Store(str(tmp_path), OLD, backend="sqlite", previous_secrets=[])
+    for uid in range(5):
+        old.set_pk(uid, f"{PK[:-1]}{uid}")
+
+    rotated = Store(str(tmp_path), NEW, backend="sqlite", previous_secrets=[OLD])
+    assert rotated.get_pk(3) == f"{PK[:-1]}3"  # previous secret still reads
+    assert rotated.reencrypt_all(batch=2) == {"scanned": 5, "reencrypted": 5, "failed": 0}
+    assert rotated.reencrypt_all() == {"scanned": 5, "reencrypted": 0, "failed": 0}
+
+    # the old secret can be dropped once every row moved
+    only_new = Store(str(tmp_path), NEW, backend="sqlite", previous_secrets=[])
+    assert [only_new.get_pk(uid) for uid in range(5)] == [f"{PK[:-1]}{uid}" for uid in range(5)]
+
+def test_rotation_skips_rows_changed_meanwhile(tmp_path):
+    store = Store(str(tmp_path), NEW, backend="sqlite", previous_secrets=[OLD])
+    token = KeyRing(OLD).encrypt(PK)
+    store._upsert("7", {"pk": token})
+    fresh = store._keys.encrypt(PK)
+    assert store._db.replace_pks([("7", "v2:stale:x", fresh)]) == 0
+    assert store._db.replace_pks([("7", token, fresh)]) == 1
+
+def test_plain_cache_is_bound_to_the_ciphertext():
+    cache = _PlainCache(maxsize=10, ttl=60)
+    cache.put("1", "tok-a", PK)
+    assert cache.get("1", "tok-a") == PK
+    assert cache.get("1", "tok-b") is None
+
+def test_plain_cache_expires_without_reads():
+    cache = _PlainCache(maxsize=10, ttl=0.05)
+    cache.put("1", "tok", PK)
+    buf = cache._data["1"][2]
+    time.sleep(0.3)
+    assert not cache._data
+    assert not any(buf)
+
+def test_plain_cache_evicts_and_wipes_oldest():
+    cache = _PlainCache(maxsize=2, ttl=60)
+    cache.put("1", "t", PK)
+    buf = cache._data["1"][2]
+    cache.put("2", "t", PK)
+    cache.put("3", "t", PK)
+    assert list(cache._data) == ["2", "3"]
+    assert not any(buf)
+
+def _seed_sqlite(path, n):
+    db = SqliteBackend(str(path))
+    for uid in range(n):
+        db.upsert(str(uid), {"address": f"0x{uid:040x}", "pk": f"tok-{uid}"})
+
+def test_kv_migration_takes_over_a_stale_lease(tmp_path, memkv):
+    _seed_sqlite(tmp_path, 3)
+    meta = kv.key("store", "meta")
+    memkv.hset(meta, {"migrated_local": f"running:crashed:{time.time() - 1}"})
+    backend = KVBackend(str(tmp_path))
+    assert not memkv.hget(meta, "migrated_local").startswith("running")
+    assert backend.get("2") == {"address": f"0x{2:040x}", "pk": "tok-2"}
+
+def test_kv_migration_waits_for_a_live_lease(tmp_path, memkv):
+    _seed_sqlite(tmp_path, 3)
+    meta = kv.key("store", "meta")
+    memkv.hset(meta, {"migrated_local": f"running:other:{time.time() + 60}"})
+    assert KVBackend(str(tmp_path)).get("1") == {}
+
+def test_kv_migration_rerun_keeps_newer_kv_data(tmp_path, memkv):
+    _seed_sqlite(tmp_path, 3)
+    memkv.hset(kv.key("store", "meta"), {"migrated_local": "running"})
+    memkv.hset(kv.key("store", "user", "1"), {"address": "0xnew"})
+    backend = KVBackend(str(tmp_path))
+    assert backend.get("1") == {"address": "0xnew", "pk": "tok-1"}
+    assert backend.get("0")["pk"] == "tok-0"
+
+def test_kv_migration_reads_local_files_read_only(tmp_path, memkv):
+    legacy = {"7": {"address": "0x" + "77" * 20, "pk": "tok-7"}}
+    (tmp_path / "users.json").write_text(json.dumps(legacy), encoding="utf-8")
+    backend = KVBackend(str(tmp_path))
+    assert backend.get("7") == legacy["7"]
+    # users.json stays where it was and no users.db appears
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["users.json"]
+
+def test_kv_migration_merges_sqlite_and_json(tmp_path, memkv):
+    _seed_sqlite(tmp_path, 2)
+    (tmp_path / "users.json").write_text(json.dumps({"1": {"pk": "stale"}, "9": {"pk": "tok-9"}}), encoding="utf-8")
+    backend = KVBackend(str(tmp_path))
+    assert backend.get("1")["pk"] == "tok-1" and backend.get("9") == {"pk": "tok-9"}
+    assert (tmp_path / "users.json").exists()